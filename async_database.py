@@ -0,0 +1,216 @@
+'''
+    An asyncio facade over the Database class, for services that must not block their event loop.
+
+    Each of the workers threads owns one Database, opened on first use, because a pyodbc connection
+    must not be used by two threads at once.  A call waits for an idle worker, runs on that worker's
+    thread, and returns the worker when the call is done, so at most workers statements run at once.
+
+    Syntax:
+        async with AsyncDatabase('DB_NAME', workers=4) as db:
+            rows = await db.fetch('select * from dbo.States where Region = ?', ('West',), timeout=30)
+            await db.execute('update dbo.States set Checked = 1 where Region = ?', ('West',))
+            async for rows in db.iter_batches('select * from dbo.JobContacts', 1000):
+                ...
+
+    Notes:
+        Every execute is committed on its worker's connection, since the next call may run on another worker.
+        When a call times out or its task is cancelled, the running statement is cancelled with cursor.cancel,
+        and the worker goes back to the idle workers once the statement has stopped.  A statement that
+        finishes after that is rolled back, not committed.  A statement that was already committed when the
+        timeout fired returns its result, since it can no longer be undone; when its task was cancelled,
+        the cancellation is raised and the statement stays committed.
+        Close an async for loop that ends early with "async with contextlib.aclosing(db.iter_batches(...))",
+        so its worker is returned right away.
+'''
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .database import Database
+except ImportError:
+    from database import Database
+
+class _Cancelled(Exception):
+    """ Raised on a worker thread in place of the commit of a call that was cancelled. """
+
+class _Call:
+    """ The state of one call on a worker: running, committing or cancelled. """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = 'running'
+
+    """ Mark the call cancelled, and return False if it is already committing. """
+    def cancel(self):
+        with self.lock:
+            if self.state == 'running':
+                self.state = 'cancelled'
+            return self.state == 'cancelled'
+
+    """ Mark the call committing, and return False if it was cancelled first. """
+    def commit(self):
+        with self.lock:
+            if self.state == 'running':
+                self.state = 'committing'
+            return self.state == 'committing'
+
+class _Worker:
+    """ One thread and the Database it owns. """
+    def __init__(self, number, datasource, pool, cache):
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix='AsyncDatabase-' + str(number))
+        self.datasource = datasource
+        self.pool = pool
+        self.cache = cache
+        self.database = None
+        self.lock = threading.Lock()
+
+    def cancel(self, call):
+        # Called from the event loop thread while the worker thread runs a statement.
+        if not call.cancel():
+            return
+        with self.lock:
+            database = self.database
+        if database is None or database.connection is None:
+            return
+        for cursor in [database.cursor] + list(database.statements.values()):
+            try:
+                cursor.cancel()
+            except Exception:
+                pass
+
+    def close(self):
+        if self.database is not None:
+            self.database.close()
+            self.database = None
+
+    def run(self, call, commit, function, *args):
+        # Runs on the worker thread.  The commit is made only if the call was not cancelled first.
+        if self.database is None:
+            database = Database(self.datasource, self.pool, self.cache)
+            with self.lock:
+                self.database = database
+        try:
+            result = function(self.database, *args)
+            if commit:
+                if not call.commit():
+                    raise _Cancelled()
+                self.database.commit()
+            return result
+        except BaseException:
+            if self.database.connection is not None:
+                try:
+                    self.database.rollback()
+                except Exception:
+                    pass
+            raise
+
+def _execute(database, statement, params):
+    return database.execute(statement, params).rowcount
+
+def _executemany(database, statement, seq_of_params):
+    database.executemany(statement, seq_of_params)
+
+def _fetch(database, statement, params):
+    if params is None:
+        return database.result_set(statement)
+    return database.query(statement, params)
+
+def _fetchmany(database, cursor, batch_size):
+    return cursor.fetchmany(batch_size)
+
+def _skip(database, cursor):
+    # Discard the rows not fetched, so the statement stops holding its locks.
+    while cursor.nextset():
+        pass
+
+def _start(database, statement, params):
+    cursor = database.execute(statement, params)
+    return cursor if cursor.description is not None else None
+
+class AsyncDatabase:
+    """ Run Database calls for coroutines on up to workers threads, each with its own connection. """
+    def __init__(self, datasource, workers=4, pool=None, cache=None):
+        self.datasource = datasource
+        self.workers = [_Worker(i, datasource, pool, cache) for i in range(workers)]
+        self.idle = None  # asyncio.Queue of idle workers, made in the running event loop
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    """ Close every worker's connection and stop the worker threads. """
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        for worker in self.workers:
+            await loop.run_in_executor(worker.executor, worker.close)
+            worker.executor.shutdown()
+
+    """ Execute an SQL statement with optional parameters, commit it, and return the rowcount. """
+    async def execute(self, statement, params=None, timeout=None):
+        return await self._run(_execute, (statement, params), timeout, True)
+
+    """ Execute an SQL statement once for each sequence of parameters and commit. """
+    async def executemany(self, statement, seq_of_params, timeout=None):
+        await self._run(_executemany, (statement, seq_of_params), timeout, True)
+
+    """ Execute a query with optional parameters and return all rows, or None if the statement returns no rows. """
+    async def fetch(self, statement, params=None, timeout=None):
+        return await self._run(_fetch, (statement, params), timeout)
+
+    """ Execute a query and yield lists of up to batch_size rows, holding one worker until the last batch.
+        The timeout applies to the statement and to each batch. """
+    async def iter_batches(self, statement, batch_size=1000, params=None, timeout=None):
+        worker = await self._checkout()
+        cursor = None
+        try:
+            cursor = await self._call(worker, _start, (statement, params), timeout)
+            if cursor is None:
+                return
+            cursor.arraysize = batch_size
+            while True:
+                rows = await self._call(worker, _fetchmany, (cursor, batch_size), timeout)
+                if not rows:
+                    cursor = None
+                    break
+                yield rows
+        finally:
+            try:
+                if cursor is not None:
+                    await self._call(worker, _skip, (cursor,), None)
+            finally:
+                self._checkin(worker)
+
+    async def _call(self, worker, function, args, timeout, commit=False):
+        # Wait for a call on a checked out worker.  On a timeout or cancellation, cancel the statement,
+        # and wait for the worker thread to stop, so the worker is never returned while still busy.
+        call = _Call()
+        future = asyncio.get_running_loop().run_in_executor(worker.executor, worker.run, call, commit, function, *args)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError) as error:
+            worker.cancel(call)
+            await asyncio.wait([future])
+            if not future.cancelled() and future.exception() is None and isinstance(error, asyncio.TimeoutError):
+                # The call finished, and any commit was made, before it could be stopped.
+                return future.result()
+            raise
+
+    def _checkin(self, worker):
+        self.idle.put_nowait(worker)
+
+    async def _checkout(self):
+        if self.idle is None:
+            self.idle = asyncio.Queue()
+            for worker in self.workers:
+                self.idle.put_nowait(worker)
+        return await self.idle.get()
+
+    async def _run(self, function, args, timeout, commit=False):
+        worker = await self._checkout()
+        try:
+            return await self._call(worker, function, args, timeout, commit)
+        finally:
+            self._checkin(worker)
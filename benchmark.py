@@ -0,0 +1,651 @@
+'''
+    Benchmarks for the Database class, using a local SQLite database file in place of the ODBC datasource.
+    Run from the parent directory of the package, so the package can be imported:
+
+    Syntax: py -m Nelnet.benchmark --case=export --rows="10000,100000,1000000" --json="results.json"
+
+    Parameters:
+        --batch-size Number of rows fetched per round trip in streaming mode.  Optional, default=1000.
+        --case      Name of the benchmark to run.  Optional, default=all benchmarks.
+        --json      File to write the results to as JSON, so runs can be compared.  Optional.
+        --rows      Comma separated list of row counts.  Optional, default="10000,100000,1000000".
+
+    Notes:
+        pyodbc.connect is replaced with a function returning a SQLite connection, so no DSN is needed.
+        When pyodbc cannot be imported, use_sqlite puts an empty module in its place, so no ODBC driver manager
+        is needed either.  The SQLite connection is the stand-in of tests/standin.py.
+        The contacts benchmark also rewrites the T-SQL used by JobContactLoader for SQLite.
+        Peak RSS is read from the resource module, which is only available on Unix systems.
+        The JSON file holds the Python, SQLite and platform versions, the options, and for each benchmark
+        a list of its result rows, each a dict keyed by the column names printed on the console.
+'''
+
+import asyncio
+import contextlib
+import csv
+import datetime
+import decimal
+import email.message
+import email.utils
+import getopt
+import importlib.util
+import json
+import mailbox
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from . import Database, QueryCache
+from .bulk_load import BulkLoader
+from .formatters import FORMATTERS
+from .classifier import Classifier
+from .contact_report import ContactReport
+from .extraction import DEFAULT_TEMPLATES, Extractor
+from .job_contact_loader import JobContactLoader, content_hash
+from .mail_sources import MailMessage, open_source
+from .pipeline import classify_messages, process_chunk
+from .tests.standin import StandInConnection
+
+def use_sqlite(path, latency=0.0, tsql=False):
+    """ Replace pyodbc.connect so every Database connects to the SQLite file at path.
+        latency adds that many seconds to every execute, like the round trip to a database server.
+        With tsql=True, each statement is rewritten for SQLite by tests/standin.py first. """
+    try:
+        import pyodbc
+    except ImportError:
+        # pyodbc does not load without an ODBC driver manager, as on a Linux box without unixODBC.
+        # connect is replaced below, so an empty module is all the benchmarks need.
+        pyodbc = sys.modules['pyodbc'] = types.ModuleType('pyodbc')
+        pyodbc.Error = sqlite3.Error
+    # pyodbc binds Decimal parameters, which sqlite3 only does with an adapter.
+    sqlite3.register_adapter(decimal.Decimal, str)
+    pyodbc.connect = lambda connection_string, **kwargs: StandInConnection(path, latency, tsql)
+
+def create_table(path, rows, columns=8):
+    """ Create a SQLite database file with a synthetic table named bench of the given size. """
+    connection = sqlite3.connect(path)
+    names = ['col' + str(i) for i in range(columns)]
+    connection.execute('drop table if exists bench')
+    connection.execute('create table bench (id integer, ' + ', '.join(n + ' text' for n in names) + ')')
+    values = ','.join('?' * (columns + 1))
+    connection.executemany('insert into bench values (' + values + ')',
+                           ((i,) + tuple('value ' + str(i) + ' ' + str(j) for j in range(columns)) for i in range(rows)))
+    connection.commit()
+    connection.close()
+
+# The result rows of the benchmarks run so far, for the --json file.
+RESULTS = []
+
+class Table:
+    """ Print the results of a benchmark as aligned columns, and keep each row for the --json file. """
+    def __init__(self, names, format):
+        self.names = names.split()
+        self.format = format
+        print(re.sub(r'%(\d+)(?:\.\d+)?[dfs]', r'%\1s', format) % tuple(self.names))
+
+    """ Print one result row, with a value for each column. """
+    def add(self, *values):
+        print(self.format % values)
+        RESULTS.append(dict(zip(self.names, values)))
+
+def _peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return peak
+
+def _export_child(path, mode, batch_size):
+    """ Run one export in this process and print elapsed time, time to first row, and peak RSS. """
+    use_sqlite(path)
+    d = Database('bench')
+    start = time.perf_counter()
+    first = None
+    count = 0
+    if mode == 'fetchall':
+        rows = d.result_set('select * from bench')
+    else:
+        rows = d.iter_rows('select * from bench', batch_size)
+    with open(os.devnull, 'wt') as out:
+        for row in rows:
+            if first is None:
+                first = time.perf_counter() - start
+            out.write(','.join('"' + str(x).strip() + '"' for x in row) + '\n')
+            count += 1
+    d.close()
+    print(count, time.perf_counter() - start, first or 0.0, _peak_rss_kb())
+
+def bench_export(row_counts, batch_size):
+    """ Compare peak RSS and time to first row of fetchall against streaming, one child process per run. """
+    table = Table('rows mode seconds first_row peak_rss_kb', '%10s %10s %12.3f %12.4f %14s')
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in row_counts:
+            path = os.path.join(tmp, 'bench_' + str(rows) + '.db')
+            create_table(path, rows)
+            for mode in ('fetchall', 'stream'):
+                result = subprocess.run([sys.executable, '-m', __spec__.name, '--child=export',
+                                         '--mode=' + mode, '--path=' + path, '--batch-size=' + str(batch_size)],
+                                        capture_output=True, text=True, check=True)
+                count, seconds, first, peak = result.stdout.split()
+                table.add(int(count), mode, float(seconds), float(first), None if peak == 'None' else int(peak))
+
+def _sql_child(path, format, batch_size):
+    """ Run sql.py in this process, exporting the bench table to a file, and print elapsed time, file size and peak RSS. """
+    use_sqlite(path)
+    sql_file = path + '.sql'
+    out_file = path + '.' + format
+    with open(sql_file, 'wt', encoding='utf-8') as script:
+        script.write('select * from bench\n')
+    # sql.py imports the modules next to it by name, as when it is run from its folder.
+    start = time.perf_counter()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import sql
+    with open(os.devnull, 'wt') as out, contextlib.redirect_stdout(out):
+        code = sql.main(['--database=bench', '--infile=' + sql_file, '--outfile=' + out_file,
+                         '--format=' + format, '--batch-size=' + str(batch_size)])
+    if code != 0:
+        raise RuntimeError('sql.py ended with code ' + str(code))
+    seconds = time.perf_counter() - start
+    print(seconds, os.path.getsize(out_file), _peak_rss_kb())
+
+def bench_sql(row_counts, batch_size):
+    """ Time sql.py end to end, from importing it to closing the output file, one child process per run.
+        The parquet format is included when pyarrow is installed. """
+    table = Table('rows format seconds rows_per_sec file_bytes peak_rss_kb', '%10d %10s %12.3f %14.0f %14d %14s')
+    formats = ['csv'] + (['parquet'] if importlib.util.find_spec('pyarrow') is not None else [])
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in row_counts:
+            path = os.path.join(tmp, 'bench_' + str(rows) + '.db')
+            create_table(path, rows)
+            for format in formats:
+                result = subprocess.run([sys.executable, '-m', __spec__.name, '--child=sql', '--mode=' + format,
+                                         '--path=' + path, '--batch-size=' + str(batch_size)],
+                                        capture_output=True, text=True, check=True)
+                seconds, size, peak = result.stdout.split()
+                table.add(rows, format, float(seconds), rows / float(seconds), int(size), None if peak == 'None' else int(peak))
+
+def _legacy_write(out, rows, colsep, quote):
+    """ The per-column output loop sql.py used before the row formatters. """
+    for row in rows:
+        i = 0
+        for x in row:
+            if i > 0:
+                out.write(colsep)
+            out.write(quote + str(x).strip() + quote)
+            i += 1
+        out.write("\n")
+
+def bench_format(row_counts, batch_size):
+    """ Compare output throughput in rows/sec of the legacy per-column loop against each formatter. """
+    table = Table('rows formatter seconds rows_per_sec', '%10d %10s %12.3f %14.0f')
+    for rows in row_counts:
+        data = [(i, 'value ' + str(i), 12.5 * i, None, 'say "hi"', ' padded ', i % 7, 'x' * 20) for i in range(rows)]
+        with open(os.devnull, 'wt') as out:
+            start = time.perf_counter()
+            _legacy_write(out, data, ',', '"')
+            seconds = time.perf_counter() - start
+            table.add(rows, 'legacy', seconds, rows / seconds)
+            for name, formatter_class in FORMATTERS.items():
+                formatter = formatter_class(',', '"')
+                start = time.perf_counter()
+                for i in range(0, rows, batch_size):
+                    out.write(formatter.format_batch(data[i:i + batch_size]))
+                seconds = time.perf_counter() - start
+                table.add(rows, name, seconds, rows / seconds)
+
+def _contact(i):
+    return ('01/%02d/2024 %02d:%02d' % (i % 28 + 1, i % 24, i % 60), 'jobs%d@example.com' % (i % 500),
+            'Thank you for applying %d' % i, 'Dear applicant,\n\nWe received your application %d.\n' % i + 'x' * 2000)
+
+def bench_dedup(row_counts, batch_size, inserts=200):
+    """ Compare insert latency against table size for the column comparison and the content hash index. """
+    table = Table('rows dedup ms_per_insert', '%10d %10s %14.3f')
+    for rows in row_counts:
+        connection = sqlite3.connect(':memory:')
+        connection.execute('create table JobContacts (DateOfContact text, EmailAddressOfSender text, '
+                           'SubjectOfEmail text, BodyOfEmail text, ContentHash blob)')
+        connection.executemany('insert into JobContacts values (?, ?, ?, ?, ?)',
+                               (_contact(i) + (content_hash(*_contact(i)),) for i in range(rows)))
+        connection.commit()
+        new_rows = [_contact(rows + i) for i in range(inserts)]
+        start = time.perf_counter()
+        for row in new_rows:
+            connection.execute('insert into JobContacts (DateOfContact, EmailAddressOfSender, SubjectOfEmail, BodyOfEmail) '
+                               'select ?, ?, ?, ? where not exists (select * from JobContacts where DateOfContact = ? '
+                               'and EmailAddressOfSender = ? and SubjectOfEmail = ? and BodyOfEmail = ?)', row + row)
+        table.add(rows, 'columns', (time.perf_counter() - start) * 1000 / inserts)
+        connection.rollback()
+        connection.execute('create unique index UX_JobContacts_ContentHash on JobContacts (ContentHash)')
+        start = time.perf_counter()
+        for row in new_rows:
+            connection.execute('insert into JobContacts select ?, ?, ?, ?, ? where not exists '
+                               '(select * from JobContacts where ContentHash = ?)', row + (content_hash(*row),) * 2)
+        table.add(rows, 'hash', (time.perf_counter() - start) * 1000 / inserts)
+        connection.close()
+
+SUBJECTS = ['Thank you for applying to %s', 'Your application for Analyst at %s', 'Weekly newsletter from %s',
+            'Meeting notes %s', 'Jobs you may be interested in at %s']
+
+def write_mailbox(path, count, format='mbox'):
+    """ Write a synthetic mailbox of count messages, as an mbox file or a folder of .eml files. """
+    if format == 'mbox':
+        box = mailbox.mbox(path)
+        box.lock()
+    else:
+        os.makedirs(path, exist_ok=True)
+    base = 1704067200  # 01/01/2024 00:00 UTC
+    for i in range(count):
+        msg = email.message.EmailMessage()
+        company = 'company%d' % (i % 997)
+        msg['From'] = 'careers@%s.example.com' % company
+        msg['To'] = 'applicant@example.com'
+        msg['Subject'] = SUBJECTS[i % len(SUBJECTS)] % company
+        msg['Date'] = email.utils.formatdate(base + i * 60)
+        msg['Message-ID'] = '<%d@%s.example.com>' % (i, company)
+        msg.set_content('Dear applicant,\n\nThank you for applying to %s.  We have received your application '
+                        'for the position of Analyst %d and will be in touch.\n\nRecruiting Team\n' % (company, i))
+        if format == 'mbox':
+            box.add(msg)
+        else:
+            with open(os.path.join(path, '%08d.eml' % i), 'wb') as eml:
+                eml.write(msg.as_bytes())
+    if format == 'mbox':
+        box.flush()
+        box.unlock()
+        box.close()
+
+def bench_ingest(row_counts, batch_size):
+    """ Time reading, classifying and hashing a synthetic mailbox, in messages/sec. """
+    table = Table('messages source loaded seconds messages_per_sec', '%10d %10s %10d %12.3f %14.0f')
+    classifier = Classifier()
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in row_counts:
+            for format in ('mbox', 'eml'):
+                path = os.path.join(tmp, format + str(count))
+                write_mailbox(path, count, format)
+                start = time.perf_counter()
+                loaded = 0
+                for msg in open_source(path).messages():
+                    if classifier.classify(msg) == 'load':
+                        # Hash the date as the loader stores it, in DateOfContact's text form.
+                        content_hash(datetime.datetime.strftime(msg.received_time, '%m/%d/%Y %H:%M'), msg.sender, msg.subject, msg.body)
+                        loaded += 1
+                seconds = time.perf_counter() - start
+                table.add(count, format, loaded, seconds, count / seconds)
+
+def _ingest(path, batch_size, classifier, extractor):
+    """ Run the job_contacts.py --auto loop over a mailbox on a pyodbc connection and return the contacts inserted. """
+    import pyodbc
+    connection = pyodbc.connect('bench')
+    loader = JobContactLoader(connection, batch_size)
+    loader.preload(datetime.datetime(2000, 1, 1), datetime.datetime(2100, 1, 1))
+    for msg in open_source(path).messages():
+        if classifier.classify(msg) == 'load':
+            loader.add(datetime.datetime.strftime(msg.received_time, '%m/%d/%Y %H:%M'), msg.sender, msg.subject,
+                       msg.body, None, extractor.extract(msg))
+    loader.close()
+    connection.close()
+    return loader.loaded
+
+def bench_contacts(row_counts, batch_size):
+    """ Time the job contact ingestion loop end to end: read a synthetic mbox, classify and extract each message,
+        and load the contacts with JobContactLoader into a SQLite JobContacts table, first while the table is
+        empty and then again when every contact is a duplicate.  On the second run, preload finds every
+        contact by its ContactTime, and the duplicates are skipped before they are sent to the database. """
+    table = Table('messages run loaded seconds messages_per_sec', '%10d %10s %10d %12.3f %14.0f')
+    classifier = Classifier()
+    extractor = Extractor()
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in row_counts:
+            box = os.path.join(tmp, 'contacts' + str(count))
+            write_mailbox(box, count)
+            path = os.path.join(tmp, 'contacts_' + str(count) + '.db')
+            connection = sqlite3.connect(path)
+            connection.execute('create table JobContacts (DateOfContact text, EmailAddressOfSender text, SubjectOfEmail text, '
+                               'BodyOfEmail text, ContentHash blob, Employer text, Position text, ApplicationDate text, ContactTime text)')
+            connection.execute('create unique index UX_JobContacts_ContentHash on JobContacts (ContentHash)')
+            connection.close()
+            use_sqlite(path, tsql=True)
+            for run in ('empty', 'duplicate'):
+                start = time.perf_counter()
+                loaded = _ingest(box, batch_size, classifier, extractor)
+                seconds = time.perf_counter() - start
+                table.add(count, run, loaded, seconds, count / seconds)
+
+def synthetic_messages(count):
+    """ Yield count synthetic MailMessage tuples without writing a mailbox. """
+    base = datetime.datetime(2024, 1, 1)
+    for i in range(count):
+        company = 'company%d' % (i % 997)
+        yield MailMessage(base + datetime.timedelta(minutes=i), 'careers@%s.example.com' % company,
+                          SUBJECTS[i % len(SUBJECTS)] % company,
+                          'Dear applicant,\n\nThank you for applying to %s for the position of Analyst %d.\n' % (company, i) * 20,
+                          '<%d@%s.example.com>' % (i, company))
+
+def bench_pipeline(row_counts, batch_size):
+    """ Report classification throughput in messages/sec in process and with 1 to N worker processes. """
+    table = Table('messages workers seconds messages_per_sec', '%10d %10s %12.3f %14.0f')
+    cores = os.cpu_count() or 1
+    worker_counts = sorted(set([1, 2, 4, 8, 16, cores]))
+    for count in row_counts:
+        start = time.perf_counter()
+        process_chunk(synthetic_messages(count))
+        seconds = time.perf_counter() - start
+        table.add(count, 'none', seconds, count / seconds)
+        for workers in worker_counts:
+            if workers > cores:
+                continue
+            start = time.perf_counter()
+            for result in classify_messages(synthetic_messages(count), workers=workers, chunk_size=batch_size):
+                pass
+            seconds = time.perf_counter() - start
+            table.add(count, workers, seconds, count / seconds)
+
+def _domain_templates(count):
+    """ Return count synthetic templates, one per company domain used by synthetic_messages. """
+    return [{'domain': 'company%d.example.com' % i,
+             'subject': {'employer': r'applying to (?P<value>company%d)' % i},
+             'body': {'position': r'applying to company%d for the position of (?P<value>Analyst \d+)' % i}}
+            for i in range(count)] + DEFAULT_TEMPLATES
+
+def bench_extract(row_counts, batch_size):
+    """ Report extraction throughput in messages/sec against the number of templates,
+        routing by sender domain against trying every template on every message. """
+    table = Table('messages templates routing seconds messages_per_sec', '%10d %10d %10s %12.3f %14.0f')
+    for count in row_counts:
+        messages = list(synthetic_messages(count))
+        for template_count in (10, 100, 1000):
+            extractor = Extractor(_domain_templates(template_count))
+            start = time.perf_counter()
+            for msg in messages:
+                extractor.extract(msg)
+            seconds = time.perf_counter() - start
+            table.add(count, template_count, 'domain', seconds, count / seconds)
+            # Without the index, every template is a candidate for every message.
+            everything = [template for templates in extractor.by_domain.values() for template in templates] + extractor.generic
+            extractor.candidates = lambda sender: everything
+            start = time.perf_counter()
+            for msg in messages:
+                extractor.extract(msg)
+            seconds = time.perf_counter() - start
+            table.add(count, template_count, 'all', seconds, count / seconds)
+
+def bench_report(row_counts, batch_size, page_size=50):
+    """ Compare the string sorted report query against keyset pagination on the ContactTime index,
+        for a one week range: time to the first page and time to read every page. """
+    table = Table('rows query matched first_page all_pages', '%10d %10s %10d %12.4f %12.4f')
+    for rows in row_counts:
+        connection = sqlite3.connect(':memory:')
+        connection.execute("attach database ':memory:' as dbo")
+        connection.execute('create table dbo.JobContacts (DateOfContact text, EmailAddressOfSender text, SubjectOfEmail text, '
+                           'BodyOfEmail text, ContentHash blob, Employer text, Position text, ApplicationDate text, ContactTime text)')
+        base = datetime.datetime(2023, 1, 1)
+        def contacts():
+            for i in range(rows):
+                when = base + datetime.timedelta(minutes=i)
+                row = _contact(i)[:3] + ('Thank you for applying, application %d.' % i,)
+                yield (when.strftime('%m/%d/%Y %H:%M'),) + row[1:] + (content_hash(*row), 'company%d' % (i % 997),
+                       'Analyst', when.strftime('%Y-%m-%d'), when.strftime('%Y-%m-%d %H:%M:%S'))
+        connection.executemany('insert into dbo.JobContacts values (?, ?, ?, ?, ?, ?, ?, ?, ?)', contacts())
+        connection.execute('create index dbo.IX_JobContacts_ContactTime on JobContacts (ContactTime desc, ContentHash desc)')
+        connection.commit()
+        end = base + datetime.timedelta(minutes=rows - 1)
+        start = end - datetime.timedelta(days=7)
+
+        cursor = connection.cursor()
+        began = time.perf_counter()
+        cursor.execute('select DateOfContact, EmailAddressOfSender, SubjectOfEmail, BodyOfEmail from dbo.JobContacts '
+                       "where DateOfContact between '" + start.strftime('%m/%d/%Y %H:%M') + "' and '" +
+                       end.strftime('%m/%d/%Y %H:%M') + "' order by DateOfContact desc")
+        matched = len(cursor.fetchmany(page_size))
+        first = time.perf_counter() - began
+        matched += len(cursor.fetchall())
+        table.add(rows, 'string', matched, first, time.perf_counter() - began)
+
+        report = ContactReport(connection, limit_style='limit')
+        began = time.perf_counter()
+        first = None
+        matched = 0
+        for page in report.pages(start.strftime('%Y-%m-%d %H:%M:%S'), end.strftime('%Y-%m-%d %H:%M:%S'), page_size):
+            if first is None:
+                first = time.perf_counter() - began
+            matched += len(page)
+        table.add(rows, 'keyset', matched, first or 0.0, time.perf_counter() - began)
+        connection.close()
+
+def bench_accessors(row_counts, batch_size):
+    """ Compare the time to read every row and total a numeric column with each Database row accessor. """
+    table = Table('rows accessor seconds rows_per_sec', '%10d %10s %12.3f %14.0f')
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in row_counts:
+            path = os.path.join(tmp, 'bench_' + str(rows) + '.db')
+            create_table(path, rows)
+            use_sqlite(path)
+            d = Database('bench')
+            statement = 'select * from bench'
+            for name in ('result_set', 'rows', 'tuples', 'dicts', 'columns'):
+                start = time.perf_counter()
+                total = 0
+                if name == 'result_set':
+                    for row in d.result_set(statement):
+                        total += row[0]
+                elif name == 'rows':
+                    for row in d.iter_rows(statement, batch_size):
+                        total += row[0]
+                elif name == 'tuples':
+                    for row in d.iter_tuples(statement, batch_size):
+                        total += row[0]
+                elif name == 'dicts':
+                    for row in d.iter_dicts(statement, batch_size):
+                        total += row['id']
+                else:
+                    for block in d.iter_columns(statement, batch_size):
+                        total += sum(block['id'])
+                seconds = time.perf_counter() - start
+                table.add(rows, name, seconds, rows / seconds)
+            d.close()
+
+def bench_async(row_counts, batch_size, queries=64, workers=4, latency=0.02):
+    """ Compare the throughput of independent queries run one at a time on Database against
+        AsyncDatabase running them concurrently on workers connections, with latency seconds
+        of simulated server time per query. """
+    from .async_database import AsyncDatabase
+    table = Table('rows class seconds queries_per_sec', '%10d %10s %12.3f %14.1f')
+    statements = ["select count(*), max(col1) from bench where col%d like '%%%d%%'" % (i % 8, i % 10) for i in range(queries)]
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in row_counts:
+            path = os.path.join(tmp, 'bench_' + str(rows) + '.db')
+            create_table(path, rows)
+            use_sqlite(path, latency)
+            d = Database('bench')
+            start = time.perf_counter()
+            for statement in statements:
+                d.result_set(statement)
+            seconds = time.perf_counter() - start
+            d.close()
+            table.add(rows, 'sync', seconds, queries / seconds)
+
+            async def run():
+                async with AsyncDatabase('bench', workers=workers) as db:
+                    await db.fetch('select 1')
+                    start = time.perf_counter()
+                    await asyncio.gather(*(db.fetch(statement) for statement in statements))
+                    return time.perf_counter() - start
+            seconds = asyncio.run(run())
+            table.add(rows, 'async_' + str(workers), seconds, queries / seconds)
+
+def bench_cache(row_counts, batch_size, queries=200):
+    """ Compare repeated result_set calls for a reference table without a cache, with a memory cache,
+        and with a cache file read by a fresh process. """
+    table = Table('rows cache seconds ms_per_query', '%10d %10s %12.3f %14.3f')
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in row_counts:
+            path = os.path.join(tmp, 'bench_' + str(rows) + '.db')
+            create_table(path, rows)
+            use_sqlite(path)
+            statement = 'select * from bench where id < 1000'
+            cache_path = os.path.join(tmp, 'cache_' + str(rows) + '.db')
+            for name, cache in (('none', None), ('memory', QueryCache()), ('file', QueryCache(cache_path))):
+                d = Database('bench', cache=cache)
+                if name == 'file':
+                    # Fill the cache file, then read it as a new process would, with an empty memory cache.
+                    d.result_set(statement)
+                    cache.close()
+                    d.cache = cache = QueryCache(cache_path, max_entries=0)
+                start = time.perf_counter()
+                for i in range(queries):
+                    d.result_set(statement)
+                seconds = time.perf_counter() - start
+                table.add(rows, name, seconds, seconds * 1000 / queries)
+                d.close()
+                if cache is not None:
+                    cache.close()
+
+def bench_load(row_counts, batch_size):
+    """ Compare loading a CSV file with one INSERT statement per row against BulkLoader batches. """
+    table = Table('rows load seconds rows_per_sec', '%10d %10s %12.3f %14.0f')
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in row_counts:
+            csv_path = os.path.join(tmp, 'load_' + str(rows) + '.csv')
+            with open(csv_path, 'wt', newline='', encoding='utf-8') as out:
+                writer = csv.writer(out)
+                writer.writerow(['id', 'name', 'amount', 'created'])
+                writer.writerows((i, 'name ' + str(i), '%.2f' % (i * 0.5), '2024-01-01 10:00:00') for i in range(rows))
+            path = os.path.join(tmp, 'load_' + str(rows) + '.db')
+            use_sqlite(path)
+            d = Database('bench')
+            d.execute('create table legacy (id bigint, name nvarchar(4000), amount float, created datetime2)', True)
+            start = time.perf_counter()
+            with open(csv_path, 'rt', newline='', encoding='utf-8') as csv_file:
+                reader = csv.reader(csv_file)
+                next(reader)
+                for row in reader:
+                    d.execute("insert into legacy values (" + row[0] + ", '" + row[1] + "', " + row[2] + ", '" + row[3] + "')", False)
+            d.commit()
+            seconds = time.perf_counter() - start
+            table.add(rows, 'row_sql', seconds, rows / seconds)
+            loader = BulkLoader(d, 'staging', batch_size, commit_interval=50000)
+            loader.load(csv_path)
+            table.add(rows, 'bulk', loader.seconds, loader.rate())
+            d.close()
+
+def bench_params(row_counts, batch_size):
+    """ Compare single row lookups and inserts built as SQL strings against parameterized statements
+        on their own cursor, with executemany for the inserts.  row_counts is the number of calls. """
+    table = Table('calls statement seconds calls_per_sec', '%10d %14s %12.3f %14.0f')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        create_table(path, 10000)
+        use_sqlite(path)
+        d = Database('bench')
+        d.execute('create index ix_bench_id on bench (id)', True)
+        d.execute('create table bench_insert (id integer, name text)', True)
+        for calls in row_counts:
+            start = time.perf_counter()
+            for i in range(calls):
+                d.result_set('select * from bench where id = ' + str(i % 10000))
+            seconds = time.perf_counter() - start
+            table.add(calls, 'select_string', seconds, calls / seconds)
+            start = time.perf_counter()
+            for i in range(calls):
+                d.query('select * from bench where id = ?', (i % 10000,))
+            seconds = time.perf_counter() - start
+            table.add(calls, 'select_params', seconds, calls / seconds)
+
+            start = time.perf_counter()
+            for i in range(calls):
+                d.execute("insert into bench_insert values (" + str(i) + ", 'name " + str(i) + "')", False)
+            d.commit()
+            seconds = time.perf_counter() - start
+            table.add(calls, 'insert_string', seconds, calls / seconds)
+            start = time.perf_counter()
+            for i in range(calls):
+                d.execute('insert into bench_insert values (?, ?)', (i, 'name ' + str(i)))
+            d.commit()
+            seconds = time.perf_counter() - start
+            table.add(calls, 'insert_params', seconds, calls / seconds)
+            start = time.perf_counter()
+            d.executemany('insert into bench_insert values (?, ?)', [(i, 'name ' + str(i)) for i in range(calls)], True)
+            seconds = time.perf_counter() - start
+            table.add(calls, 'insert_many', seconds, calls / seconds)
+        d.close()
+
+CASES = {
+    'accessors': bench_accessors,
+    'async': bench_async,
+    'cache': bench_cache,
+    'contacts': bench_contacts,
+    'dedup': bench_dedup,
+    'export': bench_export,
+    'extract': bench_extract,
+    'format': bench_format,
+    'ingest': bench_ingest,
+    'load': bench_load,
+    'params': bench_params,
+    'pipeline': bench_pipeline,
+    'report': bench_report,
+    'sql': bench_sql,
+}
+
+def main(argv):
+    batch_size = 1000
+    case = ''
+    child = ''
+    json_file = ''
+    mode = ''
+    path = ''
+    row_counts = [10000, 100000, 1000000]
+    opts, args = getopt.getopt(argv, "", ["batch-size=", "case=", "child=", "json=", "mode=", "path=", "rows="])
+    for opt, arg in opts:
+        if opt == "--batch-size":
+            batch_size = int(arg)
+        elif opt == "--case":
+            case = arg
+        elif opt == "--child":
+            child = arg
+        elif opt == "--json":
+            json_file = arg
+        elif opt == "--mode":
+            mode = arg
+        elif opt == "--path":
+            path = arg
+        elif opt == "--rows":
+            row_counts = [int(n) for n in arg.split(',')]
+
+    if child == 'export':
+        _export_child(path, mode, batch_size)
+        return 0
+    if child == 'sql':
+        _sql_child(path, mode, batch_size)
+        return 0
+
+    started = datetime.datetime.now()
+    cases = {}
+    for name, bench in CASES.items():
+        if case in ('', name):
+            print('-- ' + name + ' --')
+            first = len(RESULTS)
+            bench(row_counts, batch_size)
+            cases[name] = RESULTS[first:]
+
+    # Write the results with the versions and options they were run with.
+    if json_file > '':
+        with open(json_file, 'wt', encoding='utf-8') as out:
+            json.dump({'started': started.isoformat(timespec='seconds'), 'python': sys.version.split()[0],
+                       'sqlite': sqlite3.sqlite_version, 'platform': sys.platform, 'cpus': os.cpu_count(),
+                       'batch_size': batch_size, 'rows': row_counts, 'cases': cases}, out, indent=1)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,301 @@
+'''
+    Bulk load of a CSV or Parquet file into a database table for sql.py --load.
+
+    The file is read in chunks of batch_size rows, and each chunk is inserted with one executemany
+    call, which pyodbc sends in bulk with fast_executemany.  The inserts are committed every
+    commit_interval rows.  After each commit, the number of rows committed is written to a state
+    file next to the input file, so a load that fails part way resumes after the last commit.
+
+    Syntax:
+        loader = BulkLoader(d, 'dbo.Staging', batch_size=1000, commit_interval=50000)
+        loader.load('extract.csv')
+
+    Notes:
+        A CSV file starts with a header row of column names, unless header=False.  Without a header,
+        values are inserted by position.  Empty CSV values are loaded as nulls.
+        When the table does not exist, it is created with column types inferred from the first chunk,
+        or given in types as a dict of column name to SQL type.  Text columns are created as
+        nvarchar(4000); give nvarchar(max) in types for longer text.  A column of numbers is inferred
+        as text when any of them has a leading zero, such as a zip code, so the zeros are kept.
+        The state file is removed when the load completes.  A load interrupted between a commit and the
+        state file update loads that commit interval again when it resumes.
+'''
+
+import csv
+import datetime
+import decimal
+import itertools
+import json
+import os
+import re
+import time
+
+# SQL types for the columns of a new table, by the Python type of the column values.
+SQL_TYPES = {
+    bool: 'bit',
+    int: 'bigint',
+    float: 'float',
+    decimal.Decimal: 'decimal(38, 10)',
+    datetime.datetime: 'datetime2',
+    datetime.date: 'date',
+    str: 'nvarchar(4000)',
+    bytes: 'varbinary(8000)',
+}
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Loading parquet files requires the pyarrow package.  Install it with "py -m pip install pyarrow".')
+    return pyarrow
+
+def _parse_datetime(value):
+    return datetime.datetime.fromisoformat(value)
+
+def _parse_date(value):
+    return datetime.date.fromisoformat(value)
+
+# Text converters tried in order when inferring the type of a CSV column.
+CONVERTERS = [(int, int), (float, float), (datetime.date, _parse_date), (datetime.datetime, _parse_datetime)]
+
+# A number with a leading zero, such as a zip code or an account number, which int and float would drop.
+_LEADING_ZERO = re.compile(r'\s*[+-]?0\d')
+
+def infer_type(values):
+    """ Return the Python type of a CSV column from its text values, ignoring empty values. """
+    values = [value for value in values if value != '']
+    if not values:
+        return str
+    leading_zero = any(_LEADING_ZERO.match(value) for value in values)
+    for python_type, convert in CONVERTERS:
+        if leading_zero and python_type in (int, float):
+            continue
+        try:
+            for value in values:
+                convert(value)
+            return python_type
+        except ValueError:
+            pass
+    return str
+
+def _converter(python_type):
+    for converter_type, convert in CONVERTERS:
+        if converter_type is python_type:
+            return convert
+    if python_type is decimal.Decimal:
+        return decimal.Decimal
+    if python_type is bool:
+        return lambda value: value.lower() in ('1', 'true', 'yes')
+    return None
+
+def read_csv(path, batch_size=1000, encoding='utf-8', colsep=',', quote='"', header=True):
+    """ Return the column names, or None without a header, and a generator of lists of up to batch_size rows. """
+    names = None
+    if header:
+        with open(path, 'rt', newline='', encoding=encoding) as csv_file:
+            names = next(_csv_reader(csv_file, colsep, quote), None)
+
+    def batches():
+        # The file is opened when the first batch is read, and closed when the last one has been.
+        with open(path, 'rt', newline='', encoding=encoding) as csv_file:
+            reader = _csv_reader(csv_file, colsep, quote)
+            if header:
+                next(reader, None)
+            while True:
+                rows = list(itertools.islice(reader, batch_size))
+                if not rows:
+                    return
+                yield rows
+    return names, batches()
+
+def _csv_reader(csv_file, colsep, quote):
+    if quote > '':
+        return csv.reader(csv_file, delimiter=colsep, quotechar=quote, doublequote=True)
+    return csv.reader(csv_file, delimiter=colsep, quoting=csv.QUOTE_NONE)
+
+def read_parquet(path, batch_size=1000):
+    """ Return the column names, their Python types, and a generator of lists of up to batch_size rows. """
+    pa = _import_pyarrow()
+    parquet_file = pa.parquet.ParquetFile(path)
+    names = parquet_file.schema_arrow.names
+    types = [_arrow_python_type(pa, field.type) for field in parquet_file.schema_arrow]
+
+    def batches():
+        for batch in parquet_file.iter_batches(batch_size):
+            yield list(zip(*[column.to_pylist() for column in batch.columns]))
+    return names, types, batches()
+
+def _arrow_python_type(pa, arrow_type):
+    if pa.types.is_boolean(arrow_type):
+        return bool
+    if pa.types.is_integer(arrow_type):
+        return int
+    if pa.types.is_floating(arrow_type):
+        return float
+    if pa.types.is_decimal(arrow_type):
+        return decimal.Decimal
+    if pa.types.is_timestamp(arrow_type):
+        return datetime.datetime
+    if pa.types.is_date(arrow_type):
+        return datetime.date
+    if pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type):
+        return bytes
+    return str
+
+def _missing_table(error):
+    # SQL Server reports a missing table as SQLSTATE 42S02, "Invalid object name", and SQLite, under the
+    # pyodbc stand-in of the tests, as "no such table".  Any other error, like a denied permission, is not.
+    text = ' '.join(str(arg) for arg in error.args)
+    return '42S02' in text or 'Invalid object name' in text or 'no such table' in text
+
+class BulkLoader:
+    """ Insert the rows of a CSV or Parquet file into a table in batches, committing every commit_interval rows. """
+    def __init__(self, database, table, batch_size=1000, commit_interval=10000, types=None, header=True, progress=None):
+        self.database = database
+        self.table = table
+        self.batch_size = batch_size
+        self.commit_interval = max(commit_interval, batch_size)
+        self.types = types or {}
+        self.header = header
+        self.progress = progress  # called with (rows committed, rows per second) after each commit
+        self.rows = 0
+        self.skipped = 0
+        self.seconds = 0.0
+        self.inferred = set()  # names of the new table's columns whose type was inferred from the CSV text
+
+    """ Load a file into the table and return the number of rows inserted by this run.
+        The format is taken from the file extension, .parquet for Parquet and anything else for CSV. """
+    def load(self, path, format=None, encoding='utf-8', colsep=',', quote='"'):
+        format = format or ('parquet' if path.lower().endswith('.parquet') else 'csv')
+        if format == 'parquet':
+            names, python_types, batches = read_parquet(path, self.batch_size)
+            first = next(batches, [])
+        else:
+            names, batches = read_csv(path, self.batch_size, encoding, colsep, quote, self.header)
+            first = next(batches, [])
+            if names is None and first:
+                names = ['Column' + str(i + 1) for i in range(len(first[0]))]
+            if not names:
+                return 0
+            python_types = [infer_type(values) for values in zip(*first)] if first else [str] * len(names)
+
+        existing = self._table_types()
+        if existing is None:
+            self._create_table(names, python_types)
+            if format != 'parquet':
+                # The values of the columns given a type in types are sent as text, for the database to convert.
+                python_types = [str if self.types.get(name) else python_type for name, python_type in zip(names, python_types)]
+                self.inferred = set(name for name in names if not self.types.get(name))
+        elif format != 'parquet':
+            # Convert the CSV text to the column types of the existing table where the driver reports them,
+            # matching the columns by name with a header and by position without one.
+            if self.header:
+                by_name = {name.lower(): existing_type for name, existing_type in existing}
+                existing_types = [by_name.get(name.lower()) for name in names]
+            else:
+                existing_types = [existing_type for name, existing_type in existing]
+            python_types = [existing_type or inferred for existing_type, inferred in zip(existing_types + [None] * len(names), python_types)]
+
+        conversions = [(name, python_type, _converter(python_type)) for name, python_type in zip(names, python_types)]
+        state_path = path + '.load'
+        start_row = self._read_state(state_path)
+        # Without a header, the values are inserted by position.
+        columns = ''
+        if self.header or format == 'parquet':
+            columns = ' (' + ', '.join(self._quote_name(name) for name in names) + ')'
+        statement = 'insert into ' + self.table + columns + ' values (' + ', '.join('?' * len(names)) + ')'
+
+        started = time.perf_counter()
+        position = 0
+        uncommitted = 0
+        for rows in itertools.chain([first], batches):
+            if not rows:
+                continue
+            if position + len(rows) <= start_row:
+                position += len(rows)
+                self.skipped += len(rows)
+                continue
+            if position < start_row:
+                self.skipped += start_row - position
+                rows = rows[start_row - position:]
+                position = start_row
+            if format != 'parquet':
+                rows = [self._convert(row, conversions, position + i + 1, state_path) for i, row in enumerate(rows)]
+            self.database.executemany(statement, rows)
+            position += len(rows)
+            uncommitted += len(rows)
+            self.rows += len(rows)
+            if uncommitted >= self.commit_interval:
+                self._commit(state_path, position, started)
+                uncommitted = 0
+        if uncommitted > 0:
+            self._commit(state_path, position, started)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        return self.rows
+
+    """ Return the rows per second inserted so far. """
+    def rate(self):
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def _commit(self, state_path, position, started):
+        self.database.commit()
+        self.seconds = time.perf_counter() - started
+        # Write to a temporary file and rename it, so an interrupted run never leaves a partial state file.
+        with open(state_path + '.tmp', 'wt', encoding='utf-8') as state:
+            json.dump({'table': self.table, 'rows': position}, state)
+        os.replace(state_path + '.tmp', state_path)
+        if self.progress is not None:
+            self.progress(position, self.rate())
+
+    def _convert(self, row, conversions, line, state_path):
+        values = []
+        for value, (name, python_type, convert) in zip(row, conversions):
+            if value == '':
+                values.append(None)
+            elif convert is None:
+                values.append(value)
+            else:
+                try:
+                    values.append(convert(value))
+                except (ValueError, decimal.InvalidOperation):
+                    message = ('Row ' + str(line) + ': cannot convert ' + repr(value) + ' to ' + python_type.__name__ +
+                               ' for column ' + name + ' of ' + self.table)
+                    if name in self.inferred:
+                        message += ('.  The column type was inferred from the first rows of the file.  To load the column as text, '
+                                    'drop ' + self.table + ', delete ' + state_path + ' and load again with --types="' +
+                                    name + '=' + SQL_TYPES[str] + '"')
+                    raise ValueError(message)
+        return values
+
+    def _create_table(self, names, python_types):
+        columns = []
+        for name, python_type in zip(names, python_types):
+            sql_type = self.types.get(name) or SQL_TYPES.get(python_type, SQL_TYPES[str])
+            columns.append(self._quote_name(name) + ' ' + sql_type)
+        self.database.execute('create table ' + self.table + ' (' + ', '.join(columns) + ')', True)
+
+    def _quote_name(self, name):
+        return '[' + name.replace(']', ']]') + ']'
+
+    def _read_state(self, state_path):
+        if not os.path.exists(state_path):
+            return 0
+        with open(state_path, 'rt', encoding='utf-8') as state:
+            data = json.load(state)
+        return data['rows'] if data.get('table') == self.table else 0
+
+    def _table_types(self):
+        # Return (name, Python type) for the columns of the existing table, with None where the driver
+        # reports no type, or None when the table does not exist.
+        try:
+            cursor = self.database.execute('select * from ' + self.table + ' where 1 = 0')
+        except Exception as error:
+            if not _missing_table(error):
+                raise
+            self.database.rollback()
+            return None
+        types = [(column[0], column[1] if isinstance(column[1], type) else None) for column in cursor.description]
+        cursor.fetchall()
+        return types
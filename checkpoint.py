@@ -0,0 +1,81 @@
+'''
+    Persisted high-water mark for incremental runs of job_contacts.py.
+
+    The checkpoint is a small JSON file holding the latest received time processed and the message
+    IDs processed within the overlap window before it.  When no dates are given, the next run only
+    asks the mail source for messages received since the start of the overlap window, and skips the
+    IDs it has already seen.
+
+    Syntax:
+        checkpoint = Checkpoint('job_contacts.state')
+        for msg in source.messages(checkpoint.resume_time(), None):
+            if checkpoint.seen(msg):
+                continue
+            ...
+            checkpoint.mark(msg)
+        checkpoint.save()
+
+    Notes:
+        The overlap window catches messages that arrive late with an earlier received time,
+        and messages sharing the last minute, since Outlook filters dates to the minute.
+        Only the message IDs are used to skip messages, so a run given an older date range reads
+        that whole range again, and a backfill is not cut short by the checkpoint.
+        Outlook filters the messages by date itself, so a run with no new mail reads next to nothing.
+        The mbox, Maildir and .eml sources still read the headers of every message to find its date.
+'''
+
+import json
+import os
+from datetime import datetime, timedelta
+
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+class Checkpoint:
+    """ Track the last received time and the recently processed message IDs in a state file. """
+    def __init__(self, path, overlap=timedelta(hours=1)):
+        self.path = path
+        self.overlap = overlap
+        self.last_received_time = None
+        self.message_ids = {}  # message ID -> received time
+        self.marked = 0
+        if os.path.exists(path):
+            with open(path, 'rt', encoding='utf-8') as state:
+                data = json.load(state)
+            if data.get('last_received_time'):
+                self.last_received_time = datetime.strptime(data['last_received_time'], TIME_FORMAT)
+            self.message_ids = {message_id: datetime.strptime(received, TIME_FORMAT)
+                                for message_id, received in data.get('message_ids', {}).items()}
+
+    """ Record a message as processed. """
+    def mark(self, msg):
+        self.message_ids[msg.message_id] = msg.received_time
+        if self.last_received_time is None or msg.received_time > self.last_received_time:
+            self.last_received_time = msg.received_time
+        self.marked += 1
+
+    """ Return the time to resume reading from, or None when there is no checkpoint yet. """
+    def resume_time(self):
+        if self.last_received_time is None:
+            return None
+        return self.last_received_time - self.overlap
+
+    """ Write the checkpoint, keeping only the message IDs within the overlap window. """
+    def save(self):
+        cutoff = self.resume_time()
+        if cutoff is not None:
+            self.message_ids = {message_id: received for message_id, received in self.message_ids.items()
+                                if received >= cutoff}
+        data = {
+            'last_received_time': None if self.last_received_time is None else self.last_received_time.strftime(TIME_FORMAT),
+            'message_ids': {message_id: received.strftime(TIME_FORMAT) for message_id, received in self.message_ids.items()},
+        }
+        # Write to a temporary file and rename it, so an interrupted run never leaves a partial state file.
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wt', encoding='utf-8') as state:
+            json.dump(data, state, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    """ Return True if the message is one of those processed within the overlap window by an earlier run.
+        Older messages are not read when resuming, and are read again for an explicit older date range. """
+    def seen(self, msg):
+        return msg.message_id in self.message_ids
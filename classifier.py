@@ -0,0 +1,59 @@
+'''
+    Rules for classifying email messages as job contacts without prompting, used by job_contacts.py --auto.
+
+    Each rule names an action, a message field and a regular expression.  The first rule whose
+    expression matches the field decides the action for the message.  Messages that match no rule
+    are skipped.  Matching ignores case.
+
+    Rules file syntax, one rule per line, blank lines and lines starting with # are ignored:
+        load    subject   thank you for (applying|your application)
+        skip    sender    ^noreply@newsletter\\.
+        load    body      your application (has been|was) (received|submitted)
+
+    Fields: sender, subject, body.  Actions: load, skip.
+'''
+
+import re
+
+DEFAULT_RULES = [
+    ('skip', 'subject', r'\b(unsubscribe|newsletter|job alert|jobs you may be interested in|recommended jobs)\b'),
+    ('load', 'subject', r'\b(thank you for (applying|your application|your interest)|application (received|submitted|confirmation))\b'),
+    ('load', 'subject', r'\byour application\b'),
+    ('load', 'body', r'\b(thank you for applying|we (have )?received your application|your application (has been|was) (received|submitted))\b'),
+]
+
+FIELDS = ('sender', 'subject', 'body')
+ACTIONS = ('load', 'skip')
+
+class Classifier:
+    """ Decide whether to load or skip a message from an ordered list of (action, field, pattern) rules. """
+    def __init__(self, rules=None):
+        self.rules = []
+        for action, field, pattern in (DEFAULT_RULES if rules is None else rules):
+            if action not in ACTIONS:
+                raise ValueError('Unknown rule action: ' + action)
+            if field not in FIELDS:
+                raise ValueError('Unknown rule field: ' + field)
+            self.rules.append((action, field, re.compile(pattern, re.IGNORECASE)))
+
+    """ Return 'load' or 'skip' for a MailMessage. """
+    def classify(self, msg):
+        for action, field, regex in self.rules:
+            value = getattr(msg, field)
+            if value and regex.search(value):
+                return action
+        return 'skip'
+
+def read_rules(path, encoding='utf-8'):
+    """ Read a rules file and return the list of (action, field, pattern) rules. """
+    rules = []
+    with open(path, 'rt', encoding=encoding) as rules_file:
+        for number, line in enumerate(rules_file, 1):
+            line = line.strip()
+            if line == '' or line.startswith('#'):
+                continue
+            parts = line.split(None, 2)
+            if len(parts) != 3:
+                raise ValueError(path + ' line ' + str(number) + ': expected "action field pattern"')
+            rules.append((parts[0].lower(), parts[1].lower(), parts[2]))
+    return rules
@@ -0,0 +1,222 @@
+'''
+    Columnar binary writers used by sql.py for the parquet, arrow and npy output formats.
+
+    Each writer takes the cursor description of the resultset and buffers the rows as they are fetched.
+    Every row_group_size rows, the buffered rows are transposed into columns and written to the output
+    file, so memory use is bounded by the row group size rather than the size of the resultset.
+
+    Notes:
+        The parquet and arrow formats require the pyarrow package.  The npy format requires numpy.
+        Column types are taken from the cursor description.  When a driver does not report a type,
+        the type is inferred from the first non-null value in the first row group.
+'''
+
+import datetime
+import decimal
+import struct
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('The parquet and arrow output formats require the pyarrow package.  Install it with "py -m pip install pyarrow".')
+    return pyarrow
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('The npy output format requires the numpy package.  Install it with "py -m pip install numpy".')
+    return numpy
+
+def _column_types(description, rows):
+    """ Return the python type of each column, from the description or the first non-null value. """
+    types = []
+    for i, column in enumerate(description):
+        type_code = column[1]
+        if not isinstance(type_code, type):
+            type_code = str
+            for row in rows:
+                if row[i] is not None:
+                    type_code = type(row[i])
+                    break
+        types.append(type_code)
+    return types
+
+class ColumnarWriter:
+    """ Buffer rows and hand each full row group to write_row_group, transposed into one tuple per column. """
+    def __init__(self, path, description, row_group_size=100000):
+        self.path = path
+        self.description = description
+        self.names = [column[0] for column in description]
+        self.row_group_size = row_group_size
+        self.rows = []
+        self.types = None
+        self.count = 0
+
+    """ Add a batch of rows, writing a row group each time row_group_size rows are buffered. """
+    def write_batch(self, rows):
+        self.rows.extend(rows)
+        while len(self.rows) >= self.row_group_size:
+            self._flush(self.rows[:self.row_group_size])
+            del self.rows[:self.row_group_size]
+
+    """ Write any buffered rows and close the output file. """
+    def close(self):
+        if self.rows or self.types is None:
+            self._flush(self.rows)
+            self.rows = []
+        self.close_file()
+
+    def _flush(self, rows):
+        if self.types is None:
+            self.types = _column_types(self.description, rows)
+            self.open_file()
+        columns = list(zip(*rows)) if rows else [() for name in self.names]
+        self.write_row_group(columns, len(rows))
+        self.count += len(rows)
+
+class ArrowWriter(ColumnarWriter):
+    """ Write the resultset as an Arrow IPC file, one record batch per row group. """
+    def open_file(self):
+        pa = _import_pyarrow()
+        self.schema = pa.schema([pa.field(name, self.arrow_type(i)) for i, name in enumerate(self.names)])
+        self.writer = pa.ipc.new_file(self.path, self.schema)
+
+    def arrow_type(self, i):
+        pa = _import_pyarrow()
+        type_code = self.types[i]
+        if type_code is bool:
+            return pa.bool_()
+        if type_code is int:
+            return pa.int64()
+        if type_code is float:
+            return pa.float64()
+        if type_code is decimal.Decimal:
+            precision = self.description[i][4]
+            scale = self.description[i][5]
+            if precision and precision <= 38:
+                return pa.decimal128(precision, scale or 0)
+            return pa.float64()
+        if type_code is datetime.datetime:
+            return pa.timestamp('us')
+        if type_code is datetime.date:
+            return pa.date32()
+        if type_code is datetime.time:
+            return pa.time64('us')
+        if type_code in (bytes, bytearray):
+            return pa.binary()
+        return pa.string()
+
+    def record_batch(self, columns):
+        pa = _import_pyarrow()
+        arrays = []
+        for field, column in zip(self.schema, columns):
+            if pa.types.is_string(field.type):
+                column = [None if x is None else str(x) for x in column]
+            elif pa.types.is_floating(field.type):
+                column = [None if x is None else float(x) for x in column]
+            arrays.append(pa.array(column, type=field.type))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def write_row_group(self, columns, count):
+        if count:
+            self.writer.write_batch(self.record_batch(columns))
+
+    def close_file(self):
+        self.writer.close()
+
+class ParquetWriter(ArrowWriter):
+    """ Write the resultset as a Parquet file, one Parquet row group per row group. """
+    def open_file(self):
+        pa = _import_pyarrow()
+        self.schema = pa.schema([pa.field(name, self.arrow_type(i)) for i, name in enumerate(self.names)])
+        self.writer = pa.parquet.ParquetWriter(self.path, self.schema)
+
+    def write_row_group(self, columns, count):
+        if count:
+            pa = _import_pyarrow()
+            self.writer.write_table(pa.Table.from_batches([self.record_batch(columns)]),
+                                    row_group_size=self.row_group_size)
+
+class NpyWriter(ColumnarWriter):
+    """ Write the resultset as a NumPy .npy file holding a one dimensional structured array.
+
+        The header is written with room for the final row count, the rows are appended as they
+        arrive, and the header is rewritten with the row count when the file is closed.
+        Nullable integer and bit columns are stored as float64 so that nulls can be written as NaN.
+        Character columns are stored as fixed width unicode of the column size reported by the
+        driver, or 255 characters when no size is reported, and longer values are truncated.
+    """
+    def open_file(self):
+        np = _import_numpy()
+        fields = []
+        self.fills = []
+        for i, name in enumerate(self.names):
+            dtype, fill = self.numpy_type(i)
+            fields.append((name, dtype))
+            self.fills.append(fill)
+        self.dtype = np.dtype(fields)
+        self.file = open(self.path, 'wb')
+        self.file.write(self.header(0))
+
+    def numpy_type(self, i):
+        type_code = self.types[i]
+        null_ok = self.description[i][6] is not False
+        if type_code in (bool, int):
+            if null_ok:
+                return '<f8', float('nan')
+            return ('?', False) if type_code is bool else ('<i8', 0)
+        if type_code in (float, decimal.Decimal):
+            return '<f8', float('nan')
+        if type_code is datetime.datetime:
+            return '<M8[us]', None
+        if type_code is datetime.date:
+            return '<M8[D]', None
+        size = self.description[i][3] or self.description[i][2] or 255
+        if type_code in (bytes, bytearray):
+            return 'S' + str(size), b''
+        return '<U' + str(size), ''
+
+    def header(self, count):
+        np = _import_numpy()
+        descr = np.lib.format.dtype_to_descr(self.dtype)
+        header = "{'descr': " + repr(descr) + ", 'fortran_order': False, 'shape': (" + str(count) + ",), }"
+        # Reserve room for a 20 digit row count so the header can be rewritten in place.
+        header += ' ' * (20 - len(str(count)))
+        padding = 64 - (len(header) + 11) % 64
+        header = header + ' ' * padding + '\n'
+        return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+    def write_row_group(self, columns, count):
+        if count == 0:
+            return
+        np = _import_numpy()
+        array = np.empty(count, dtype=self.dtype)
+        for name, fill, column in zip(self.names, self.fills, columns):
+            kind = self.dtype[name].kind
+            if kind in ('U', 'S'):
+                column = [fill if x is None else x for x in column]
+                if kind == 'U':
+                    column = [x if isinstance(x, str) else str(x) for x in column]
+            elif fill is not None:
+                column = [fill if x is None else x for x in column]
+            array[name] = column
+        self.file.write(array.tobytes())
+
+    def close_file(self):
+        self.file.seek(0)
+        self.file.write(self.header(self.count))
+        self.file.close()
+
+WRITERS = {
+    'arrow': ArrowWriter,
+    'npy': NpyWriter,
+    'parquet': ParquetWriter,
+}
+
+def get_writer(name, path, description, row_group_size=100000):
+    """ Return a columnar writer for the named output format. """
+    return WRITERS[name](path, description, row_group_size)
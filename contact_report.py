@@ -0,0 +1,97 @@
+'''
+    Report queries over the dbo.JobContacts table for the weekly job contact submission.
+
+    Contacts are selected by the typed ContactTime datetime column with parameterized range queries,
+    and read newest first with keyset pagination: each page asks for the next page_size rows after the
+    last (ContactTime, ContentHash) seen, so every page is an index seek on IX_JobContacts_ContactTime
+    no matter how deep into the report it is.
+
+    Syntax:
+        report = ContactReport(conn)
+        for page in report.pages(start, end, page_size=50):
+            ...
+        with open('week.csv', 'wt', newline='', encoding='utf-8') as out:
+            report.write_csv(out, start, end)
+
+    Notes:
+        Run job_contacts.py --migrate once to add the ContactTime column and its index.
+'''
+
+import csv
+import json
+from datetime import date, datetime
+
+REPORT_COLUMNS = ['ContactTime', 'Employer', 'Position', 'ApplicationDate', 'EmailAddressOfSender', 'SubjectOfEmail']
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+class ContactReport:
+    """ Read job contacts for a date range, newest first, one page at a time. """
+    def __init__(self, connection, include_body=False, limit_style='top'):
+        self.connection = connection
+        self.columns = REPORT_COLUMNS + (['BodyOfEmail'] if include_body else [])
+        # SQL Server uses "select top (n)".  limit_style='limit' uses "limit n" for other databases.
+        self.limit_style = limit_style
+
+    def _page_query(self, keyset):
+        select = 'select ' + ('top (?) ' if self.limit_style == 'top' else '')
+        query = select + ', '.join(self.columns) + ', ContentHash from dbo.JobContacts where ContactTime between ? and ? '
+        if keyset:
+            # The leading ContactTime <= ? keeps the predicate a range seek on the index; the or only filters within it.
+            query += 'and ContactTime <= ? and (ContactTime < ? or ContentHash < ?) '
+        query += 'order by ContactTime desc, ContentHash desc'
+        if self.limit_style != 'top':
+            query += ' limit ?'
+        return query
+
+    """ Yield lists of up to page_size rows for the contacts between start and end, newest first.
+        Each row is a tuple of the report columns. """
+    def pages(self, start, end, page_size=100):
+        cursor = self.connection.cursor()
+        last = None
+        while True:
+            params = [start, end]
+            if last is not None:
+                params += [last[0], last[0], last[1]]
+            if self.limit_style == 'top':
+                params.insert(0, page_size)
+            else:
+                params.append(page_size)
+            rows = cursor.execute(self._page_query(last is not None), params).fetchall()
+            if not rows:
+                break
+            yield [tuple(row[:-1]) for row in rows]
+            if len(rows) < page_size:
+                break
+            last = (rows[-1][0], rows[-1][-1])
+        cursor.close()
+
+    """ Yield the report rows for the contacts between start and end, newest first. """
+    def rows(self, start, end, page_size=1000):
+        for page in self.pages(start, end, page_size):
+            yield from page
+
+    """ Write the contacts between start and end to a text file as CSV with a header row.  Return the row count. """
+    def write_csv(self, out, start, end, page_size=1000):
+        writer = csv.writer(out)
+        writer.writerow(self.columns)
+        count = 0
+        for page in self.pages(start, end, page_size):
+            writer.writerows(page)
+            count += len(page)
+        return count
+
+    """ Write the contacts between start and end to a text file as a JSON array of objects.  Return the row count. """
+    def write_json(self, out, start, end, page_size=1000):
+        count = 0
+        out.write('[')
+        for page in self.pages(start, end, page_size):
+            for row in page:
+                out.write(',\n' if count else '\n')
+                json.dump({name: _json_value(value) for name, value in zip(self.columns, row)}, out)
+                count += 1
+        out.write('\n]\n')
+        return count
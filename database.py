@@ -1,168 +1,282 @@
 '''
-    Python filter program to execute SQL commands using sys, getopt, and pyodbc modules.
-    Type "py sql.py" at command line to view syntax.
-
-    Parameters:
-        --colsep    Column separator on the output file.  Optional, default=",".  For tab delimited, use "\t"
-        --database  Name of the ODBC datasource for database connection.  Required, no default.
-        --encoding  Encoding of input/output files.  Optional, default="utf-8".
-        --infile    Input SQL file name.  Optional, text may be piped in from console.
-        --outfile   Output file name.  Optional, text will be written to the console if not used.
-        --quote     Quote character around column values.  Optional, default='"'.  Eliminate quotes with --q=""
-
-    Syntax: echo "select * from table_name" | py sql.py --database=DB_NAME > somefile.csv
-    Alternate Syntax: py sql.py --colsep="|" --database="DB_NAME" --infile="sqlinput.sql" --outfile="output.csv" --quote='"'
-    Short Syntax: py sql.py --c="," --d="MyDbName" --i="MySqlFile.sql" --o="MyOutputFile.csv" --q='"'
+    The Database class, a connection to a SQL Server database through a named ODBC datasource.
+    The scripts in this folder import it by module name, "from database import Database", and the
+    package exports it as Nelnet.Database.  pyodbc is imported when a connection is opened, so the module
+    can be imported where no ODBC driver manager is installed.
 
     Notes:
         On Windows, use the ODBC Data Sources app to name and configure the database connection.
+'''
 
-        Double-Dash, (--) is required before command line parameter name.
-        Equal sign, (=) is required between the command line parameter name and the parameter value.
-        If unexpected results occur, check the command line for missing dashes and misspelling of parameter names.
-        Put parameter values in quotes if they contain spaces or special characters.  Otherwise, they will be misinterpreted.
+import array
+import collections
+import time
 
-        If --infile is used, the SQL input file defaults to utf-8 encoding.  If your SQL input file is encoded with
-        UTF-16 format, use --e="utf-16" in the command line parameters in order to read the infile properly.
-        On Windows, you can change the file encoding of the SQL input file using notepad's "save as..." feature.
+try:
+    from .instrumentation import row_bytes
+    from .pool import ConnectionPool
+except ImportError:
+    from instrumentation import row_bytes
+    from pool import ConnectionPool
 
-        For tab delimited output, use --colsep="\t" in the command line parameters.
-'''
+# array.array type codes for the numeric column types returned by the driver.
+ARRAY_TYPECODES = {int: 'q', float: 'd'}
 
-import sys
-import getopt
-import database
-from database import Database
-
-def _print_syntax():
-    syntax = '''    Default syntax: echo "select * from table_name" | py sql.py --database=DB_NAME > somefile.csv
-    Long Syntax:    py sql.py --colsep="|" --database="DB_NAME" --infile="sqlinput.sql" --outfile="output.csv" --quote='"'
-    Short Syntax:   py sql.py --c="," --d="DbName" --i="SqlFile.sql" --o="OutputFile.csv" --q='"'
-    Parameters:
-        --colsep    Column separator on the output.  Optional, default=",".  For tab delimited, use "\\t".
-        --database  Name of the ODBC datasource for database connection.  Required, no default.
-        --encoding  Encoding of input/output file.  Optional, default="utf-8".
-        --infile    Input SQL file name.  Optional, default=pipe SQL input from console.
-        --outfile   Output file name.  Optional, default=print output to console.
-        --quote     Quote character around column values.  Optional, default='"'.  Eliminate quotes with --q=\"\"
-    '''
-    print(syntax)
-    sys.exit(1)
-
-if len(sys.argv) < 2:
-    _print_syntax()
-
-# Set default values for command line parameters.
-argv = sys.argv[1:]
-COL_SEP = ','
-DB_NAME = ''
-ENCODING = 'utf-8'
-IN_FILE = ''
-OUT_FILE = ''
-QUOTE='"'
-SQL_STMT = ''
-
-# Retrieve options from the command line.
-opts, args = getopt.getopt(argv, "c:d:e:i:o:", ["colsep=","database=","encoding=","infile=","outfile=","quote="])
-for opt, arg in opts:
-    if opt in ("-c", "--colsep"):
-        COL_SEP = arg
-        if COL_SEP == "\\t":
-            COL_SEP = "\N{TAB}"
-    elif opt in ("-d", "--database"):
-        DB_NAME = arg
-    elif opt in ("-e", "--encoding"):
-        ENCODING = arg
-    elif opt in ("-i", "--infile"):
-        IN_FILE = arg
-    elif opt in ("-o", "--outfile"):
-        OUT_FILE = arg
-    elif opt in ("-q", "--quote"):
-        QUOTE = arg
-
-# Write the runtime parameters back to the console.
-if OUT_FILE > '':
-    print("Starting program " + sys.argv[0])
-    print("-- Runtime Parameters --")
-    print("  Column Seperator: " + COL_SEP)
-    print("  Database Name:    " + DB_NAME)
-    print("  Encoding:         " + ENCODING)
-    print("  Input File:       " + IN_FILE)
-    print("  Output File:      " + OUT_FILE)
-    print("  Quote:            " + QUOTE)
-
-# If a database name was provided, connect to the database.
-if DB_NAME > '':
-    pass
-# Otherwise, fail with syntax in the error message.
-else:
-    print("--database parameter is a required value")
-    _print_syntax()
-
-# If an input file was passed from command line, open the file for reading
-# and build the SQL statement.  Otherwise, build the SQL statement from console input.
-if IN_FILE > '':
-    try:
-        with open(IN_FILE, "rt", encoding=ENCODING) as inf:
-            for line in inf.readlines():
-                SQL_STMT += line
-    except FileNotFoundError as fail_error:
-        print(fail_error)
-        sys.exit(1)
-else:
-    for line in sys.stdin:
-        SQL_STMT += line
-
-# If an output file was passed from command line, open it for writing.
-# Otherwise, any resultset will be output to stdout (console).
-if OUT_FILE > '':
-    try:
-        OUT = open(OUT_FILE ,mode="wt",buffering=-1,encoding=ENCODING)
-    except IOError as fail_error:
-        print(fail_error)
-        print("Unable to open " + OUT_FILE + " for writing.")
-        sys.exit(1)
-else:
-    OUT = False
-
-# Connect the database.
-d = Database(DB_NAME)
-
-# Execute the SQL statement.
-rows = d.result_set(SQL_STMT)
-
-# If rows were returned in the resultset, either write them to the output file, 
-# or print them to the console, as directed by command line arguments.
-if rows is None:
-    pass
-else:
-    for row in rows:
-        i = 0
-        # Print each column value wrapped in quote characters 
-        # and separated by the column separator.
-        for x in row:
-            if i > 0:
-                if OUT:
-                    OUT.write(COL_SEP)
-                else:
-                    print(",", end='')
-            if OUT:
-                OUT.write(QUOTE + str(x).strip() + QUOTE)
-            else:
-                print(QUOTE + str(x).strip() + QUOTE, end='')
-            i += 1
-        # Print a new line to end the tuple.
-        if OUT:
-             OUT.write("\n")
+class Database:
+    """ Initialize a connection a SQL Server database, borrowing it from the pool if one is given.
+        When a QueryCache is given, result_set and query answer repeated queries from the cache.
+        Parameterized statements each keep their own cursor, up to statement_cache_size statements.
+        When a Profile is given, the connect, execute and fetch phases are timed, and the rows and bytes fetched counted. """
+    def __init__(self, datasource, pool=None, cache=None, statement_cache_size=32, profile=None):
+        self.datasource = datasource
+        self.pool = pool
+        self.cache = cache
+        self.statement_cache_size = statement_cache_size
+        self.statements = collections.OrderedDict()  # statement -> cursor, most recently used last
+        self.profile = profile
+        self.hooks = []  # (before, after) execute hooks
+        start = time.perf_counter()
+        if self.pool is None:
+            import pyodbc
+            self.connection = pyodbc.connect('DSN=' + self.datasource)
+        else:
+            self.connection = self.pool.acquire()
+        self.cursor = self.connection.cursor()
+        if self.profile is not None:
+            self.profile.add('connect', time.perf_counter() - start, 0, 0, self.datasource, start)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    """ Add hooks called around every statement executed: before(statement, params) before it runs,
+        and after(statement, params, cursor, seconds) once it has run.  Either may be None. """
+    def add_hook(self, before=None, after=None):
+        self.hooks.append((before, after))
+
+    """ Close the database connection, or return it to the pool it was borrowed from. """
+    def close(self):
+        if self.connection is None:
+            return
+        for cursor in self.statements.values():
+            cursor.close()
+        self.statements.clear()
+        self.cursor.close()
+        if self.pool is None:
+            self.connection.close()
         else:
-            print('')
+            self.pool.release(self.connection)
+        self.connection = None
+
+    """ Return a list of table column names matching a wildcard pattern. """
+    def columns(self, table, catalog, schema, column):
+        return self.cursor.columns(table,catalog,schema,column)
+
+    """ Commit changes to the database. """
+    def commit(self):
+        self.cursor.commit()
+
+    """ Execute an SQL statement, with a sequence of parameters for its ? markers, and return the cursor.
+        A statement with parameters runs on its own cursor, so the driver reuses the prepared statement.
+        For compatibility, execute(statement, True) runs the statement on the main cursor and commits,
+        unless the statement returned rows. """
+    def execute(self, statement, params=None, commit=False):
+        if params is True or params is False:
+            commit, params = params, None
+        cursor = self._execute(statement, params)
+        if commit is True and cursor.description is None:
+            self.commit()
+        return cursor
+
+    """ Execute an SQL statement once for each sequence of parameters, sending them in batches, and return the cursor. """
+    def executemany(self, statement, seq_of_params, commit=False):
+        cursor = self._statement_cursor(statement)
+        cursor.fast_executemany = True
+        if self.profile is None and not self.hooks:
+            cursor.executemany(statement, seq_of_params)
+        else:
+            self._instrumented('executemany', cursor, cursor.executemany, (statement, seq_of_params), statement, seq_of_params)
+        if commit is True:
+            self.commit()
+        return cursor
+
+    """ Use the pyodbc getinfo function to return the name of the database system. """
+    def get_sql_dbms_name(self):
+        import pyodbc
+        return self.connection.getinfo(pyodbc.SQL_DBMS_NAME)
+
+    """ Use the pyodbc getinfo function to return the version of the database system. """
+    def get_sql_dbms_ver(self):
+        import pyodbc
+        return self.connection.getinfo(pyodbc.SQL_DBMS_VER)
+
+    """ Use the pyodbc getinfo function to return the name of the database driver. """
+    def get_sql_driver_name(self):
+        import pyodbc
+        return self.connection.getinfo(pyodbc.SQL_DRIVER_NAME)
 
-# Clean up and exit.
-if OUT:
-    OUT.close()  # If an output file was created, close it.
-d.close() # Close the cursor.
+    """ Execute the SQL statement and yield the rows in lists of up to batch_size rows, using fetchmany.
+        Nothing is yielded when the statement returns no rows. """
+    def iter_batches(self, statement, batch_size=1000, params=None):
+        yield from self._fetch_batches(self._execute(statement, params), batch_size)
+
+    """ Execute the SQL statement and yield (description, batches) for each result it returns, in order, moving on with
+        nextset.  batches yields the rows in lists of up to batch_size rows.  The description is None for a statement
+        that returned no rows, and cursor.rowcount then holds the rows it affected until the next result is read. """
+    def iter_resultsets(self, statement, batch_size=1000, params=None):
+        cursor = self._execute(statement, params)
+        while True:
+            yield cursor.description, self._fetch_batches(cursor, batch_size)
+            if not cursor.nextset():
+                return
+
+    """ Execute the SQL statement and yield the resultset one block of up to batch_size rows at a time, column by column.
+        Each block is a dict of column name to the column values, as an array.array for integer and float columns
+        without nulls, and as a list for other columns. """
+    def iter_columns(self, statement, batch_size=1000, params=None):
+        cursor = self._execute(statement, params)
+        if cursor.description is None:
+            return
+        names = [column[0] for column in cursor.description]
+        typecodes = [ARRAY_TYPECODES.get(column[1]) for column in cursor.description]
+        for rows in self._fetch_batches(cursor, batch_size):
+            block = {}
+            for name, typecode, values in zip(names, typecodes, zip(*rows)):
+                # Drivers without column types, like the SQLite stand-in, are typed by the first value.
+                typecode = typecode or ARRAY_TYPECODES.get(type(values[0]))
+                if typecode is None:
+                    block[name] = list(values)
+                    continue
+                try:
+                    block[name] = array.array(typecode, values)
+                except (TypeError, OverflowError):
+                    block[name] = list(values)
+            yield block
+
+    """ Execute the SQL statement and yield one dict of column name to value per row. """
+    def iter_dicts(self, statement, batch_size=1000, params=None):
+        cursor = self._execute(statement, params)
+        if cursor.description is None:
+            return
+        # The column names are read from the description once, not for every row.
+        names = [column[0] for column in cursor.description]
+        for rows in self._fetch_batches(cursor, batch_size):
+            for row in rows:
+                yield dict(zip(names, row))
+
+    """ Execute the SQL statement and yield one row at a time without materializing the resultset. """
+    def iter_rows(self, statement, batch_size=1000, params=None):
+        for rows in self.iter_batches(statement, batch_size, params):
+            yield from rows
+
+    """ Execute the SQL statement and yield one plain tuple per row, for rows passed to other processes or stored. """
+    def iter_tuples(self, statement, batch_size=1000, params=None):
+        for rows in self.iter_batches(statement, batch_size, params):
+            yield from map(tuple, rows)
+
+    """ Execute a parameterized query and return all rows, or None if the statement returns no rows.
+        With a cache, a cached result is returned as a list of tuples, and new results are kept for ttl seconds. """
+    def query(self, statement, params=(), ttl=None):
+        if self.cache is not None:
+            cached = self.cache.get(self.datasource, statement, params)
+            if cached is not None:
+                return cached.rows
+        cursor = self._execute(statement, params)
+        if cursor.description is None:
+            return None
+        rows = cursor.fetchall() if self.profile is None else self._profiled_fetch(cursor.fetchall)
+        if self.cache is not None:
+            self.cache.put(self.datasource, statement, params, cursor.description, rows, ttl)
+        return rows
+
+    """ Execute the SQL statement and return all rows as a pyodbc resultset.
+        A statement that returns no rows is committed and returns None.  Queries are not committed.
+        With a cache, a cached result is returned as a list of tuples, and new results are kept for ttl seconds. """
+    def result_set(self, statement, ttl=None):
+        if self.cache is not None:
+            cached = self.cache.get(self.datasource, statement)
+            if cached is not None:
+                return cached.rows
+        cursor = self.execute(statement, True)
+        if cursor.description is None:
+            return None
+        rows = cursor.fetchall() if self.profile is None else self._profiled_fetch(cursor.fetchall)
+        if self.cache is not None:
+            self.cache.put(self.datasource, statement, (), cursor.description, rows, ttl)
+        return rows
+
+    """ Rollback changes to the database. """
+    def rollback(self):
+        self.cursor.rollback()
+
+    """ Close the current connection and reinitialize it from the given datasource. """
+    def set(self, datasource, pool=None, cache=None):
+        self.close()
+        hooks = self.hooks
+        self.__init__(datasource, pool, cache, self.statement_cache_size, self.profile)
+        self.hooks = hooks
+
+    """ Return a list of database table names matching a wildcard pattern. """
+    def tables(self, table_name, catalog, schema, type):
+        return self.cursor.tables(table_name, catalog, schema, type)
+
+    def _execute(self, statement, params):
+        # Statements without parameters run on the main cursor, and parameterized statements on their own cursor.
+        cursor = self.cursor if params is None else self._statement_cursor(statement)
+        args = (statement,) if params is None else (statement, params)
+        if self.profile is None and not self.hooks:
+            return cursor.execute(*args)
+        return self._instrumented('execute', cursor, cursor.execute, args, statement, params)
+
+    def _fetch_batches(self, cursor, batch_size):
+        # Whether rows came back is told by the cursor description, not the driver dependent rowcount.
+        if cursor.description is None:
+            return
+        cursor.arraysize = batch_size
+        while True:
+            if self.profile is None:
+                rows = cursor.fetchmany(batch_size)
+            else:
+                rows = self._profiled_fetch(cursor.fetchmany, batch_size)
+            if not rows:
+                break
+            yield rows
+
+    def _instrumented(self, phase, cursor, function, args, statement, params):
+        # Run cursor.execute or cursor.executemany between the hooks, timing it when profiling.
+        for before, after in self.hooks:
+            if before is not None:
+                before(statement, params)
+        start = time.perf_counter()
+        function(*args)
+        seconds = time.perf_counter() - start
+        if self.profile is not None:
+            self.profile.add(phase, seconds, 0, 0, statement, start)
+        for before, after in self.hooks:
+            if after is not None:
+                after(statement, params, cursor, seconds)
+        return cursor
+
+    def _profiled_fetch(self, function, *args):
+        start = time.perf_counter()
+        rows = function(*args)
+        self.profile.add('fetch', time.perf_counter() - start, len(rows), row_bytes(rows), None, start)
+        return rows
+
+    def _statement_cursor(self, statement):
+        # Keep one cursor per statement text, closing the least recently used beyond statement_cache_size.
+        cursor = self.statements.get(statement)
+        if cursor is None:
+            cursor = self.statements[statement] = self.connection.cursor()
+            while len(self.statements) > self.statement_cache_size:
+                self.statements.popitem(last=False)[1].close()
+        else:
+            self.statements.move_to_end(statement)
+        return cursor
 
-# Announce the end of the program.
-if OUT_FILE > '':
-    print("Ending program " + sys.argv[0] + " code 0")
-sys.exit(0)
\ No newline at end of file
+""" Return a connection pool for the named ODBC datasource, for use with Database(datasource, pool=pool). """
+def datasource_pool(datasource, **kwargs):
+    import pyodbc
+    return ConnectionPool(lambda: pyodbc.connect('DSN=' + datasource), **kwargs)
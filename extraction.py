@@ -0,0 +1,132 @@
+'''
+    Extraction of structured job contact fields, the employer, position and application date,
+    from the sender, subject and body of an email message.
+
+    A template is a set of regular expressions, one or a list of them per field, each with a named group
+    "value" holding the text to extract.  A template applies either to every message, with domain "*", or to
+    messages from one sender domain and its subdomains, such as "myworkday.com" for the Workday
+    applicant tracking system.  All patterns are compiled once, and the templates are indexed by sender
+    domain, so each message is only tried against the templates for its own domain and the generic ones.
+
+    Templates file syntax, JSON:
+        [{"domain": "myworkday.com",
+          "subject": {"employer": "^(?P<value>.+?) - Application Received$"},
+          "body": {"position": "applying for (?P<value>.+?) at"}}]
+
+    Notes:
+        Domain templates are tried before generic templates, and for each field the first match wins.
+        The position patterns that take the words after "application for" do not start the value at
+        "the position" or "a role", so "application for the position of Analyst" is left to the
+        "position of" pattern.
+        When no application date is found, the received date of the message is used.
+'''
+
+import json
+import re
+from datetime import datetime
+
+FIELDS = ('employer', 'position', 'application_date')
+SECTIONS = ('sender', 'subject', 'body')
+
+DEFAULT_TEMPLATES = [
+    {'domain': 'myworkday.com',
+     'subject': {'employer': r'^(?:Thank you for applying to |Application Received[:\- ]+)?(?P<value>[^:\-|]+?)(?: - | \| |: )'},
+     'body': {'position': r'(?:application for|applying for|applied for)(?: the)? (?!(?:(?:the|a|an)\s+)?(?:position|role)\b)(?P<value>[^\n.]+?)(?: position| role)?(?: at |\.|\n)'}},
+    {'domain': 'greenhouse.io',
+     'subject': {'employer': r'(?:Thank you for applying to|Your application to) (?P<value>[^!.\n]+)'},
+     'body': {'position': r'interest in the (?P<value>[^\n.]+?) (?:role|position)'}},
+    {'domain': 'lever.co',
+     'subject': {'employer': r'(?:Thank you for your application to|Thanks for applying to) (?P<value>[^!.\n]+)'},
+     'body': {'position': r'application for the (?P<value>[^\n.]+?) (?:role|position)'}},
+    {'domain': 'icims.com',
+     'subject': {'position': r'(?:Application|Thank you for applying)(?: for| to)?:? (?P<value>[^\n|]+?)(?: at |$)'},
+     'body': {'employer': r'interest in (?:a career with |joining )?(?P<value>[A-Z][\w&\',. -]+?)[.!\n]'}},
+    {'domain': 'linkedin.com',
+     'subject': {'employer': r'your application was sent to (?P<value>.+)$',
+                 'position': r'^(?P<value>.+?) application'}},
+    {'domain': '*',
+     'subject': {'employer': r'(?:thank you for (?:applying|your application|your interest) (?:to|at|with|in)|your application (?:to|at|with)) (?P<value>[A-Z][\w&\',. -]+?)(?:[!.]|$| - | for )',
+                 'position': r'(?:application for|applying for|applied for)(?: the)? (?!(?:(?:the|a|an)\s+)?(?:position|role)\b)(?P<value>[^\n]+?)(?: position| role)?(?: at | with |$)'},
+     'body': {'employer': r'(?:thank you for (?:applying|your interest) (?:to|at|with|in)) (?P<value>[A-Z][\w&\',. -]+?)[.!\n,]',
+              'position': [r'(?:application for|applying for|applied for|interest in)(?: the)? (?!(?:(?:the|a|an)\s+)?(?:position|role)\b)(?P<value>[^\n.]+?) (?:position|role)',
+                           r'(?:position|role) of (?P<value>[^\n.,]+?)(?: at | with |[.,!]|$)'],
+              'application_date': r'(?:applied|submitted|received)(?: your application)? on (?P<value>\w+ \d{1,2}, \d{4}|\d{1,2}/\d{1,2}/\d{4}|\d{4}-\d{2}-\d{2})'}},
+]
+
+DATE_FORMATS = ('%B %d, %Y', '%b %d, %Y', '%m/%d/%Y', '%Y-%m-%d')
+
+def _parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+    return None
+
+class Template:
+    """ The compiled patterns of one template, as (section, field, regex) in the order they are tried. """
+    def __init__(self, template):
+        self.domain = template.get('domain', '*').lower()
+        self.patterns = []
+        for section in SECTIONS:
+            for field, patterns in template.get(section, {}).items():
+                if field not in FIELDS:
+                    raise ValueError('Unknown template field: ' + field)
+                if isinstance(patterns, str):
+                    patterns = [patterns]
+                for pattern in patterns:
+                    regex = re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+                    if 'value' not in regex.groupindex:
+                        raise ValueError('Template pattern has no (?P<value>...) group: ' + pattern)
+                    self.patterns.append((section, field, regex))
+
+class Extractor:
+    """ Extract the employer, position and application date from messages with a set of templates. """
+    def __init__(self, templates=None):
+        self.generic = []
+        self.by_domain = {}
+        for template in (DEFAULT_TEMPLATES if templates is None else templates):
+            compiled = Template(template)
+            if compiled.domain == '*':
+                self.generic.append(compiled)
+            else:
+                self.by_domain.setdefault(compiled.domain, []).append(compiled)
+
+    """ Return the templates for a sender address, the most specific domain first, then the generic ones. """
+    def candidates(self, sender):
+        templates = []
+        domain = sender.rpartition('@')[2].lower()
+        while domain:
+            templates.extend(self.by_domain.get(domain, ()))
+            domain = domain.partition('.')[2]
+        templates.extend(self.generic)
+        return templates
+
+    """ Return a dict of the employer, position and application date found in a MailMessage. """
+    def extract(self, msg):
+        found = {}
+        for template in self.candidates(msg.sender or ''):
+            for section, field, regex in template.patterns:
+                if field in found:
+                    continue
+                text = getattr(msg, section)
+                if not text:
+                    continue
+                match = regex.search(text)
+                if match is None:
+                    continue
+                value = match.group('value').strip()
+                if field == 'application_date':
+                    value = _parse_date(value)
+                if value:
+                    found[field] = value
+            if len(found) == len(FIELDS):
+                break
+        if 'application_date' not in found and msg.received_time is not None:
+            found['application_date'] = msg.received_time.replace(hour=0, minute=0, second=0, microsecond=0)
+        return {field: found.get(field) for field in FIELDS}
+
+def read_templates(path, encoding='utf-8'):
+    """ Read a JSON templates file and return the list of templates. """
+    with open(path, 'rt', encoding=encoding) as templates_file:
+        return json.load(templates_file)
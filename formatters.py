@@ -0,0 +1,68 @@
+'''
+    Row formatters used by sql.py to turn batches of database rows into delimited text.
+    Each formatter converts a whole batch of rows into one string, so the output file is
+    written once per batch instead of once per column value.
+
+    Every column value is converted with str(x).strip(), wrapped in the quote character and
+    separated by the column separator.  A quote character inside a value is escaped by doubling it.
+    With an empty quote character the values are written as is.
+'''
+
+import csv
+import io
+
+class DelimitedFormatter:
+    """ Format rows by joining the column values with precomputed separators. """
+    def __init__(self, colsep=',', quote='"'):
+        self.colsep = colsep
+        self.quote = quote
+        self.escaped_quote = quote + quote
+        self.separator = quote + colsep + quote
+
+    """ Return the rows of the batch as one string, with a newline after each row. """
+    def format_batch(self, rows):
+        if not rows:
+            return ''
+        quote = self.quote
+        separator = self.separator
+        if quote:
+            escaped_quote = self.escaped_quote
+            lines = [quote + separator.join([str(x).strip().replace(quote, escaped_quote) for x in row]) + quote
+                     for row in rows]
+        else:
+            lines = [separator.join([str(x).strip() for x in row]) for row in rows]
+        lines.append('')
+        return '\n'.join(lines)
+
+class CsvFormatter:
+    """ Format rows with the csv module, using a dialect built from the column separator and quote. """
+    def __init__(self, colsep=',', quote='"'):
+        if len(colsep) != 1 or len(quote) != 1:
+            raise ValueError('CsvFormatter requires a single character column separator and quote')
+        self.colsep = colsep
+        self.quote = quote
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, delimiter=colsep, quotechar=quote, doublequote=True,
+                                 quoting=csv.QUOTE_ALL, lineterminator='\n')
+
+    """ Return the rows of the batch as one string, with a newline after each row. """
+    def format_batch(self, rows):
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.writer.writerows([[str(x).strip() for x in row] for row in rows])
+        return self.buffer.getvalue()
+
+FORMATTERS = {
+    'csv': CsvFormatter,
+    'delimited': DelimitedFormatter,
+}
+
+def register_formatter(name, formatter_class):
+    """ Make a formatter class available to get_formatter under the given name. """
+    FORMATTERS[name] = formatter_class
+
+def get_formatter(colsep=',', quote='"', name='delimited'):
+    """ Return an instance of the named formatter for the column separator and quote. """
+    if name not in FORMATTERS:
+        raise ValueError('Unknown formatter ' + repr(name) + ', expected one of ' + ', '.join(sorted(FORMATTERS)))
+    return FORMATTERS[name](colsep, quote)
@@ -0,0 +1,136 @@
+'''
+    Phase timers and counters for Database, sql.py and job_contacts.py --profile.
+
+    A Profile adds up the seconds and calls spent in each named phase, such as connect, execute,
+    fetch and write, and counts the rows and bytes that pass through them.  With trace=True, every
+    timed call is also kept as an event, with its start time, for a JSON trace file.
+
+    Syntax:
+        profile = Profile()
+        d = Database('DB_NAME', profile=profile)
+        with profile.phase('write'):
+            ...
+        for msg in profile.iterate('read', source.messages(start, end)):
+            ...
+        profile.report()
+        profile.write_json('trace.json')
+
+    Notes:
+        A disabled Profile, Profile(enabled=False), times nothing: phase returns a shared do-nothing
+        context manager and iterate returns the iterable itself.  Database only checks whether it
+        has a profile or hooks, so an unprofiled Database runs the same calls as before.
+        Bytes are the length of the text and binary values, and 8 for each other value.
+'''
+
+import contextlib
+import json
+import sys
+import threading
+import time
+
+_NULL_PHASE = contextlib.nullcontext()
+
+def row_bytes(rows):
+    """ Return the approximate size in bytes of the values in a list of rows. """
+    size = 0
+    for row in rows:
+        for value in row:
+            if isinstance(value, (str, bytes, bytearray)):
+                size += len(value)
+            elif value is not None:
+                size += 8
+    return size
+
+class _Phase:
+    """ Time one call of a phase as a context manager. """
+    def __init__(self, profile, name, detail):
+        self.profile = profile
+        self.name = name
+        self.detail = detail
+        self.rows = 0
+        self.bytes = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profile.add(self.name, time.perf_counter() - self.start, self.rows, self.bytes, self.detail, self.start)
+
+class Profile:
+    """ Add up the seconds, calls, rows and bytes of each phase of a run. """
+    def __init__(self, enabled=True, trace=False):
+        self.enabled = enabled
+        self.trace = trace
+        self.lock = threading.Lock()
+        self.phases = {}  # name -> [seconds, calls, rows, bytes], in the order the phases first ran
+        self.events = []  # (name, start, seconds, rows, bytes, detail) with trace=True
+        self.started = time.perf_counter()
+
+    """ Record one timed call of a phase.  start is the perf_counter time the call began. """
+    def add(self, name, seconds, rows=0, bytes=0, detail=None, start=None):
+        with self.lock:
+            totals = self.phases.get(name)
+            if totals is None:
+                totals = self.phases[name] = [0.0, 0, 0, 0]
+            totals[0] += seconds
+            totals[1] += 1
+            totals[2] += rows
+            totals[3] += bytes
+            if self.trace:
+                start = time.perf_counter() - seconds if start is None else start
+                self.events.append((name, start - self.started, seconds, rows, bytes, detail))
+
+    """ Return the seconds since the profile was created. """
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    """ Yield the items of an iterable, timing each step as a call of the phase. """
+    def iterate(self, name, iterable):
+        if not self.enabled:
+            return iterable
+        return self._iterate(name, iterable)
+
+    """ Return a context manager timing one call of a phase.  Set rows and bytes on it to count them. """
+    def phase(self, name, detail=None):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name, detail)
+
+    """ Print the seconds, calls, rows and bytes of each phase, and its share of the elapsed time. """
+    def report(self, out=None):
+        out = out or sys.stderr
+        elapsed = self.elapsed()
+        with self.lock:
+            phases = [(name, list(totals)) for name, totals in self.phases.items()]
+        out.write("-- Profile --\n")
+        out.write("  {:<16} {:>10} {:>7} {:>10} {:>12} {:>14}\n".format('Phase', 'Seconds', '%', 'Calls', 'Rows', 'Bytes'))
+        for name, (seconds, calls, rows, size) in phases:
+            share = 100.0 * seconds / elapsed if elapsed > 0 else 0.0
+            out.write("  {:<16} {:>10.3f} {:>7.1f} {:>10} {:>12} {:>14}\n".format(name, seconds, share, calls, rows, size))
+        out.write("  {:<16} {:>10.3f}\n".format('Elapsed', elapsed))
+
+    """ Write the phase totals, and the events when tracing, to a JSON file. """
+    def write_json(self, path):
+        with self.lock:
+            data = {
+                'elapsed': self.elapsed(),
+                'phases': {name: {'seconds': seconds, 'calls': calls, 'rows': rows, 'bytes': size}
+                           for name, (seconds, calls, rows, size) in self.phases.items()},
+                'events': [{'phase': name, 'start': start, 'seconds': seconds, 'rows': rows, 'bytes': size, 'detail': detail}
+                           for name, start, seconds, rows, size, detail in self.events],
+            }
+        with open(path, 'wt', encoding='utf-8') as trace_file:
+            json.dump(data, trace_file, indent=1)
+
+    def _iterate(self, name, iterable):
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                # The call that finds the iterable exhausted is not counted, so calls match the items.
+                return
+            self.add(name, time.perf_counter() - start, 1, 0, None, start)
+            yield item
@@ -0,0 +1,269 @@
+'''
+    Bulk loader for the dbo.JobContacts table.
+
+    Contacts are collected in memory and loaded one batch at a time.  Each batch is staged into a
+    temporary table with a single executemany call, then merged into dbo.JobContacts with one set based
+    insert that skips rows already in the table, and committed as one transaction.
+
+    Duplicates are detected with a SHA-256 content hash of the date, sender, subject and normalized body,
+    stored in the ContentHash column and covered by a unique index, so the existence check is an index seek
+    instead of a comparison of nvarchar(max) columns.  The hashes for a date range can also be preloaded,
+    so that contacts already in the table are skipped before they are sent to the database.
+
+    Syntax:
+        with JobContactLoader(conn, batch_size=500) as loader:
+            loader.preload(start_date, end_date)
+            loader.add(the_date, the_sender, the_subject, the_body)
+
+    Notes:
+        On pyodbc connections, fast_executemany is turned on for the staging cursor, so each batch
+        is sent to SQL Server as a single array of parameters instead of one round trip per row.
+
+        Run migrate(conn) once to add the ContentHash column to an existing table, fill it in for the
+        existing rows, and create the unique index.  The migration also adds the Employer, Position and
+        ApplicationDate columns, and fills them in for the existing rows with the extraction templates,
+        and adds the ContactTime datetime column, a typed copy of DateOfContact, with its report index.
+        Rows that turn out to share a hash are counted, and only deleted with delete_duplicates, after
+        they are copied to a backup table.  Until they are, the unique index is not created.
+'''
+
+import hashlib
+from datetime import datetime
+
+try:
+    from .extraction import Extractor
+    from .mail_sources import MailMessage
+except ImportError:
+    from extraction import Extractor
+    from mail_sources import MailMessage
+
+STAGE_TABLE = '#JobContactsStage'
+COLUMNS = 'DateOfContact, EmailAddressOfSender, SubjectOfEmail, BodyOfEmail'
+# Columns derived from the email on the client: the extracted fields, and DateOfContact as a datetime.
+DERIVED_COLUMNS = 'Employer, Position, ApplicationDate, ContactTime'
+
+def content_hash(the_date, the_sender, the_subject, the_body):
+    """ Return the 32 byte SHA-256 hash identifying a job contact.
+
+        The sender is compared without case, and runs of whitespace in the subject and body
+        are treated as a single space, so reformatted copies of the same email hash the same.
+    """
+    parts = [
+        '' if the_date is None else str(the_date).strip(),
+        '' if the_sender is None else the_sender.strip().lower(),
+        '' if the_subject is None else ' '.join(the_subject.split()),
+        '' if the_body is None else ' '.join(the_body.split()),
+    ]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).digest()
+
+def migrate(connection, batch_size=1000, extractor=None, delete_duplicates=False):
+    """ Add and fill in the ContentHash and extracted columns of dbo.JobContacts and create its indexes.
+        Return a dict of the rows hashed, the rows whose hash another row already has, the rows deleted, the
+        backup table of the deleted rows, and the rows extracted.
+
+        Duplicates are only deleted with delete_duplicates, after they are copied to a new backup table named
+        JobContactsDuplicates and the time.  The unique index on ContentHash is only created once no duplicates
+        are left.  The extracted rows are marked with the time in ExtractedTime, so a rerun does not extract
+        them again, and rows the loader inserts get the time of the insert.
+    """
+    counts = {'hashed': 0, 'duplicates': 0, 'deleted': 0, 'backup': None, 'extracted': 0}
+    cursor = connection.cursor()
+    cursor.execute("if col_length('dbo.JobContacts', 'ContentHash') is null "
+                   "alter table dbo.JobContacts add ContentHash binary(32) null")
+    cursor.execute("if col_length('dbo.JobContacts', 'Employer') is null "
+                   "alter table dbo.JobContacts add Employer nvarchar(200) null, Position nvarchar(200) null, "
+                   "ApplicationDate datetime null")
+    cursor.execute("if col_length('dbo.JobContacts', 'ContactTime') is null "
+                   "alter table dbo.JobContacts add ContactTime datetime null")
+    cursor.execute("if col_length('dbo.JobContacts', 'ExtractedTime') is null "
+                   "alter table dbo.JobContacts add ExtractedTime datetime null "
+                   "constraint DF_JobContacts_ExtractedTime default getdate()")
+    connection.commit()
+    cursor.execute('update dbo.JobContacts set ContactTime = try_convert(datetime, DateOfContact, 101) '
+                   'where ContactTime is null')
+    connection.commit()
+
+    # Hash the existing rows on the client, stage the hashes, and fill them in with one update.
+    cursor.execute('select top 0 ' + COLUMNS + ', ContentHash into #JobContactsHash from dbo.JobContacts')
+    stage = connection.cursor()
+    stage.fast_executemany = True
+    reader = connection.cursor()
+    reader.execute('select ' + COLUMNS + ' from dbo.JobContacts where ContentHash is null')
+    while True:
+        rows = reader.fetchmany(batch_size)
+        if not rows:
+            break
+        stage.executemany('insert into #JobContactsHash (' + COLUMNS + ', ContentHash) values (?, ?, ?, ?, ?)',
+                          [tuple(row) + (content_hash(*row),) for row in rows])
+        counts['hashed'] += len(rows)
+    cursor.execute(
+        'update j set ContentHash = s.ContentHash '
+        'from dbo.JobContacts j join #JobContactsHash s '
+        'on (j.DateOfContact = s.DateOfContact or (j.DateOfContact is null and s.DateOfContact is null)) '
+        'and (j.EmailAddressOfSender = s.EmailAddressOfSender or (j.EmailAddressOfSender is null and s.EmailAddressOfSender is null)) '
+        'and (j.SubjectOfEmail = s.SubjectOfEmail or (j.SubjectOfEmail is null and s.SubjectOfEmail is null)) '
+        'and (j.BodyOfEmail = s.BodyOfEmail or (j.BodyOfEmail is null and s.BodyOfEmail is null)) '
+        'where j.ContentHash is null')
+    cursor.execute('drop table #JobContactsHash')
+    connection.commit()
+
+    # Rows that only differed by whitespace or sender case now share a hash.  The first of each is kept, in an
+    # order that only leaves rows with the same content tied, so the copy and the delete pick the same rows.
+    duplicates = ('with d as (select *, row_number() over (partition by ContentHash '
+                  'order by DateOfContact, EmailAddressOfSender, SubjectOfEmail, BodyOfEmail) DuplicateNumber '
+                  'from dbo.JobContacts where ContentHash is not null) ')
+    cursor.execute(duplicates + 'select count(*) from d where DuplicateNumber > 1')
+    counts['duplicates'] = cursor.fetchone()[0]
+    if counts['duplicates'] > 0 and delete_duplicates:
+        counts['backup'] = 'dbo.JobContactsDuplicates' + datetime.now().strftime('%Y%m%d%H%M%S')
+        cursor.execute(duplicates + 'select * into ' + counts['backup'] + ' from d where DuplicateNumber > 1')
+        cursor.execute(duplicates + 'delete from d where DuplicateNumber > 1')
+        counts['deleted'] = cursor.rowcount
+        connection.commit()
+    if counts['duplicates'] == counts['deleted']:
+        cursor.execute("if not exists (select * from sys.indexes where name = 'UX_JobContacts_ContentHash' "
+                       "and object_id = object_id('dbo.JobContacts')) "
+                       "create unique index UX_JobContacts_ContentHash on dbo.JobContacts (ContentHash) "
+                       "where ContentHash is not null")
+        connection.commit()
+
+    # Extract the structured fields of the existing rows on the client and fill them in with one update.
+    extractor = extractor or Extractor()
+    cursor.execute('create table #JobContactsExtract (ContentHash binary(32) primary key, '
+                   'Employer nvarchar(200), Position nvarchar(200), ApplicationDate datetime, ContactTime datetime)')
+    reader.execute('select ' + COLUMNS + ', ContentHash from dbo.JobContacts '
+                   'where ExtractedTime is null and Employer is null and Position is null and ApplicationDate is null '
+                   'and ContentHash is not null')
+    # Rows sharing a hash that were not deleted hold the same contact, so each hash is extracted once.
+    staged = set()
+    while True:
+        rows = reader.fetchmany(batch_size)
+        if not rows:
+            break
+        values = []
+        for row in rows:
+            if bytes(row[4]) in staged:
+                continue
+            staged.add(bytes(row[4]))
+            fields = extractor.extract(MailMessage(_received_time(row[0]), row[1], row[2], row[3], None))
+            values.append((row[4], _truncate(fields['employer']), _truncate(fields['position']), fields['application_date'],
+                           _received_time(row[0])))
+        if values:
+            stage.executemany('insert into #JobContactsExtract (ContentHash, ' + DERIVED_COLUMNS + ') values (?, ?, ?, ?, ?)', values)
+    cursor.execute('update j set Employer = s.Employer, Position = s.Position, ApplicationDate = s.ApplicationDate, '
+                   'ContactTime = coalesce(j.ContactTime, s.ContactTime), ExtractedTime = getdate() '
+                   'from dbo.JobContacts j join #JobContactsExtract s on j.ContentHash = s.ContentHash '
+                   'where j.ExtractedTime is null')
+    counts['extracted'] = max(cursor.rowcount, 0)
+    cursor.execute('drop table #JobContactsExtract')
+    cursor.execute("if not exists (select * from sys.indexes where name = 'IX_JobContacts_ContactTime' "
+                   "and object_id = object_id('dbo.JobContacts')) "
+                   "create index IX_JobContacts_ContactTime on dbo.JobContacts (ContactTime desc, ContentHash desc) "
+                   "include (Employer, Position, ApplicationDate, EmailAddressOfSender, SubjectOfEmail)")
+    connection.commit()
+    return counts
+
+def _received_time(the_date):
+    if isinstance(the_date, str):
+        try:
+            return datetime.strptime(the_date.strip(), '%m/%d/%Y %H:%M')
+        except ValueError:
+            return None
+    return the_date
+
+def _truncate(value, size=200):
+    return value if value is None else value[:size]
+
+class JobContactLoader:
+    """ Collect job contacts and load them into dbo.JobContacts in batches of batch_size rows. """
+    def __init__(self, connection, batch_size=500):
+        if batch_size < 1:
+            raise ValueError('batch_size must be a positive whole number')
+        self.connection = connection
+        self.batch_size = batch_size
+        self.cursor = connection.cursor()
+        self.cursor.fast_executemany = True
+        self.rows = []
+        self.known = set()
+        self.staged = False
+        self.loaded = 0
+        self.skipped = 0
+        self.batches = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.connection.rollback()
+
+    """ Add a contact to the current batch, loading the batch when it is full.  Return False for a known duplicate.
+        The content hash is computed here unless the caller passes it in as key.  fields is the dict of
+        employer, position and application date returned by Extractor.extract. """
+    def add(self, the_date, the_sender, the_subject, the_body, key=None, fields=None):
+        if key is None:
+            key = content_hash(the_date, the_sender, the_subject, the_body)
+        if key in self.known:
+            self.skipped += 1
+            return False
+        self.known.add(key)
+        fields = fields or {}
+        self.rows.append((the_date, the_sender, the_subject, the_body, key, _truncate(fields.get('employer')),
+                          _truncate(fields.get('position')), fields.get('application_date'), _received_time(the_date)))
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+        return True
+
+    """ Load the remaining contacts and drop the staging table. """
+    def close(self):
+        self.flush()
+        if self.staged:
+            self.cursor.execute('drop table ' + STAGE_TABLE)
+            self.connection.commit()
+            self.staged = False
+
+    """ Stage the current batch, merge it into dbo.JobContacts and commit.  Return the rows inserted. """
+    def flush(self):
+        if not self.rows:
+            return 0
+        if not self.staged:
+            # Copy the column types of dbo.JobContacts so that the merge compares like with like.
+            self.cursor.execute('select top 0 ' + COLUMNS + ', ContentHash, ' + DERIVED_COLUMNS + ' into ' + STAGE_TABLE + ' from dbo.JobContacts')
+            self.connection.commit()
+            self.staged = True
+        try:
+            self.cursor.executemany('insert into ' + STAGE_TABLE + ' (' + COLUMNS + ', ContentHash, ' + DERIVED_COLUMNS + ') '
+                                    'values (?, ?, ?, ?, ?, ?, ?, ?, ?)', self.rows)
+            self.cursor.execute(
+                'insert into dbo.JobContacts (' + COLUMNS + ', ContentHash, ' + DERIVED_COLUMNS + ') '
+                'select s.DateOfContact, s.EmailAddressOfSender, s.SubjectOfEmail, s.BodyOfEmail, s.ContentHash, '
+                's.Employer, s.Position, s.ApplicationDate, s.ContactTime '
+                'from ' + STAGE_TABLE + ' s '
+                'where not exists (select * from dbo.JobContacts j where j.ContentHash = s.ContentHash)')
+            inserted = self.cursor.rowcount
+            self.cursor.execute('truncate table ' + STAGE_TABLE)
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            self.known.difference_update(row[4] for row in self.rows)
+            self.rows = []
+            raise
+        self.loaded += max(inserted, 0)
+        self.batches += 1
+        self.rows = []
+        return inserted
+
+    """ Remember the content hashes of the contacts already in the table between the start and end dates.
+        The range is a seek on IX_JobContacts_ContactTime, which also holds the hashes. """
+    def preload(self, start, end):
+        self.cursor.execute('select ContentHash from dbo.JobContacts '
+                            'where ContactTime between ? and ? '
+                            'and ContentHash is not null', start, end)
+        while True:
+            rows = self.cursor.fetchmany(10000)
+            if not rows:
+                break
+            self.known.update(bytes(row[0]) for row in rows)
+        return len(self.known)
@@ -8,106 +8,325 @@ available in the confirmation emails sent by the prospective employers. The goal
 task will be to populate a relational database table with job-related contact information retrieved
 from Outlook email messages.  The extracted information will be stored in a Microsoft SQL Server
 database.
+
+Syntax: py job_contacts.py [--batch-size=500] [--source=outlook] ["mm/dd/yyyy hh:mm" "mm/dd/yyyy hh:mm"]
+Unattended: py job_contacts.py --auto [--rules=rules.txt] --source="archive.mbox" "mm/dd/yyyy hh:mm" "mm/dd/yyyy hh:mm"
+Incremental: py job_contacts.py --auto --state="job_contacts.state" --source="archive.mbox"
+Report: py job_contacts.py --report=csv --outfile="week.csv" "mm/dd/yyyy hh:mm" "mm/dd/yyyy hh:mm"
+Migration: py job_contacts.py --migrate [--delete-duplicates]
+
+Parameters:
+    --auto        Classify messages with the rules instead of prompting.  Start and end dates are required.
+    --batch-size  Number of contacts inserted per transaction.  Optional, default=500.
+    --delete-duplicates With --migrate, copy the rows that share a content hash with another row to a backup
+                  table and delete them from JobContacts.  Optional, default=only count them.
+    --outfile     Output file for --report.  Optional, default=print the report to the console.
+    --page-size   Number of contacts per page when viewing or writing the report.  Optional, default=10 on
+                  the console and 1000 for --report.
+    --profile     Print the seconds and counts of each phase (connect, preload, read, extract, load) to stderr at the end.
+    --profile-json JSON file for the --profile phase totals and a trace of each timed call.  Optional, implies --profile.
+    --profile-python cProfile statistics file for the run, to view with "py -m pstats FILE".  Optional.
+    --report      Write the contacts for the date range as csv or json, without reading any mail, and exit.
+    --migrate     Add the ContentHash and extracted columns and the unique index to the JobContacts table and exit.
+    --rules       Rules file for --auto, see classifier.py.  Optional, default=built in rules.
+    --source      "outlook", an mbox file, a Maildir folder or a folder of .eml files.  Optional, default="outlook".
+    --templates   Extraction templates file, see extraction.py.  Optional, default=built in templates.
+    --state       Checkpoint file for incremental runs.  Optional.  When used, the start and end dates may be
+                  left off after the first run, and only mail received since the last run is read.
+                  Dates given with --state are read in full, so an older range can be backfilled.
+    --workers     Number of worker processes classifying messages in --auto mode.  Optional, default=0,
+                  which classifies the messages in the main process.
+
+Loaded contacts are written to the database in batches of --batch-size rows, one transaction per batch.
+Duplicate contacts are found by the ContentHash column.  The employer, position and application date are
+extracted from each loaded message into the Employer, Position and ApplicationDate columns.  Run once with
+--migrate to add these columns and the unique index to an existing JobContacts table.  The migration prints
+the number of rows that only differ from another row by whitespace or sender case.  They are only deleted
+with --delete-duplicates, and the unique index is created once they are gone.
+
+With --profile, the read phase is the time spent reading and classifying the next message, and the load
+phase is the time spent adding contacts to the batch, including the batch inserts and the final commit.
 '''
 
 from datetime import datetime
+import getopt
 import sys
-import pyodbc
-import win32com.client
-
-def _insert_job_contacts(the_date, the_sender, the_subject, the_body, cursor):
-    sql_insert =  "insert into dbo.JobContacts (DateOfContact, EmailAddressOfSender, SubjectOfEmail, BodyOfEmail) "
-    sql_insert += "select ?, convert(nvarchar(max),?), convert(nvarchar(max),?), convert(nvarchar(max),?) "
-    sql_insert += "where not exists (select * from dbo.JobContacts "
-    sql_insert += "where DateOfContact = ? "
-    sql_insert += "and EmailAddressOfSender = convert(nvarchar(max),?) "
-    sql_insert += "and SubjectOfEmail = convert(nvarchar(max),?) "
-    sql_insert += "and BodyOfEmail = convert(nvarchar(max),?))"
-    data_values = [the_date, the_sender, the_subject, the_body, the_date, the_sender, the_subject, the_body]
-    cursor.execute(sql_insert,data_values)
-
-def _print_job_contacts(cur, start, end):
-    query = "select DateOfContact,EmailAddressOfSender,SubjectOfEmail,BodyOfEmail "
-    query += "from dbo.JobContacts "
-    query += "where DateOfContact between '" + start + "' and '" + end + "' "
-    query += "order by DateOfContact desc"
-    i = 1
+from checkpoint import Checkpoint
+from classifier import Classifier, read_rules
+from contact_report import ContactReport
+from extraction import Extractor, read_templates
+from instrumentation import Profile
+from job_contact_loader import JobContactLoader, migrate
+from mail_sources import open_source
+from pipeline import classify_messages
+
+LONG_OPTIONS = ["auto", "batch-size=", "delete-duplicates", "migrate", "outfile=", "page-size=", "profile", "profile-json=", "profile-python=",
+                "report=", "rules=", "source=", "state=", "templates=", "workers="]
+
+CONNECTION_STRING = 'Driver={SQL Server};Server=DESKTOP-RBLHC9P\SQLEXPRESS;Database=Nelnet;Trusted_Connection=yes;'
+
+class UsageError(ValueError):
+    """ Raised for an unknown or invalid command line parameter. """
+
+# The syntax lines of the module documentation, printed for a usage error.
+SYNTAX = __doc__[__doc__.index('Syntax:'):__doc__.index('Parameters:')].rstrip() if __doc__ else ''
+
+def _connect():
+    # pyodbc is imported when a connection is made, so the module imports where no ODBC driver manager is installed.
+    import pyodbc
+    return pyodbc.connect(CONNECTION_STRING)
+
+def _number(opt, arg, minimum=1):
+    try:
+        value = int(arg)
+    except ValueError:
+        value = minimum - 1
+    if value < minimum:
+        raise UsageError(opt + " must be a whole number of at least " + str(minimum))
+    return value
+
+def _text(value):
+    # Columns that are null in the table are printed as empty text.
+    return '' if value is None else str(value)
+
+def _print_job_contacts(conn, start, end, page_size=10):
+    report = ContactReport(conn, include_body=True)
     print("------------------------------------------------------------------------------------------------------------")
-    for row in cur.execute(query):
-        print(row.DateOfContact + " - " + row.EmailAddressOfSender + "\n")
-        print(row.SubjectOfEmail + "\n")
-        print(row.BodyOfEmail + "\n")
-        print("------------------------------------------------------------------------------------------------------------")
+    for page in report.pages(start, end, page_size):
+        for row in page:
+            contact = dict(zip(report.columns, row))
+            contact_time = contact['ContactTime']
+            if isinstance(contact_time, datetime):
+                contact_time = datetime.strftime(contact_time, '%m/%d/%Y %H:%M')
+            print(_text(contact_time) + " - " + _text(contact['EmailAddressOfSender']) + "\n")
+            print(_text(contact['SubjectOfEmail']) + "\n")
+            print(_text(contact['BodyOfEmail']) + "\n")
+            print("------------------------------------------------------------------------------------------------------------")
+        # Wait for the user between pages rather than between rows.  A short page is the last one.
+        if len(page) < page_size:
+            break
+        print("Enter for the next " + str(page_size) + " contacts, or (q)uit:")
         command = input()
         if command == 'q':
             break
 
-# Check for command line arguments
-ARG_COUNT = len(sys.argv)
-
-if ARG_COUNT > 2:
-    message_start_date = sys.argv[1]
-    message_end_date = sys.argv[2]
-else:
-# Prompt user for start and end dates.
-    print('Enter Start Date "mm/dd/yyyy hh:mm": ')
-    message_start_date = input()
-    print('Enter End Date "mm/dd/yyyy hh:mm": ')
-    message_end_date = input()
-
-message_start_date = datetime.strftime(datetime.strptime(message_start_date, '%m/%d/%Y %H:%M'), '%m/%d/%Y %H:%M')
-message_end_date = datetime.strftime(datetime.strptime(message_end_date, '%m/%d/%Y %H:%M'), '%m/%d/%Y %H:%M')
-
-# Connect to database.
-conn = pyodbc.connect('Driver={SQL Server};Server=DESKTOP-RBLHC9P\SQLEXPRESS;Database=Nelnet;Trusted_Connection=yes;')
-cursor = conn.cursor()
-count = 0
-command = ''
-
-# Instantiate Outlook email client and prepare to read Inbox folder.
-outlook = win32com.client.Dispatch('outlook.application')
-mapi = outlook.GetNamespace("MAPI")
-
-# The Inbox is default folder number 6.
-inbox = mapi.GetDefaultFolder(6)
-messages = inbox.Items
-
-# Setup filters for the messages to be selected by date range.
-messages = messages.Restrict("[ReceivedTime] >= '" + message_start_date + "'")
-messages = messages.Restrict("[ReceivedTime] <= '" + message_end_date + "'")
-
-# Cycle through email Inbox searching for messages that fall within the start and end dates.
-# When message meets criteria, display the date, sender, and subject of the message on the terminal.
-for msg in list(messages):
-    print("------------------------------------------------------------------------------------------------------------")
-    print(datetime.strftime(msg.ReceivedTime, '%m/%d/%Y %H:%M') + " | " + msg.SenderEmailAddress + " | " + msg.Subject)
-    print("------------------------------------------------------------------------------------------------------------")
+def main(argv):
+    # An unknown or invalid parameter prints the syntax and exits with code 2.
+    try:
+        return _profiled_main(argv)
+    except (getopt.GetoptError, UsageError) as fail_error:
+        print(fail_error)
+        print(SYNTAX)
+        return 2
+
+def _profiled_main(argv):
+    # With --profile-python, run the whole program under cProfile.
+    PROFILE_PYTHON = ''
+    for opt, arg in getopt.getopt(argv, "ab:mo:p:r:s:t:w:", LONG_OPTIONS)[0]:
+        if opt == "--profile-python":
+            PROFILE_PYTHON = arg
+    if PROFILE_PYTHON == '':
+        return _main(argv)
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(_main, argv)
+    finally:
+        profiler.dump_stats(PROFILE_PYTHON)
 
-# Prompt the user to (l)oad, (s)kip, or (q)uit.
-    print("(l)oad, (s)kip, or (q)uit")
-    command = input().lower()
+def _main(argv):
+    # Check for command line arguments
+    AUTO = False
+    BATCH_SIZE = 500
+    DELETE_DUPLICATES = False
+    MIGRATE = False
+    OUT_FILE = ''
+    PAGE_SIZE = 0
+    PROFILE_JSON = ''
+    PROFILING = False
+    REPORT = ''
+    RULES_FILE = ''
+    SOURCE = 'outlook'
+    STATE_FILE = ''
+    TEMPLATES_FILE = ''
+    WORKERS = 0
+    opts, args = getopt.getopt(argv, "ab:mo:p:r:s:t:w:", LONG_OPTIONS)
+    for opt, arg in opts:
+        if opt in ("-a", "--auto"):
+            AUTO = True
+        elif opt in ("-b", "--batch-size"):
+            BATCH_SIZE = _number("--batch-size", arg)
+        elif opt == "--delete-duplicates":
+            DELETE_DUPLICATES = True
+        elif opt in ("-m", "--migrate"):
+            MIGRATE = True
+        elif opt in ("-o", "--outfile"):
+            OUT_FILE = arg
+        elif opt in ("-p", "--page-size"):
+            PAGE_SIZE = _number("--page-size", arg)
+        elif opt == "--profile":
+            PROFILING = True
+        elif opt == "--profile-json":
+            PROFILE_JSON = arg
+            PROFILING = True
+        elif opt == "--report":
+            REPORT = arg.lower()
+            if REPORT not in ('csv', 'json'):
+                raise UsageError('--report must be csv or json')
+        elif opt in ("-r", "--rules"):
+            RULES_FILE = arg
+        elif opt in ("-s", "--source"):
+            SOURCE = arg
+        elif opt == "--state":
+            STATE_FILE = arg
+        elif opt in ("-t", "--templates"):
+            TEMPLATES_FILE = arg
+        elif opt in ("-w", "--workers"):
+            WORKERS = _number("--workers", arg, 0)
+    ARG_COUNT = len(args)
+    profile = Profile(enabled=PROFILING, trace=PROFILE_JSON > '')
 
-# If log is selected, insert a row into the JobContacts table where the row does not already exist.
-    if command in ('l', 'list'):
-        _insert_job_contacts(datetime.strftime(msg.ReceivedTime, '%m/%d/%Y %H:%M'), msg.SenderEmailAddress, msg.Subject, msg.Body, cursor)
-        count += 1
+    # Add the ContentHash and extracted columns and the index to the JobContacts table, then exit.
+    templates = read_templates(TEMPLATES_FILE) if TEMPLATES_FILE > '' else None
+    extractor = Extractor(templates)
+    if MIGRATE:
+        conn = _connect()
+        counts = migrate(conn, extractor=extractor, delete_duplicates=DELETE_DUPLICATES)
+        conn.close()
+        print('JobContacts table migrated: ' + str(counts['hashed']) + ' rows hashed, ' + str(counts['extracted']) +
+              ' rows extracted.')
+        if counts['deleted'] > 0:
+            print(str(counts['deleted']) + ' duplicate rows copied to ' + counts['backup'] + ' and deleted.')
+        elif counts['duplicates'] > 0:
+            print(str(counts['duplicates']) + ' rows share a content hash with another row, so the unique index was not created.')
+            print('Run --migrate --delete-duplicates to copy them to a backup table and delete them.')
+        return 0
+
+    # In incremental mode, load the checkpoint and resume from the last message processed.
+    checkpoint = None
+    if STATE_FILE > '':
+        checkpoint = Checkpoint(STATE_FILE)
+
+    if ARG_COUNT > 1:
+        message_start_date = args[0]
+        message_end_date = args[1]
+    elif checkpoint is not None and checkpoint.resume_time() is not None:
+        message_start_date = datetime.strftime(checkpoint.resume_time(), '%m/%d/%Y %H:%M')
+        message_end_date = datetime.strftime(datetime.now(), '%m/%d/%Y %H:%M')
+    elif AUTO or REPORT > '':
+        print('Start and end dates are required with --auto and --report')
+        return 1
+    else:
+    # Prompt user for start and end dates.
+        print('Enter Start Date "mm/dd/yyyy hh:mm": ')
+        message_start_date = input()
+        print('Enter End Date "mm/dd/yyyy hh:mm": ')
+        message_end_date = input()
+
+    start_date = datetime.strptime(message_start_date, '%m/%d/%Y %H:%M')
+    end_date = datetime.strptime(message_end_date, '%m/%d/%Y %H:%M')
+
+    # Connect to database.
+    with profile.phase('connect'):
+        conn = _connect()
+
+    # Write the report for the date range to the output file or the console, then exit.
+    if REPORT > '':
+        report = ContactReport(conn)
+        out = open(OUT_FILE, 'wt', newline='', encoding='utf-8') if OUT_FILE > '' else sys.stdout
+        if REPORT == 'csv':
+            count = report.write_csv(out, start_date, end_date, PAGE_SIZE or 1000)
+        else:
+            count = report.write_json(out, start_date, end_date, PAGE_SIZE or 1000)
+        if OUT_FILE > '':
+            out.close()
+            print(str(count) + ' contacts written to ' + OUT_FILE)
+        conn.close()
+        return 0
+
+    loader = JobContactLoader(conn, BATCH_SIZE)
+
+    # Skip messages already loaded for the date range without a round trip to the database.
+    with profile.phase('preload'):
+        loader.preload(start_date, end_date)
+
+    # Open the mail source: the Outlook Inbox, or a local mailbox file or folder.
+    source = open_source(SOURCE)
+
+    # Skip the messages processed by earlier incremental runs.
+    # The worker processes parse the messages themselves, so only their headers are read here.
+    if AUTO and WORKERS > 0:
+        messages = source.raw_messages(start_date, end_date)
+    else:
+        messages = source.messages(start_date, end_date)
+    if checkpoint is not None:
+        messages = (msg for msg in messages if not checkpoint.seen(msg))
+
+    # In auto mode, the rules decide whether to load or skip each message, either here or
+    # in a pool of worker processes.  Otherwise, the user is prompted for each message.
+    if AUTO:
+        rules = read_rules(RULES_FILE) if RULES_FILE > '' else None
+        if WORKERS > 0:
+            results = classify_messages(messages, rules, WORKERS, templates=templates)
+        else:
+            classifier = Classifier(rules)
+            results = ((msg, classifier.classify(msg), None, None) for msg in messages)
+    else:
+        results = ((msg, None, None, None) for msg in messages)
+
+    # Cycle through the messages that fall within the start and end dates.
+    # When message meets criteria, display the date, sender, and subject of the message on the terminal.
+    for msg, command, key, fields in profile.iterate('read', results):
+        received_time = datetime.strftime(msg.received_time, '%m/%d/%Y %H:%M')
+
+        if command is None:
+            print("------------------------------------------------------------------------------------------------------------")
+            print(received_time + " | " + msg.sender + " | " + msg.subject)
+            print("------------------------------------------------------------------------------------------------------------")
+
+    # Prompt the user to (l)oad, (s)kip, or (q)uit.
+            print("(l)oad, (s)kip, or (q)uit")
+            command = input().lower()
+
+    # If log is selected, add the message to the current batch of rows for the JobContacts table.
+    # Each batch is inserted where the rows do not already exist.
+    # If skip is selected, move on to the next email message that meets the search criteria.
+        if command in ('l', 'list', 'load'):
+            if fields is None:
+                with profile.phase('extract'):
+                    fields = extractor.extract(msg)
+            with profile.phase('load'):
+                loader.add(received_time, msg.sender, msg.subject, msg.body, key, fields)
+
+    # If quit is selected, display the rows that were inserted and quit the program.
+        if command in ('q', 'quit'):
+            break
 
-# If skip is selected, move on to the next email message that meets the search criteria.
-    if command in ('s', 'skip'):
-        continue
+    # Remember the message as processed, so the next incremental run skips it.
+        if checkpoint is not None:
+            checkpoint.mark(msg)
 
-# If quit is selected, display the rows that were inserted and quit the program.
-    if command in ('q', 'quit'):
-        break
+    # Load the last batch and commit changes to the database.
+    # The checkpoint is only saved once the contacts it covers are committed.
+    with profile.phase('load'):
+        loader.close()
+    if checkpoint is not None:
+        checkpoint.save()
 
-# Commit changes to the database.
-conn.commit()
+    # Print the number of job contacts inserted, which leaves out the duplicates skipped by the loader.
+    print(str(loader.loaded) + ' contacts loaded into JobContacts table.')
+    if PROFILING:
+        profile.report()
+        if PROFILE_JSON > '':
+            profile.write_json(PROFILE_JSON)
+    if not AUTO:
+        print("View contacts for date range? y/n:")
+        if input().lower() == 'y': _print_job_contacts(conn, start_date, end_date, PAGE_SIZE or 10)
 
-# Print the job contacts entered for the date range.
-print(str(count) + ' contacts loaded into JobContacts table.')
-print("View contacts for date range? y/n:")
-if input().lower() == 'y': _print_job_contacts(cursor, message_start_date, message_end_date)
+    # Cleanup and exit
+    conn.close()
+    return 0
 
-# Cleanup and exit
-conn.close()
-sys.exit()
+# The worker processes of --workers import this module, so only run when executed as a script.
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,198 @@
+'''
+    Mail sources for job_contacts.py.  Each source yields MailMessage tuples for the messages
+    received between a start and end date, one message at a time.
+
+    Sources:
+        OutlookSource       The Outlook Inbox, read through win32com.  Windows only.
+        MailboxSource       A local mailbox file or folder read with the mailbox module: mbox, Maildir or MH.
+        EmlDirectorySource  A folder of .eml files, one message per file.
+
+    Syntax:
+        source = open_source('outlook')
+        source = open_source('C:/mail/archive.mbox')
+        for msg in source.messages(start, end):
+            print(msg.received_time, msg.sender, msg.subject)
+
+    Notes:
+        Received times are returned as naive datetimes in local time, the way Outlook shows them.
+
+        raw_messages yields the messages before their body is parsed, as RawMessage tuples holding the
+        received time, message id and bytes of each message, so the parsing can be left to the worker
+        processes of pipeline.py.  read_message turns one into a MailMessage.  The Outlook source has
+        no raw form, and yields the same MailMessage tuples from both methods.
+'''
+
+import collections
+import email
+import email.header
+import email.parser
+import email.utils
+import mailbox
+import os
+from datetime import datetime
+
+MailMessage = collections.namedtuple('MailMessage', ['received_time', 'sender', 'subject', 'body', 'message_id'])
+RawMessage = collections.namedtuple('RawMessage', ['received_time', 'message_id', 'data'])
+
+def _local_time(value):
+    """ Convert an aware datetime to a naive local datetime. """
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+def _in_range(received_time, start, end):
+    if received_time is None:
+        return False
+    return (start is None or received_time >= start) and (end is None or received_time <= end)
+
+def _header(msg, name):
+    """ Return a header of a parsed email message as text, decoding any encoded words. """
+    value = msg[name]
+    if value is None:
+        return ''
+    if '=?' not in value:
+        return value
+    try:
+        return str(email.header.make_header(email.header.decode_header(value)))
+    except (LookupError, ValueError):
+        return value
+
+def _plain_text(msg):
+    """ Return the first text/plain part of a parsed email message, or an empty string. """
+    for part in msg.walk():
+        if part.get_content_type() == 'text/plain':
+            payload = part.get_payload(decode=True) or b''
+            return payload.decode(part.get_content_charset() or 'utf-8', errors='replace')
+    return ''
+
+def _received_time(msg):
+    """ Return the Date header of a parsed email message as a naive local datetime, or None. """
+    if not msg['Date']:
+        return None
+    try:
+        return _local_time(email.utils.parsedate_to_datetime(msg['Date']))
+    except (TypeError, ValueError):
+        return None
+
+def _parse_in_range(data, start, end, message_id):
+    """ Parse the headers of a raw message, and the whole message only if it falls between start and end. """
+    if start is not None or end is not None:
+        headers = email.parser.BytesHeaderParser().parsebytes(data)
+        if not _in_range(_received_time(headers), start, end):
+            return None
+    return parse_message(email.message_from_bytes(data), message_id)
+
+def _raw_in_range(data, start, end, message_id):
+    """ Parse the headers of a raw message and return it as a RawMessage if it falls between start and end. """
+    headers = email.parser.BytesHeaderParser().parsebytes(data)
+    received_time = _received_time(headers)
+    if not _in_range(received_time, start, end):
+        return None
+    return RawMessage(received_time, headers['Message-ID'] or message_id, data)
+
+def read_message(item):
+    """ Return a MailMessage for a RawMessage, or the item itself when it is already a MailMessage. """
+    if isinstance(item, RawMessage):
+        return parse_message(email.message_from_bytes(item.data), item.message_id)
+    return item
+
+def parse_message(msg, message_id=None):
+    """ Convert a parsed email message into a MailMessage.
+
+        Messages are parsed with the default compat32 policy, which is many times faster than
+        email.policy.default, and only the headers that are used are decoded.
+    """
+    received_time = _received_time(msg)
+    sender = email.utils.parseaddr(_header(msg, 'From'))[1]
+    return MailMessage(received_time, sender, _header(msg, 'Subject'), _plain_text(msg),
+                       msg['Message-ID'] or message_id or '')
+
+class OutlookSource:
+    """ Read the Outlook Inbox, or another default folder, through the Outlook COM interface. """
+    def __init__(self, folder=6):
+        import win32com.client
+        outlook = win32com.client.Dispatch('outlook.application')
+        mapi = outlook.GetNamespace("MAPI")
+        # The Inbox is default folder number 6.
+        self.folder = mapi.GetDefaultFolder(folder)
+
+    """ Yield the messages received between start and end. """
+    def messages(self, start=None, end=None):
+        items = self.folder.Items
+        if start is not None:
+            items = items.Restrict("[ReceivedTime] >= '" + datetime.strftime(start, '%m/%d/%Y %H:%M') + "'")
+        if end is not None:
+            items = items.Restrict("[ReceivedTime] <= '" + datetime.strftime(end, '%m/%d/%Y %H:%M') + "'")
+        items.Sort("[ReceivedTime]")
+        msg = items.GetFirst()
+        while msg is not None:
+            # Meeting requests and other non-mail items do not have a sender address.
+            sender = getattr(msg, 'SenderEmailAddress', None)
+            if sender is not None:
+                # Outlook reports local time with a UTC time zone attached, so the time zone is dropped, not converted.
+                # A plain datetime is also needed so the message can be pickled for the worker processes.
+                received_time = datetime(*msg.ReceivedTime.timetuple()[:6])
+                yield MailMessage(received_time, sender, msg.Subject, msg.Body, msg.EntryID)
+            msg = items.GetNext()
+
+    """ Yield the messages received between start and end.  Outlook items are read into MailMessage tuples here. """
+    def raw_messages(self, start=None, end=None):
+        return self.messages(start, end)
+
+class MailboxSource:
+    """ Read a local mbox file, or a Maildir or MH folder, with the mailbox module. """
+    def __init__(self, path, format='mbox'):
+        factories = {'maildir': mailbox.Maildir, 'mbox': mailbox.mbox, 'mh': mailbox.MH}
+        self.path = path
+        self.mailbox = factories[format](path, factory=None, create=False)
+
+    """ Yield the messages received between start and end. """
+    def messages(self, start=None, end=None):
+        for key in self.mailbox.iterkeys():
+            mail_message = _parse_in_range(self.mailbox.get_bytes(key), start, end, str(key))
+            if mail_message is not None and _in_range(mail_message.received_time, start, end):
+                yield mail_message
+
+    """ Yield the messages received between start and end as RawMessage tuples, parsing only their headers. """
+    def raw_messages(self, start=None, end=None):
+        for key in self.mailbox.iterkeys():
+            raw_message = _raw_in_range(self.mailbox.get_bytes(key), start, end, str(key))
+            if raw_message is not None:
+                yield raw_message
+
+class EmlDirectorySource:
+    """ Read a folder of .eml files. """
+    def __init__(self, path):
+        self.path = path
+
+    """ Yield the messages received between start and end, in file name order. """
+    def messages(self, start=None, end=None):
+        for name in sorted(os.listdir(self.path)):
+            if not name.lower().endswith('.eml'):
+                continue
+            with open(os.path.join(self.path, name), 'rb') as eml:
+                mail_message = _parse_in_range(eml.read(), start, end, name)
+            if mail_message is not None and _in_range(mail_message.received_time, start, end):
+                yield mail_message
+
+    """ Yield the messages received between start and end as RawMessage tuples, parsing only their headers. """
+    def raw_messages(self, start=None, end=None):
+        for name in sorted(os.listdir(self.path)):
+            if not name.lower().endswith('.eml'):
+                continue
+            with open(os.path.join(self.path, name), 'rb') as eml:
+                raw_message = _raw_in_range(eml.read(), start, end, name)
+            if raw_message is not None:
+                yield raw_message
+
+def open_source(spec):
+    """ Return the mail source for 'outlook', a folder of .eml files, a Maildir folder or an mbox file. """
+    if spec.lower() == 'outlook':
+        return OutlookSource()
+    if os.path.isdir(spec):
+        if os.path.isdir(os.path.join(spec, 'cur')) and os.path.isdir(os.path.join(spec, 'new')):
+            return MailboxSource(spec, 'maildir')
+        if os.path.exists(os.path.join(spec, '.mh_sequences')):
+            return MailboxSource(spec, 'mh')
+        return EmlDirectorySource(spec)
+    return MailboxSource(spec, 'mbox')
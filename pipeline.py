@@ -0,0 +1,96 @@
+'''
+    Parallel classification of email messages for job_contacts.py --auto --workers=N.
+
+    The calling thread reads messages from the mail source and groups them into chunks.  Each chunk
+    is parsed and classified, and the content hash and extracted fields of each message to load are computed,
+    in a pool of worker processes.  Results come back to the calling thread in the order the messages were read, where
+    a single writer adds them to the JobContactLoader.
+
+    The messages are best read with the raw_messages method of the mail source, so the calling thread
+    only parses their headers and the workers receive the bytes of each message.  The workers send back
+    the position of each message in its chunk with the action, hash and fields, not the message.  The
+    calling thread keeps the chunk, and parses the body of a raw message itself only when it is loaded.
+
+    At most max_pending chunks are in the pool at once.  When the pool is full, the reader stops and
+    the writer takes the oldest result, so memory stays bounded when the writer or the pool is slower
+    than the mail source.
+
+    Syntax:
+        for msg, action, key, fields in classify_messages(source.raw_messages(start, end), rules, workers=4):
+            if action == 'load':
+                loader.add(the_date, msg.sender, msg.subject, msg.body, key, fields)
+'''
+
+import collections
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+try:
+    from .classifier import Classifier
+    from .extraction import Extractor
+    from .job_contact_loader import content_hash
+    from .mail_sources import read_message
+except ImportError:
+    from classifier import Classifier
+    from extraction import Extractor
+    from job_contact_loader import content_hash
+    from mail_sources import read_message
+
+# The classifiers and extractors are compiled once per worker process and reused for every chunk.
+_classifiers = {}
+_extractors = {}
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def process_chunk(chunk, rules=None, templates=None):
+    """ Classify a chunk of MailMessage or RawMessage tuples.  Return (index in the chunk, action, content hash,
+        extracted fields) for each message, with None for the hash and fields of the messages to skip. """
+    key = None if rules is None else tuple(tuple(rule) for rule in rules)
+    classifier = _classifiers.get(key)
+    if classifier is None:
+        classifier = _classifiers[key] = Classifier(rules)
+    key = None if templates is None else repr(templates)
+    extractor = _extractors.get(key)
+    if extractor is None:
+        extractor = _extractors[key] = Extractor(templates)
+    results = []
+    for index, item in enumerate(chunk):
+        msg = read_message(item)
+        action = classifier.classify(msg)
+        the_hash = None
+        fields = None
+        if action == 'load':
+            the_hash = content_hash(datetime.strftime(msg.received_time, '%m/%d/%Y %H:%M'), msg.sender, msg.subject, msg.body)
+            fields = extractor.extract(msg)
+        results.append((index, action, the_hash, fields))
+    return results
+
+def _results(chunk, future):
+    # Pair each result with the message read by the calling thread, parsing the body of a raw message to load.
+    for index, action, the_hash, fields in future.result():
+        msg = chunk[index]
+        if action == 'load':
+            msg = read_message(msg)
+        yield msg, action, the_hash, fields
+
+def classify_messages(messages, rules=None, workers=None, chunk_size=200, max_pending=None, templates=None):
+    """ Yield (msg, action, content hash, extracted fields) for each message, classifying chunks in a process pool.
+        msg is a MailMessage for the messages to load, and the RawMessage as read for the others. """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 2
+    pending = collections.deque()
+    with ProcessPoolExecutor(workers) as executor:
+        for chunk in _chunks(messages, chunk_size):
+            pending.append((chunk, executor.submit(process_chunk, chunk, rules, templates)))
+            while len(pending) >= max_pending:
+                yield from _results(*pending.popleft())
+        while pending:
+            yield from _results(*pending.popleft())
@@ -0,0 +1,183 @@
+'''
+    A thread safe pool of database connections, so that repeated Database handles can reuse
+    connections instead of paying for a new connection to SQL Server each time.
+
+    Syntax:
+        pool = ConnectionPool(lambda: pyodbc.connect('DSN=DB_NAME'), min_size=1, max_size=5)
+        with pool.connection() as conn:
+            conn.cursor().execute('select 1')
+        d = Database('DB_NAME', pool=pool)
+
+    Notes:
+        Connections idle for longer than idle_timeout seconds are closed, down to min_size connections.
+        A checked out connection is validated with validation_query and replaced if the check fails.
+        When max_size connections are checked out, acquire waits up to timeout seconds for one to be released.
+'''
+
+import contextlib
+import threading
+import time
+
+class PoolTimeout(Exception):
+    """ Raised when no connection becomes available before the acquire timeout. """
+
+class ConnectionPool:
+    """ Hold up to max_size connections created by factory and hand them out one caller at a time. """
+    def __init__(self, factory, min_size=0, max_size=5, idle_timeout=300, validation_query='select 1', timeout=None):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError('ConnectionPool requires 0 <= min_size <= max_size and max_size >= 1')
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.validation_query = validation_query
+        self.timeout = timeout
+        self.closed = False
+        self.condition = threading.Condition()
+        self.idle = []  # (connection, time returned to the pool), most recently returned last
+        self.size = 0
+        self.stats = {'checkouts': 0, 'creations': 0, 'evictions': 0, 'validation_failures': 0, 'waits': 0}
+        for i in range(min_size):
+            self.idle.append((self._create(), time.monotonic()))
+            self.size += 1
+
+    """ Close the idle connections and stop handing out connections. """
+    def close(self):
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.size -= len(idle)
+            self.condition.notify_all()
+        for connection, returned in idle:
+            self._discard(connection)
+
+    """ Check a connection out of the pool, creating one if the pool is below max_size. """
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            connection = None
+            create = False
+            with self.condition:
+                expired = self._evict_idle()
+            self._discard_all(expired)
+            with self.condition:
+                waited = False
+                while not self.idle and self.size >= self.max_size and not self.closed:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise PoolTimeout('No connection available within ' + str(timeout) + ' seconds')
+                    if not waited:
+                        self.stats['waits'] += 1
+                        waited = True
+                    self.condition.wait(remaining)
+                if self.closed:
+                    raise RuntimeError('ConnectionPool is closed')
+                if self.idle:
+                    connection, returned = self.idle.pop()
+                else:
+                    self.size += 1
+                    create = True
+            if create:
+                try:
+                    connection = self._create()
+                except Exception:
+                    with self.condition:
+                        self.size -= 1
+                        self.condition.notify()
+                    raise
+            if create or self._validate(connection):
+                with self.condition:
+                    self.stats['checkouts'] += 1
+                return connection
+            with self.condition:
+                self.stats['validation_failures'] += 1
+                self.size -= 1
+                self.condition.notify()
+            self._discard(connection)
+
+    """ Check a connection out for the duration of a with block and return it afterwards. """
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        except Exception:
+            self.release(connection, discard=True)
+            raise
+        else:
+            self.release(connection)
+
+    """ Return a checked out connection to the pool, rolling back any uncommitted work. """
+    def release(self, connection, discard=False):
+        if not discard:
+            try:
+                connection.rollback()
+            except Exception:
+                discard = True
+        expired = []
+        with self.condition:
+            if discard or self.closed:
+                self.size -= 1
+            else:
+                self.idle.append((connection, time.monotonic()))
+                expired = self._evict_idle()
+            self.condition.notify()
+        if discard or self.closed:
+            self._discard(connection)
+        self._discard_all(expired)
+
+    """ Return a copy of the pool statistics, with the current pool size and idle count. """
+    def statistics(self):
+        with self.condition:
+            stats = dict(self.stats)
+            stats['size'] = self.size
+            stats['idle'] = len(self.idle)
+        return stats
+
+    def _create(self):
+        connection = self.factory()
+        with self.condition:
+            self.stats['creations'] += 1
+        return connection
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _discard_all(self, connections):
+        for connection in connections:
+            self._discard(connection)
+
+    def _evict_idle(self):
+        # Called with the condition held.  Idle connections are ordered oldest first.  The expired connections
+        # are returned for the caller to close after releasing the condition, so a slow close blocks no one else.
+        expired = []
+        if self.idle_timeout is None:
+            return expired
+        cutoff = time.monotonic() - self.idle_timeout
+        while self.idle and self.idle[0][1] < cutoff and self.size > self.min_size:
+            connection, returned = self.idle.pop(0)
+            self.size -= 1
+            self.stats['evictions'] += 1
+            expired.append(connection)
+        return expired
+
+    def _validate(self, connection):
+        if not self.validation_query:
+            return True
+        try:
+            cursor = connection.cursor()
+            cursor.execute(self.validation_query).fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
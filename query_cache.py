@@ -0,0 +1,300 @@
+'''
+    A cache of query results for Database.result_set and sql.py, so repeated reference queries
+    are answered without a round trip to SQL Server.
+
+    Entries are keyed on the datasource name, the statement text with its white space and comments
+    normalized, and the parameters.  The most recently used max_entries results are kept in memory.
+    When a path is given, results are also stored in a SQLite database file, so separate runs of
+    sql.py share them.  Each entry expires ttl seconds after it was stored.  default_path returns
+    the cache file in the user's own cache folder, which sql.py uses when no file is named.
+
+    Syntax:
+        cache = QueryCache('query_cache.db', max_entries=256, ttl=600)
+        d = Database('DB_NAME', cache=cache)
+        rows = d.result_set('select * from dbo.States', ttl=86400)
+        cache.invalidate('States')
+        print(cache.statistics())
+
+    Notes:
+        Only single statements starting with SELECT or WITH are cached.  A batch with more code after a
+        semicolon, or with INSERT, UPDATE, DELETE, MERGE, INTO, EXEC, CREATE, ALTER, DROP or TRUNCATE
+        outside its strings and comments, is always run on the database.  Cached rows are returned as tuples.
+        An entry is invalidated by the names of the tables after JOIN and in each comma separated FROM list
+        of its statement, without schema or brackets, so invalidate('States') covers dbo.States and [dbo].[States].
+        Nothing is invalidated automatically; call invalidate after changing a table.
+        Results with more than max_rows rows are not cached.
+
+        A new cache file is created readable by its owner only, since it holds query results.  The
+        results are stored as JSON, with the types of the values that JSON does not have named
+        from a fixed list, so reading the file never runs code.  Results holding values of any other
+        type are kept in memory only.
+'''
+
+import collections
+import datetime
+import decimal
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+CachedResult = collections.namedtuple('CachedResult', 'description rows')
+
+_TOKENS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\[[^\]]*\]|--[^\n]*|/\*.*?\*/|\s+|[^\s'\"\[\-/;]+|.", re.DOTALL)
+_NAME = re.compile(r'(?:(?:\[[^\]]+\]|"[^"]+"|[\w#@$]+)\.)*(?:\[[^\]]+\]|"[^"]+"|[\w#@$]+)')
+_NAMES = re.compile(_NAME.pattern + r"|'(?:[^']|'')*'|\S")
+
+# Keywords that end the table list of a FROM clause.  Joins do not, since more tables may follow a comma after them.
+_CLAUSES = {'except', 'for', 'from', 'group', 'having', 'intersect', 'option', 'order', 'select', 'union', 'where', 'window'}
+
+# Keywords of statements that change data or run code, which are never answered from the cache.
+_WRITES = {'alter', 'create', 'delete', 'drop', 'exec', 'execute', 'insert', 'into', 'merge', 'truncate', 'update'}
+_WORDS = re.compile(r'[\w#@$]+')
+
+# The value types stored in the cache file besides the JSON ones, by the name they are stored under.
+_TYPES = {'bytearray': bytearray, 'bytes': bytes, 'date': datetime.date, 'datetime': datetime.datetime,
+          'decimal': decimal.Decimal, 'time': datetime.time, 'uuid': uuid.UUID}
+_TYPE_NAMES = {value_type: name for name, value_type in _TYPES.items()}
+_TYPE_CODES = dict(_TYPES, bool=bool, float=float, int=int, str=str)
+_TYPE_CODE_NAMES = {value_type: name for name, value_type in _TYPE_CODES.items()}
+_JSON_TYPES = {type(None), bool, int, float, str}
+
+def cacheable(statement):
+    """ Return True if the statement is a single query whose results may be cached. """
+    words = []
+    ended = False
+    for token in _TOKENS.findall(statement):
+        if token.isspace() or token.startswith('--') or token.startswith('/*'):
+            continue
+        if token == ';':
+            ended = True
+        elif ended:
+            return False
+        elif token[0] not in '\'"[' and not _WRITES.isdisjoint(_WORDS.findall(token.lower())):
+            return False
+        else:
+            words.append(token)
+    return bool(words) and words[0].lower() in ('select', 'with')
+
+def default_path():
+    """ Return the query cache file in the user's local application data folder on Windows, or ~/.cache. """
+    if sys.platform == 'win32' and os.environ.get('LOCALAPPDATA'):
+        folder = os.path.join(os.environ['LOCALAPPDATA'], 'Nelnet')
+    else:
+        folder = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'nelnet')
+    return os.path.join(folder, 'sql_cache.db')
+
+def normalize(statement):
+    """ Return the statement without comments, with each run of white space outside quotes replaced by one space. """
+    parts = []
+    for token in _TOKENS.findall(statement):
+        if token.isspace() or token.startswith('--') or token.startswith('/*'):
+            if parts and parts[-1] != ' ':
+                parts.append(' ')
+        else:
+            parts.append(token)
+    return ''.join(parts).strip().rstrip(';').rstrip()
+
+def table_names(statement):
+    """ Return the lower case names, without schema or quotes, of the tables after JOIN and in each FROM list. """
+    names = set()
+    tokens = _NAMES.findall(normalize(statement))
+    for i, token in enumerate(tokens):
+        if token.lower() not in ('from', 'join'):
+            continue
+        # Read the comma separated list up to the next clause or closing parenthesis, skipping aliases, hints,
+        # join conditions and subqueries.  The tables of a subquery are found from its own FROM.
+        expect_name = True
+        depth = 0
+        for token in tokens[i + 1:]:
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+                if depth < 0:
+                    break
+            elif depth > 0:
+                continue
+            elif token == ',':
+                expect_name = True
+                continue
+            elif token.lower() in _CLAUSES:
+                break
+            elif expect_name and _NAME.fullmatch(token):
+                names.add(token.rsplit('.', 1)[-1].strip('[]"').lower())
+            expect_name = False
+    return names
+
+def _tagged(value):
+    # The json.dumps default for the values JSON has no type for: [type name, text].
+    name = _TYPE_NAMES.get(type(value))
+    if name is None:
+        raise TypeError('A ' + type(value).__name__ + ' value cannot be stored in the cache file')
+    if name in ('bytes', 'bytearray'):
+        return [name, value.hex()]
+    if name in ('date', 'datetime', 'time'):
+        return [name, value.isoformat()]
+    return [name, str(value)]
+
+def _untagged(value):
+    name, text = value
+    if name in ('bytes', 'bytearray'):
+        return _TYPES[name](bytes.fromhex(text))
+    if name in ('date', 'datetime', 'time'):
+        return _TYPES[name].fromisoformat(text)
+    return _TYPES[name](text)
+
+def _encode(result):
+    # The columns holding tagged values are listed, so that only they are read back value by value.
+    typed = [i for i, column in enumerate(zip(*result.rows)) if not _JSON_TYPES.issuperset(map(type, column))]
+    description = [[column[0], _TYPE_CODE_NAMES.get(column[1])] + list(column[2:]) for column in result.description]
+    return json.dumps({'description': description, 'typed': typed, 'rows': result.rows}, default=_tagged)
+
+def _decode(text):
+    data = json.loads(text)
+    rows = data['rows']
+    for i in data['typed']:
+        for row in rows:
+            if isinstance(row[i], list):
+                row[i] = _untagged(row[i])
+    description = [tuple([column[0], _TYPE_CODES.get(column[1])] + column[2:]) for column in data['description']]
+    return CachedResult(description, list(map(tuple, rows)))
+
+def _create_private(path):
+    # Create the cache file and its folder for the owner only, and leave an existing file as it is.
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, mode=0o700, exist_ok=True)
+    try:
+        os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+    except FileExistsError:
+        pass
+
+class QueryCache:
+    """ Cache query results in memory, and optionally in a SQLite file shared between processes. """
+    def __init__(self, path=None, max_entries=256, ttl=300, max_rows=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.lock = threading.Lock()
+        self.memory = collections.OrderedDict()  # key -> (expires, tables, CachedResult), most recently used last
+        self.stats = {'hits': 0, 'misses': 0, 'disk_hits': 0, 'stores': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+        self.store = None
+        if path is not None:
+            _create_private(path)
+            self.store = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self.store.execute('create table if not exists QueryCache (CacheKey text primary key, Expires real, '
+                               'Tables text, Result blob)')
+            self.store.execute('delete from QueryCache where Expires < ?', (time.time(),))
+            self.store.commit()
+
+    """ Close the cache file. """
+    def close(self):
+        with self.lock:
+            if self.store is not None:
+                self.store.close()
+                self.store = None
+
+    """ Return the CachedResult for a statement, or None if it is not cached or has expired.
+        A statement that cacheable rejects is never looked up, and does not count as a miss. """
+    def get(self, datasource, statement, params=()):
+        if not cacheable(statement):
+            return None
+        key = self.key(datasource, statement, params)
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if entry[0] >= now:
+                    self.memory.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return entry[2]
+                del self.memory[key]
+                self.stats['expirations'] += 1
+            if self.store is not None:
+                found = self.store.execute('select Expires, Tables, Result from QueryCache where CacheKey = ?', (key,)).fetchone()
+                result = None
+                if found is not None and found[0] >= now:
+                    try:
+                        result = _decode(found[2])
+                    except (ValueError, TypeError, KeyError):
+                        # An entry written in another format is a miss, and is replaced when the query is stored.
+                        pass
+                if result is not None:
+                    self._remember(key, (found[0], set(found[1].split()), result))
+                    self.stats['hits'] += 1
+                    self.stats['disk_hits'] += 1
+                    return result
+            self.stats['misses'] += 1
+            return None
+
+    """ Remove the entries that read a table, or every entry when table is None.  Return the number removed. """
+    def invalidate(self, table=None):
+        name = None if table is None else table.rsplit('.', 1)[-1].strip('[]"').lower()
+        with self.lock:
+            keys = [key for key, entry in self.memory.items() if name is None or name in entry[1]]
+            for key in keys:
+                del self.memory[key]
+            removed = len(keys)
+            if self.store is not None:
+                if name is None:
+                    cursor = self.store.execute('delete from QueryCache')
+                else:
+                    cursor = self.store.execute("delete from QueryCache where ' ' || Tables || ' ' like ?", ('% ' + name + ' %',))
+                self.store.commit()
+                removed = max(removed, cursor.rowcount)
+            self.stats['invalidations'] += removed
+        return removed
+
+    """ Return the cache key for a statement run with params against a datasource. """
+    def key(self, datasource, statement, params=()):
+        text = repr((datasource, normalize(statement), tuple(params)))
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    """ Store the rows of a query, keeping them for ttl seconds, or the cache default when ttl is None. """
+    def put(self, datasource, statement, params, description, rows, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or len(rows) > self.max_rows or not cacheable(statement):
+            return
+        key = self.key(datasource, statement, params)
+        expires = time.time() + ttl
+        tables = table_names(statement)
+        result = CachedResult([tuple(column[:7]) for column in description], [tuple(row) for row in rows])
+        with self.lock:
+            self._remember(key, (expires, tables, result))
+            if self.store is not None:
+                try:
+                    text = _encode(result)
+                except TypeError:
+                    text = None
+                if text is not None:
+                    self.store.execute('insert or replace into QueryCache (CacheKey, Expires, Tables, Result) values (?, ?, ?, ?)',
+                                       (key, expires, ' '.join(sorted(tables)), text))
+                    self.store.commit()
+            self.stats['stores'] += 1
+
+    """ Return a copy of the cache statistics, with the number of entries in memory. """
+    def statistics(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self.memory)
+        return stats
+
+    def _remember(self, key, entry):
+        # Called with the lock held.
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -3,12 +3,34 @@
     Type "py sql.py" at command line to view syntax.
 
     Parameters:
+        --batch-size Number of rows fetched from the database per round trip.  Optional, default=1000.
+        --cache     Answer repeated queries from the query cache file.  Optional, default=no cache unless SQL_CACHE_FILE is set.
+        --cache-file Query cache file name.  Optional, default=SQL_CACHE_FILE, or sql_cache.db in the user's cache folder.
+        --cache-ttl Seconds a cached query result is kept.  Optional, default=300.
         --colsep    Column separator on the output file.  Optional, default=",".  For tab delimited, use "\t"
+        --commit-interval Number of rows inserted between commits with --load.  Optional, default=10000.
         --database  Name of the ODBC datasource for database connection.  Required, no default.
         --encoding  Encoding of input/output files.  Optional, default="utf-8".
+        --format    Output file format: csv, parquet, arrow or npy.  Optional, default="csv".
         --infile    Input SQL file name.  Optional, text may be piped in from console.
+        --load      CSV or Parquet file to insert into --table instead of running SQL.  Optional.
+        --no-cache  Always run the queries on the database, even when SQL_CACHE_FILE is set.
+        --no-header The --load CSV file has no header row, and its values are inserted by column position.
         --outfile   Output file name.  Optional, text will be written to the console if not used.
+                    Required for the parquet, arrow and npy formats, and with --parallel.
+        --parallel  Number of batches to run at once, each on its own connection.  Optional, default=run in order.
+        --poll      Seconds between looks at the --serve folder for new jobs.  Optional, default=1.
+        --profile   Print the seconds, rows and bytes of each phase (connect, execute, fetch, write) to stderr at the end.
+        --profile-json JSON file for the --profile phase totals and a trace of each timed call.  Optional, implies --profile.
+        --profile-python cProfile statistics file for the whole run, to view with "py -m pstats FILE".  Optional.
         --quote     Quote character around column values.  Optional, default='"'.  Eliminate quotes with --q=""
+                    A quote character inside a column value is escaped by doubling it.
+        --row-group-size Number of rows per row group in the parquet, arrow and npy formats.  Optional, default=100000.
+        --serve     Folder of job files to run, one after another, over connections kept open between jobs.  Optional.
+        --table     Name of the table for --load, created from the file columns if it does not exist.
+        --types     Semicolon separated SQL types for the columns of a new --load table, as name=type.  Optional,
+                    default=inferred from the first --batch-size rows.
+        --uncache   Comma separated table names whose cached results are removed before the script runs.  Optional.
 
     Syntax: echo "select * from table_name" | py sql.py --database=DB_NAME > somefile.csv
     Alternate Syntax: py sql.py --colsep="|" --database="DB_NAME" --infile="sqlinput.sql" --outfile="output.csv" --quote='"'
@@ -27,142 +49,666 @@
         On Windows, you can change the file encoding of the SQL input file using notepad's "save as..." feature.
 
         For tab delimited output, use --colsep="\t" in the command line parameters.
+
+        Rows are streamed from the database in batches of --batch-size rows and written as they arrive,
+        so memory use stays flat regardless of the size of the resultset.
+
+        The parquet and arrow formats require the pyarrow package, and the npy format requires numpy.
+        These formats keep the column types from the database and are written one row group at a time.
+
+        A script may hold several batches separated by lines holding only GO, as in sqlcmd.  "GO 3" runs the
+        batch before it three times.  The batches run in order on one connection, and the changes made by each
+        batch are committed before the next one starts.  Csv resultsets are all written to the one output,
+        including each resultset of a batch holding several queries.  Columnar resultsets are each written to
+        their own file, numbered after --outfile: output_1.parquet, output_2.parquet and so on, so a batch may
+        return only one resultset with the columnar formats.  Put a GO line between the queries instead.
+
+        With --parallel=N, the batches must be independent of each other.  They run N at a time on N connections,
+        and the resultset of each batch is written to its own numbered output file, also for csv.
+        A failed batch does not stop the others, its output file is removed, and the program ends with code 1.
+
+        When --outfile is used, the rows and seconds of each batch are printed at the end of the program.
+
+        With --cache, the results of SELECT queries are kept in a SQLite cache file for --cache-ttl seconds,
+        and later runs with the same database, query and --cache option write them without going to the database.
+        Set the SQL_CACHE_FILE environment variable to the cache file name to use the cache on every run.
+        Cached results are not refreshed when tables change.  Use --uncache=TableName after changing a table.
+        Batches with more than one statement, or that change data, are never cached.  The default cache file is
+        %LOCALAPPDATA%\\Nelnet\\sql_cache.db on Windows and ~/.cache/nelnet/sql_cache.db elsewhere, and a new
+        cache file is created readable by its owner only.
+
+        With --load, a CSV or Parquet file is inserted into --table in batches of --batch-size rows, and committed
+        every --commit-interval rows.  The CSV file uses --colsep, --quote and --encoding, and empty values are
+        loaded as nulls.  Files ending in .parquet, or --format=parquet, are read as Parquet with pyarrow.
+        The rows committed so far are kept in a state file named after the load file with ".load" added.
+        If a load fails, run the same command again to resume after the last commit.
+        Syntax: py sql.py --database="DB_NAME" --load="extract.csv" --table="dbo.Staging" --types="Amount=decimal(12, 2)"
+
+        With --profile, the time spent connecting, executing statements, fetching rows, reading the cache and
+        formatting and writing the output is added up and printed to stderr when the program ends, so the
+        slowest phase of an export or load can be found without a profiler.  Without --profile, nothing is timed.
+
+        sql.py can also be run from Python, without starting a new interpreter for each run.  main takes the
+        command line parameters as a list and returns the exit code:
+            import sql
+            code = sql.main(['--database=DB_NAME', '--infile=sqlinput.sql', '--outfile=output.csv'])
+        The database driver, and the modules for --load, --cache, --parallel and the columnar formats, are only
+        imported when they are used, so printing the syntax or reporting a bad parameter does not load pyodbc.
+        A database error, a missing package such as pyarrow, or a file that cannot be read or written ends the
+        run with a one line message on stderr and code 1.
+
+        With --serve=FOLDER, sql.py runs until it is stopped, and runs each job file placed in the folder.
+        A job file has the .job extension and holds the parameters of one run on one line, such as
+            --database="DB_NAME" --infile="C:\\SqlJobs\\daily.sql" --outfile="C:\\SqlJobs\\daily.csv"
+        Parameters given with --serve are the defaults for every job, and --infile is required in each job.
+        Jobs run one at a time, in the order of their file names.  The connections to each database are kept
+        open in a pool between jobs, so a job pays only for its queries, not for starting Python, loading pyodbc
+        and connecting.
+        While a job runs, its file is renamed to .running, and then to .done or .failed, with the console output
+        of the job in a .log file of the same name.  Write a job file under another name and rename it to .job,
+        so a half written job is never picked up.  Create a file named "stop" in the folder, or press Ctrl+C,
+        to stop the server.  The stop file is removed as the server stops.
+        Syntax: py sql.py --serve="C:\\SqlJobs" --poll=1
 '''
 
 import sys
+import copy
 import getopt
-import database
-from database import Database
+import os
+import time
 
-def _print_syntax():
-    syntax = '''    Default syntax: echo "select * from table_name" | py sql.py --database=DB_NAME > somefile.csv
+LONG_OPTIONS = ["batch-size=","c=","cache","cache-file=","cache-ttl=","colsep=","commit-interval=","database=","encoding=",
+                "format=","infile=","load=","no-cache","no-header","outfile=","parallel=","poll=","profile","profile-json=",
+                "profile-python=","quote=","row-group-size=","serve=","table=","types=","uncache="]
+
+SYNTAX = '''    Default syntax: echo "select * from table_name" | py sql.py --database=DB_NAME > somefile.csv
     Long Syntax:    py sql.py --colsep="|" --database="DB_NAME" --infile="sqlinput.sql" --outfile="output.csv" --quote='"'
     Short Syntax:   py sql.py --c="," --d="DbName" --i="SqlFile.sql" --o="OutputFile.csv" --q='"'
+    Server Syntax:  py sql.py --serve="C:\\SqlJobs" --poll=1
     Parameters:
+        --batch-size Number of rows fetched from the database per round trip.  Optional, default=1000.
+        --cache     Answer repeated queries from the query cache file.  Optional, default=no cache unless SQL_CACHE_FILE is set.
+        --cache-file Query cache file name.  Optional, default=SQL_CACHE_FILE, or sql_cache.db in the user's cache folder.
+        --cache-ttl Seconds a cached query result is kept.  Optional, default=300.
         --colsep    Column separator on the output.  Optional, default=",".  For tab delimited, use "\\t".
+        --commit-interval Number of rows inserted between commits with --load.  Optional, default=10000.
         --database  Name of the ODBC datasource for database connection.  Required, no default.
         --encoding  Encoding of input/output file.  Optional, default="utf-8".
+        --format    Output file format: csv, parquet, arrow or npy.  Optional, default="csv".
         --infile    Input SQL file name.  Optional, default=pipe SQL input from console.
+        --load      CSV or Parquet file to insert into --table instead of running SQL.  Optional.
+        --no-cache  Always run the queries on the database, even when SQL_CACHE_FILE is set.
+        --no-header The --load CSV file has no header row, and its values are inserted by column position.
         --outfile   Output file name.  Optional, default=print output to console.
+        --parallel  Number of batches to run at once, each on its own connection.  Optional, default=run in order.
+        --poll      Seconds between looks at the --serve folder for new jobs.  Optional, default=1.
+        --profile   Print the seconds, rows and bytes of each phase (connect, execute, fetch, write) to stderr at the end.
+        --profile-json JSON file for the --profile phase totals and a trace of each timed call.  Optional, implies --profile.
+        --profile-python cProfile statistics file for the whole run, to view with "py -m pstats FILE".  Optional.
         --quote     Quote character around column values.  Optional, default='"'.  Eliminate quotes with --q=\"\"
+        --row-group-size Number of rows per row group in the parquet, arrow and npy formats.  Optional, default=100000.
+        --serve     Folder of job files to run, one after another, over connections kept open between jobs.  Optional.
+        --table     Name of the table for --load, created from the file columns if it does not exist.
+        --types     Semicolon separated SQL types for the columns of a new --load table, as name=type.  Optional,
+                    default=inferred from the first --batch-size rows.
+        --uncache   Comma separated table names whose cached results are removed before the script runs.  Optional.
     '''
-    print(syntax)
-    sys.exit(1)
-
-if len(sys.argv) < 2:
-    _print_syntax()
-
-# Set default values for command line parameters.
-argv = sys.argv[1:]
-COL_SEP = ','
-DB_NAME = ''
-ENCODING = 'utf-8'
-IN_FILE = ''
-OUT_FILE = ''
-QUOTE='"'
-SQL_STMT = ''
-
-# Retrieve options from the command line.
-opts, args = getopt.getopt(argv, "c:d:e:i:o:", ["colsep=","database=","encoding=","infile=","outfile=","quote="])
-for opt, arg in opts:
-    if opt in ("-c", "--colsep"):
-        COL_SEP = arg
-        if COL_SEP == "\\t":
-            COL_SEP = "\N{TAB}"
-    elif opt in ("-d", "--database"):
-        DB_NAME = arg
-    elif opt in ("-e", "--encoding"):
-        ENCODING = arg
-    elif opt in ("-i", "--infile"):
-        IN_FILE = arg
-    elif opt in ("-o", "--outfile"):
-        OUT_FILE = arg
-    elif opt in ("-q", "--quote"):
-        QUOTE = arg
-
-# Write the runtime parameters back to the console.
-if OUT_FILE > '':
-    print("Starting program " + sys.argv[0])
-    print("-- Runtime Parameters --")
-    print("  Column Seperator: " + COL_SEP)
-    print("  Database Name:    " + DB_NAME)
-    print("  Encoding:         " + ENCODING)
-    print("  Input File:       " + IN_FILE)
-    print("  Output File:      " + OUT_FILE)
-    print("  Quote:            " + QUOTE)
-
-# If a database name was provided, connect to the database.
-if DB_NAME > '':
-    pass
-# Otherwise, fail with syntax in the error message.
-else:
-    print("--database parameter is a required value")
-    _print_syntax()
-
-# If an input file was passed from command line, open the file for reading
-# and build the SQL statement.  Otherwise, build the SQL statement from console input.
-if IN_FILE > '':
+
+class UsageError(ValueError):
+    """ Raised for a missing or invalid command line parameter. """
+
+class OutputError(ValueError):
+    """ Raised for a batch whose resultsets the output format cannot hold. """
+
+def _reported_error(fail_error):
+    """ Return True for the errors reported in one line instead of a traceback: a missing optional package,
+        a file that cannot be read or written, an OutputError, and the errors of the database driver. """
+    if isinstance(fail_error, (ImportError, OSError, OutputError)):
+        return True
+    # The driver is only in sys.modules once a connection was made, and only then can it have failed.
+    error = getattr(sys.modules.get('pyodbc'), 'Error', None)
+    return isinstance(error, type) and isinstance(fail_error, error)
+
+class Options:
+    """ The command line parameters of one run, with their default values. """
+    def __init__(self):
+        self.batch_size = 1000
+        self.cache_file = os.environ.get('SQL_CACHE_FILE', '')
+        self.cache_ttl = 300
+        self.col_sep = ','
+        self.commit_interval = 10000
+        self.db_name = ''
+        self.encoding = 'utf-8'
+        self.format = 'csv'
+        self.header = True
+        self.in_file = ''
+        self.load_file = ''
+        self.out_file = ''
+        self.parallel = 0
+        self.poll = 1.0
+        self.profile_json = ''
+        self.profile_python = ''
+        self.profiling = False
+        self.quote = '"'
+        self.row_group_size = 100000
+        self.serve = ''
+        self.table = ''
+        self.types = {}
+        self.uncache = ''
+        self.use_cache = self.cache_file > ''
+
+def _numbered_file(out_file, number, total):
+    """ Return the output file name for batch number of total, such as output_2.csv for output.csv. """
+    if total < 2:
+        return out_file
+    root, extension = os.path.splitext(out_file)
+    return root + '_' + str(number) + extension
+
+def _positive(opt, arg):
     try:
-        with open(IN_FILE, "rt", encoding=ENCODING) as inf:
-            for line in inf.readlines():
-                SQL_STMT += line
-    except FileNotFoundError as fail_error:
-        print(fail_error)
-        sys.exit(1)
-else:
-    for line in sys.stdin:
-        SQL_STMT += line
-
-# If an output file was passed from command line, open it for writing.
-# Otherwise, any resultset will be output to stdout (console).
-if OUT_FILE > '':
+        value = int(arg)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise UsageError(opt + " must be a positive whole number")
+    return value
+
+def parse_options(argv, defaults=None):
+    """ Return the Options for a list of command line parameters, starting from a copy of defaults if given.
+        Raise UsageError for an unknown or invalid parameter. """
+    from columnar import WRITERS
+    options = Options() if defaults is None else copy.copy(defaults)
+    options.types = dict(options.types)
+    # "c=" keeps the short --c="," form meaning --colsep now that --cache also starts with c.
     try:
-        OUT = open(OUT_FILE ,mode="wt",buffering=-1,encoding=ENCODING)
-    except IOError as fail_error:
-        print(fail_error)
-        print("Unable to open " + OUT_FILE + " for writing.")
-        sys.exit(1)
-else:
-    OUT = False
-
-# Connect the database.
-d = Database(DB_NAME)
-
-# Execute the SQL statement.
-rows = d.result_set(SQL_STMT)
-
-# If rows were returned in the resultset, either write them to the output file, 
-# or print them to the console, as directed by command line arguments.
-if rows is None:
-    pass
-else:
-    for row in rows:
-        i = 0
-        # Print each column value wrapped in quote characters 
-        # and separated by the column separator.
-        for x in row:
-            if i > 0:
-                if OUT:
-                    OUT.write(COL_SEP)
-                else:
-                    print(",", end='')
-            if OUT:
-                OUT.write(QUOTE + str(x).strip() + QUOTE)
+        opts, args = getopt.getopt(argv, "b:c:d:e:f:i:o:p:r:", LONG_OPTIONS)
+    except getopt.GetoptError as fail_error:
+        raise UsageError(str(fail_error))
+    for opt, arg in opts:
+        if opt in ("-b", "--batch-size"):
+            options.batch_size = _positive("--batch-size", arg)
+        elif opt == "--cache":
+            options.use_cache = True
+        elif opt == "--cache-file":
+            options.cache_file = arg
+        elif opt == "--cache-ttl":
+            options.cache_ttl = _positive("--cache-ttl", arg)
+        elif opt in ("-c", "--c", "--colsep"):
+            options.col_sep = arg
+            if options.col_sep == "\\t":
+                options.col_sep = "\N{TAB}"
+        elif opt == "--commit-interval":
+            options.commit_interval = _positive("--commit-interval", arg)
+        elif opt in ("-d", "--database"):
+            options.db_name = arg
+        elif opt in ("-e", "--encoding"):
+            options.encoding = arg
+        elif opt in ("-f", "--format"):
+            options.format = arg.lower()
+            if options.format != 'csv' and options.format not in WRITERS:
+                raise UsageError("--format must be one of csv, " + ", ".join(WRITERS))
+        elif opt in ("-i", "--infile"):
+            options.in_file = arg
+        elif opt == "--load":
+            options.load_file = arg
+        elif opt == "--no-cache":
+            options.use_cache = False
+        elif opt == "--no-header":
+            options.header = False
+        elif opt in ("-o", "--outfile"):
+            options.out_file = arg
+        elif opt in ("-p", "--parallel"):
+            options.parallel = _positive("--parallel", arg)
+        elif opt == "--poll":
+            try:
+                options.poll = float(arg)
+            except ValueError:
+                options.poll = 0
+            if options.poll <= 0:
+                raise UsageError("--poll must be a positive number of seconds")
+        elif opt == "--profile":
+            options.profiling = True
+        elif opt == "--profile-json":
+            options.profile_json = arg
+            options.profiling = True
+        elif opt == "--profile-python":
+            options.profile_python = arg
+        elif opt in ("-q", "--quote"):
+            options.quote = arg
+        elif opt in ("-r", "--row-group-size"):
+            options.row_group_size = _positive("--row-group-size", arg)
+        elif opt == "--serve":
+            options.serve = arg
+        elif opt == "--table":
+            options.table = arg
+        elif opt == "--types":
+            for column_type in arg.split(';'):
+                name, equals, sql_type = column_type.partition('=')
+                if equals == '' or name.strip() == '' or sql_type.strip() == '':
+                    raise UsageError("--types must be a list of name=type separated by semicolons")
+                options.types[name.strip()] = sql_type.strip()
+        elif opt == "--uncache":
+            options.uncache = arg
+    return options
+
+def _check(options):
+    # If a database name was provided, connect to the database.  Otherwise, fail with syntax in the error message.
+    if options.db_name == '':
+        raise UsageError("--database parameter is a required value")
+    # The columnar formats are binary and can only be written to a file.
+    if options.format != 'csv' and options.out_file == '':
+        raise UsageError("--outfile parameter is a required value for the " + options.format + " format")
+    # Parallel batches each write their own numbered output file.
+    if options.parallel > 0 and options.out_file == '':
+        raise UsageError("--outfile parameter is a required value with --parallel")
+    if options.load_file > '' and options.table == '':
+        raise UsageError("--table parameter is a required value with --load")
+
+class _Job:
+    """ One run of sql.py: its options, and the profile, query cache and connection pool it runs with. """
+    def __init__(self, options, pool=None):
+        from instrumentation import Profile
+        self.options = options
+        self.pool = pool
+        self.profile = Profile(enabled=options.profiling, trace=options.profile_json > '')
+        # Database only times its calls when it is given a profile, so without --profile it runs untimed.
+        self.db_profile = self.profile if options.profiling else None
+        self.cache = None
+
+    """ Return a Database for the --database datasource, borrowing its connection from the pool if there is one. """
+    def connect(self):
+        from database import Database
+        return Database(self.options.db_name, pool=self.pool, profile=self.db_profile)
+
+    """ Execute one batch and write each resultset it returns.  Return the number of rows written, or the rows
+        affected, and whether the batch returned a resultset.  The csv resultsets are written one after another
+        to out.  A columnar file holds one resultset, so a batch returning more than one raises OutputError. """
+    def export(self, d, statement, out, out_file):
+        options = self.options
+        count = 0
+        affected = -1
+        resultsets = 0
+        # With --cache, a query with an unexpired cached result is answered without the database, and the result
+        # of any other query is stored in the cache once all of its rows are written and no other resultset follows.
+        cached = None
+        if self.cache is not None:
+            with self.profile.phase('cache'):
+                cached = self.cache.get(options.db_name, statement)
+        if cached is not None:
+            results = [(cached.description, (cached.rows[i:i + options.batch_size]
+                                             for i in range(0, len(cached.rows), options.batch_size)))]
+        else:
+            results = d.iter_resultsets(statement, options.batch_size)
+        kept = [] if self.cache is not None and cached is None else None
+        for description, batches in results:
+            if description is None:
+                if d.cursor.rowcount >= 0:
+                    affected = max(affected, 0) + d.cursor.rowcount
+                continue
+            resultsets += 1
+            if resultsets == 1:
+                first_description = description
+            elif options.format != 'csv':
+                raise OutputError("The batch returned more than one resultset, and a " + options.format + " file holds one.  "
+                                 "Put a GO line between the queries to write each one to its own file.")
+            if kept is not None:
+                batches = self._keep(batches, kept)
+            if options.format == 'csv':
+                count += self._write_csv(batches, out)
             else:
-                print(QUOTE + str(x).strip() + QUOTE, end='')
-            i += 1
-        # Print a new line to end the tuple.
-        if OUT:
-             OUT.write("\n")
+                count += self._write_columnar(description, batches, out_file)
+        if kept is not None and resultsets == 1:
+            self.cache.put(options.db_name, statement, (), first_description, kept, options.cache_ttl)
+        if resultsets == 0:
+            return affected, False
+        return count, True
+
+    def _keep(self, batches, kept):
+        # Yield the batches, adding their rows to kept for the cache until there are more than it stores.
+        for rows in batches:
+            if len(kept) <= self.cache.max_rows:
+                kept.extend(rows)
+            yield rows
+
+    def _write_csv(self, batches, out):
+        # Format each batch of --batch-size rows into one buffer and write it to out.
+        # Each column value is wrapped in quote characters and separated by the column separator.
+        from formatters import get_formatter
+        formatter = get_formatter(self.options.col_sep, self.options.quote)
+        count = 0
+        for rows in batches:
+            with self.profile.phase('write') as timer:
+                text = formatter.format_batch(rows)
+                out.write(text)
+                if timer is not None:
+                    timer.rows, timer.bytes = len(rows), len(text)
+            count += len(rows)
+        return count
+
+    def _write_columnar(self, description, batches, out_file):
+        # Pass each batch to a writer built from the cursor description, which writes a row group
+        # to out_file every --row-group-size rows.
+        from columnar import get_writer
+        options = self.options
+        writer = get_writer(options.format, out_file, description, options.row_group_size)
+        count = 0
+        try:
+            for rows in batches:
+                with self.profile.phase('write') as timer:
+                    writer.write_batch(rows)
+                    if timer is not None:
+                        timer.rows = len(rows)
+                count += len(rows)
+        except Exception:
+            # Close a file already opened, so a failed batch can remove it.
+            if writer.types is not None:
+                writer.close_file()
+            raise
+        with self.profile.phase('write'):
+            writer.close()
+        return count
+
+    """ Insert the rows of the --load file into --table and return the exit code. """
+    def load(self):
+        from bulk_load import BulkLoader
+        options = self.options
+        print("Loading " + options.load_file + " into " + options.table)
+        d = self.connect()
+        loader = BulkLoader(d, options.table, options.batch_size, options.commit_interval, options.types, options.header,
+                            progress=lambda rows, rate: print("  {:>12} rows committed, {:>10.0f} rows/sec".format(rows, rate)))
+        try:
+            loader.load(options.load_file, 'parquet' if options.format == 'parquet' else None,
+                        options.encoding, options.col_sep, options.quote)
+        except Exception as fail_error:
+            print(fail_error)
+            print("Run the same command again to resume after the last commit.")
+            d.close()
+            return 1
+        d.close()
+        if loader.skipped > 0:
+            print("  Resumed after " + str(loader.skipped) + " rows loaded by an earlier run.")
+        print("  Loaded " + str(loader.rows) + " rows in {:.3f} seconds, {:.0f} rows/sec".format(loader.seconds, loader.rate()))
+        return 0
+
+    """ Print the rows and seconds of each batch, and the cache hits and misses with --cache. """
+    def print_timings(self, timings, elapsed):
+        print("-- Statement Timing --")
+        print("  Batch        Rows   Seconds  Statement")
+        for number, statement, count, seconds, error in timings:
+            first_line = statement.strip().splitlines()[0][:60]
+            print("  {:>5} {:>11} {:>9.3f}  {}".format(number, count, seconds, first_line))
+            if error is not None:
+                print("        failed: " + str(error))
+        print("  Total {:>11} {:>9.3f}".format(sum(timing[2] for timing in timings), sum(timing[3] for timing in timings)))
+        print("  Elapsed {:>19.3f}".format(elapsed))
+        if self.cache is not None:
+            stats = self.cache.statistics()
+            print("  Cache hits: " + str(stats['hits']) + ", misses: " + str(stats['misses']))
+
+    """ Run the job and return the exit code. """
+    def run(self):
+        options = self.options
+        if (options.use_cache or options.uncache > '') and options.cache_file == '':
+            from query_cache import default_path
+            options.cache_file = default_path()
+        # Write the runtime parameters back to the console.
+        if options.out_file > '':
+            print("Starting program " + sys.argv[0])
+            print("-- Runtime Parameters --")
+            print("  Batch Size:       " + str(options.batch_size))
+            print("  Cache File:       " + (options.cache_file if options.use_cache else "no cache"))
+            print("  Column Seperator: " + options.col_sep)
+            print("  Database Name:    " + options.db_name)
+            print("  Encoding:         " + options.encoding)
+            print("  Format:           " + options.format)
+            print("  Input File:       " + options.in_file)
+            print("  Output File:      " + options.out_file)
+            print("  Parallel:         " + (str(options.parallel) if options.parallel > 0 else "no"))
+            print("  Quote:            " + options.quote)
+            print("  Row Group Size:   " + str(options.row_group_size))
+        _check(options)
+
+        # With --load, insert the rows of the load file into the table instead of running SQL.
+        if options.load_file > '':
+            code = self.load()
+            print("Ending program " + sys.argv[0] + " code " + str(code))
+            return code
+
+        # If an input file was passed from command line, read the SQL statement from the file.
+        # Otherwise, read the SQL statement from console input.
+        if options.in_file > '':
+            try:
+                with open(options.in_file, "rt", encoding=options.encoding) as inf:
+                    sql_stmt = inf.read()
+            except FileNotFoundError as fail_error:
+                print(fail_error)
+                return 1
         else:
-            print('')
+            sql_stmt = sys.stdin.read()
+
+        # Open the query cache, and remove the cached results of the tables named by --uncache.
+        if options.use_cache or options.uncache > '':
+            from query_cache import QueryCache
+            self.cache = QueryCache(options.cache_file, ttl=options.cache_ttl)
+            for table in options.uncache.split(','):
+                if table.strip() > '':
+                    self.cache.invalidate(table.strip())
+            if not options.use_cache:
+                self.cache.close()
+                self.cache = None
+        try:
+            return self._run_batches(sql_stmt)
+        finally:
+            if self.cache is not None:
+                self.cache.close()
 
-# Clean up and exit.
-if OUT:
-    OUT.close()  # If an output file was created, close it.
-d.close() # Close the cursor.
+    def _run_batches(self, sql_stmt):
+        from sql_script import split_batches
+        options = self.options
+        # Split the script into batches on GO lines.
+        batches = split_batches(sql_stmt)
+
+        # With --parallel, each batch runs on its own worker connection and writes to its own output file.
+        if options.parallel > 0:
+            started = time.perf_counter()
+            timings = self._run_parallel(batches)
+            self.print_timings(timings, time.perf_counter() - started)
+            failed = any(error is not None for number, statement, count, seconds, error in timings)
+            print("Ending program " + sys.argv[0] + " code " + ("1" if failed else "0"))
+            return 1 if failed else 0
+
+        # If an output file was passed from command line, open it for writing.
+        # Otherwise, any resultset will be output to stdout (console).
+        # The columnar writers open their output file once the column types are known.
+        if options.format != 'csv':
+            out = None
+        elif options.out_file > '':
+            try:
+                out = open(options.out_file, mode="wt", buffering=-1, encoding=options.encoding)
+            except IOError as fail_error:
+                print(fail_error)
+                print("Unable to open " + options.out_file + " for writing.")
+                return 1
+        else:
+            out = sys.stdout
+
+        # Connect the database.
+        d = self.connect()
+
+        # Run the batches in order, committing the changes made by each one.
+        # The csv resultsets are all written to the one output, and each columnar resultset to its own numbered file.
+        timings = []
+        started = time.perf_counter()
+        try:
+            for number, statement in enumerate(batches, 1):
+                start = time.perf_counter()
+                count, resultset = self.export(d, statement, out, _numbered_file(options.out_file, number, len(batches)))
+                d.commit()
+                timings.append((number, statement, count, time.perf_counter() - start, None))
+        finally:
+            # Clean up.
+            if out is None:
+                pass
+            elif options.out_file > '':
+                out.close()  # If an output file was created, close it.
+            else:
+                out.flush()
+            d.close() # Close the cursor.
 
-# Announce the end of the program.
-if OUT_FILE > '':
+        # Announce the end of the program.
+        if options.out_file > '':
+            self.print_timings(timings, time.perf_counter() - started)
+            print("Ending program " + sys.argv[0] + " code 0")
+        return 0
+
+    def _run_parallel(self, batches):
+        # Run independent batches on --parallel worker threads, each with its own connection.
+        # Return (number, statement, rows, seconds, error) for each batch in script order.
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        options = self.options
+        local = threading.local()
+        databases = []
+        lock = threading.Lock()
+
+        def run_batch(number, statement):
+            start = time.perf_counter()
+            out = None
+            out_file = _numbered_file(options.out_file, number, len(batches))
+            try:
+                d = getattr(local, 'database', None)
+                if d is None:
+                    d = local.database = self.connect()
+                    with lock:
+                        databases.append(d)
+                if options.format == 'csv':
+                    out = open(out_file, mode="wt", buffering=-1, encoding=options.encoding)
+                count, resultset = self.export(d, statement, out, out_file)
+                d.commit()
+                error = None
+            except Exception as fail_error:
+                count = 0
+                error = fail_error
+            if out is not None:
+                out.close()
+            # A failed batch, and statements that return no resultset, leave no output file behind.
+            if (error is not None or not resultset) and os.path.exists(out_file):
+                os.remove(out_file)
+            return number, statement, count, time.perf_counter() - start, error
+
+        with ThreadPoolExecutor(options.parallel) as executor:
+            timings = list(executor.map(run_batch, range(1, len(batches) + 1), batches))
+        for d in databases:
+            d.close()
+        return timings
+
+def run(options, pool=None):
+    """ Run sql.py with parsed Options and return the exit code.  With a pool, the connections are borrowed
+        from it, so they stay open for the next run.  Raise UsageError for a missing parameter. """
+    job = _Job(options, pool)
+    # With --profile-python, run the job under cProfile.
+    profiler = None
+    if options.profile_python > '':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        return job.run()
+    finally:
+        # Print the --profile phases and write the --profile-json and --profile-python files.
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(options.profile_python)
+        if job.profile.enabled:
+            job.profile.report()
+            if options.profile_json > '':
+                job.profile.write_json(options.profile_json)
+
+def _run_job(path, defaults, pools):
+    # Run one job file with its output in a .log file, and return True if it succeeded.
+    import contextlib
+    import shlex
+    import traceback
+    root = os.path.splitext(path)[0]
+    running = root + '.running'
+    os.replace(path, running)
+    # Split the parameters as a shell would, but keep backslashes, so Windows paths need no escaping.
+    with open(running, 'rt', encoding='utf-8') as job_file:
+        lexer = shlex.shlex(job_file.read(), posix=True)
+    lexer.whitespace_split = True
+    lexer.escape = ''
+    argv = list(lexer)
+    code = 1
+    with open(root + '.log', 'wt', encoding='utf-8') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            options = parse_options(argv, defaults)
+            if options.in_file == '':
+                raise UsageError("--infile parameter is a required value for a --serve job")
+            pool = pools.get(options.db_name)
+            if pool is None and options.db_name > '':
+                from database import datasource_pool
+                pool = pools[options.db_name] = datasource_pool(options.db_name, max_size=max(5, options.parallel))
+            code = run(options, pool)
+        except UsageError as fail_error:
+            print(fail_error)
+        except Exception as fail_error:
+            if _reported_error(fail_error):
+                print(fail_error)
+            else:
+                traceback.print_exc()
+    os.replace(running, root + ('.done' if code == 0 else '.failed'))
+    return code == 0
+
+def serve(defaults):
+    """ Run the job files placed in the --serve folder until a stop file appears, keeping a connection pool
+        open for each database between jobs.  Return the exit code. """
+    folder = defaults.serve
+    if not os.path.isdir(folder):
+        raise UsageError("--serve folder " + folder + " does not exist")
+    pools = {}
+    stop = os.path.join(folder, 'stop')
+    print("Serving jobs from " + folder + ", create " + stop + " or press Ctrl+C to stop.")
+    try:
+        while not os.path.exists(stop):
+            jobs = sorted(name for name in os.listdir(folder) if name.endswith('.job'))
+            for name in jobs:
+                start = time.perf_counter()
+                succeeded = _run_job(os.path.join(folder, name), defaults, pools)
+                print("  {:<40} {:>6} {:>9.3f}".format(name, 'done' if succeeded else 'failed', time.perf_counter() - start))
+            if not jobs:
+                time.sleep(defaults.poll)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pool in pools.values():
+            pool.close()
+    # Remove the stop file, so the next server does not stop at once.
+    if os.path.exists(stop):
+        os.remove(stop)
     print("Ending program " + sys.argv[0] + " code 0")
-sys.exit(0)
+    return 0
+
+def main(argv=None):
+    """ Run sql.py with a list of command line parameters, sys.argv[1:] by default, and return the exit code.
+        A missing package, a file error or a database error is printed to stderr in one line, with exit code 1. """
+    argv = sys.argv[1:] if argv is None else argv
+    try:
+        if len(argv) < 1:
+            raise UsageError('')
+        options = parse_options(argv)
+        if options.serve > '':
+            return serve(options)
+        return run(options)
+    except UsageError as fail_error:
+        if str(fail_error) > '':
+            print(fail_error)
+        print(SYNTAX)
+        return 1
+    except Exception as fail_error:
+        if not _reported_error(fail_error):
+            raise
+        print(fail_error, file=sys.stderr)
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+'''
+    Split SQL scripts into batches for sql.py.
+
+    Batches are separated by a line holding only the GO command, optionally followed by a count,
+    the way sqlcmd and SQL Server Management Studio read scripts.  "GO 3" runs the batch three times.
+    A GO inside a quoted string, quoted identifier or block comment is part of the batch.
+
+    Syntax:
+        for batch in split_batches(script):
+            d.execute(batch, True)
+'''
+
+import re
+
+_GO = re.compile(r'^\s*go(?:\s+(\d+))?\s*(?:--.*)?$', re.IGNORECASE)
+
+def _scan(text):
+    """ Yield (position, character) for the characters of text outside quoted strings, quoted identifiers and comments. """
+    i = 0
+    length = len(text)
+    while i < length:
+        c = text[i]
+        if c in ("'", '"', '['):
+            close = ']' if c == '[' else c
+            i += 1
+            while i < length:
+                if text[i] == close:
+                    # A doubled quote is an escaped quote inside the string.
+                    if i + 1 < length and text[i + 1] == close:
+                        i += 2
+                        continue
+                    break
+                i += 1
+            i += 1
+        elif text.startswith('--', i):
+            newline = text.find('\n', i)
+            i = length if newline < 0 else newline
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = length if end < 0 else end + 2
+        else:
+            yield i, c
+            i += 1
+
+def split_batches(text):
+    """ Return the batches of a script separated by GO lines, without the GO lines and empty batches. """
+    code = set(position for position, c in _scan(text))
+    batches = []
+    start = 0
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        match = _GO.match(line)
+        # A GO line inside a string or block comment is part of the batch.
+        if match and offset + len(line) - len(line.lstrip()) in code:
+            batch = text[start:offset]
+            if _has_code(batch):
+                batches.extend([batch] * int(match.group(1) or 1))
+            start = offset + len(line)
+        offset += len(line)
+    batch = text[start:]
+    if _has_code(batch):
+        batches.append(batch)
+    return batches
+
+def _has_code(text):
+    """ Return True if text holds anything besides white space and comments. """
+    for position, c in _scan(text):
+        if not c.isspace():
+            return True
+    return False
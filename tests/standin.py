@@ -0,0 +1,113 @@
+'''
+    A stand-in for pyodbc backed by SQLite, for the tests and for benchmark.py.
+
+    StandInConnection wraps a sqlite3 connection with the parts of the pyodbc interface that Database,
+    BulkLoader and JobContactLoader use.  With tsql=True, the T-SQL statements of JobContactLoader are
+    rewritten for SQLite first.  patch_pyodbc puts a pyodbc module holding only a connect function in
+    sys.modules for the length of one test, so importing the tests never replaces the real pyodbc.
+
+    Syntax:
+        def setUp(self):
+            patcher = patch_pyodbc(lambda connection_string, **kwargs: StandInConnection(self.path))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+'''
+
+import re
+import sqlite3
+import sys
+import time
+import types
+from unittest import mock
+
+# The T-SQL of JobContactLoader, with the SQLite statement it is rewritten to.
+TSQL_REWRITES = [
+    (re.compile(r'select top 0 (.*) into (\S+) from (\S+)', re.IGNORECASE | re.DOTALL), r'create temp table \2 as select \1 from \3 where 0 = 1'),
+    (re.compile(r'\btruncate table\b', re.IGNORECASE), 'delete from'),
+    (re.compile(r'\btry_convert\(datetime, ([^,)]*)(?:, \d+)?\)', re.IGNORECASE), r'\1'),
+    (re.compile(r'#(\w+)'), r'\1'),
+    (re.compile(r'\bdbo\.', re.IGNORECASE), ''),
+]
+
+def sqlite_statement(statement):
+    """ Return a T-SQL statement rewritten for SQLite: temporary tables, truncate, try_convert and the dbo schema. """
+    for pattern, replacement in TSQL_REWRITES:
+        statement = pattern.sub(replacement, statement)
+    return statement
+
+class StandInCursor:
+    """ Wrap a sqlite3 cursor with the parts of the pyodbc cursor interface used by Database. """
+    def __init__(self, connection, latency=0.0, tsql=False):
+        self.connection = connection
+        self.cursor = connection.cursor()
+        self.latency = latency
+        self.tsql = tsql
+        self.arraysize = 1
+        self.fast_executemany = False
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def cancel(self):
+        self.connection.interrupt()
+
+    def commit(self):
+        self.connection.commit()
+
+    def execute(self, statement, *params):
+        if self.latency:
+            time.sleep(self.latency)
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = params[0]
+        if self.tsql:
+            statement = sqlite_statement(statement)
+        self.cursor.execute(statement, params)
+        return self
+
+    def executemany(self, statement, seq_of_params):
+        if self.tsql:
+            statement = sqlite_statement(statement)
+        self.cursor.executemany(statement, seq_of_params)
+        return self
+
+    def fetchmany(self, size=None):
+        return self.cursor.fetchmany(self.arraysize if size is None else size)
+
+    def nextset(self):
+        # SQLite returns one resultset per statement, so discard the rest of it.
+        self.cursor.close()
+        self.cursor = self.connection.cursor()
+        return False
+
+    def rollback(self):
+        self.connection.rollback()
+
+class StandInConnection:
+    """ Wrap a sqlite3 connection with the parts of the pyodbc connection interface used by Database. """
+    def __init__(self, path, latency=0.0, tsql=False):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.latency = latency
+        self.tsql = tsql
+
+    def close(self):
+        self.connection.close()
+
+    def commit(self):
+        self.connection.commit()
+
+    def cursor(self):
+        return StandInCursor(self.connection, self.latency, self.tsql)
+
+    def getinfo(self, info_type):
+        return 'SQLite ' + sqlite3.sqlite_version
+
+    def rollback(self):
+        self.connection.rollback()
+
+def patch_pyodbc(connect):
+    """ Return a patch of sys.modules that makes pyodbc a module holding only the connect function, and Error
+        as the base class of the database errors, which sqlite3.Error is for the stand-in. """
+    return mock.patch.dict(sys.modules, pyodbc=types.SimpleNamespace(connect=connect, Error=sqlite3.Error))
@@ -0,0 +1,86 @@
+'''
+    Tests for AsyncDatabase on a SQLite database through the pyodbc stand-in of standin.py: batches,
+    timeouts and cancellation, and the worker going back to the idle workers after each of them.
+'''
+
+import asyncio
+import contextlib
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from ..async_database import AsyncDatabase
+from .standin import StandInConnection, patch_pyodbc
+
+# A query that runs for far longer than any test, until it is interrupted.
+SLOW_QUERY = 'with recursive c(x) as (select 1 union all select x + 1 from c where x < 1000000000) select count(*) from c'
+
+class AsyncDatabaseTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.path = os.path.join(folder.name, 'test.db')
+        self.latency = 0.0
+        with sqlite3.connect(self.path) as connection:
+            connection.execute('create table people (id integer, name text)')
+            connection.executemany('insert into people values (?, ?)', [(i, 'name ' + str(i)) for i in range(1, 11)])
+        connection.close()
+        patcher = patch_pyodbc(lambda connection_string: StandInConnection(self.path, self.latency))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def names(self):
+        with contextlib.closing(sqlite3.connect(self.path)) as connection:
+            return [row[0] for row in connection.execute('select name from people order by id')]
+
+    async def test_execute_and_fetch(self):
+        async with AsyncDatabase('TEST', workers=2) as db:
+            self.assertEqual(await db.execute("update people set name = 'x' where id <= ?", (2,)), 2)
+            self.assertEqual(await db.fetch('select name from people where id = ?', (1,)), [('x',)])
+            self.assertEqual(await db.fetch('select count(*) from people'), [(10,)])
+            await db.executemany('insert into people values (?, ?)', [(11, 'a'), (12, 'b')])
+        self.assertEqual(self.names()[:2] + self.names()[-2:], ['x', 'x', 'a', 'b'])
+
+    async def test_iter_batches(self):
+        async with AsyncDatabase('TEST', workers=1) as db:
+            batches = [rows async for rows in db.iter_batches('select id from people order by id', 3)]
+            self.assertEqual([[row[0] for row in rows] for rows in batches], [[1, 2, 3], [4, 5, 6], [7, 8, 9], [10]])
+            self.assertEqual([rows async for rows in db.iter_batches("update people set name = 'x' where id = 0")], [])
+            # A loop that ends early returns its worker, so the only worker can run the next call.
+            async with contextlib.aclosing(db.iter_batches('select id from people where id > ?', 2, (4,))) as batches:
+                async for rows in batches:
+                    self.assertEqual(len(rows), 2)
+                    break
+            self.assertEqual(await asyncio.wait_for(db.fetch('select count(*) from people'), 5), [(10,)])
+
+    async def test_timeout(self):
+        async with AsyncDatabase('TEST', workers=1) as db:
+            start = time.perf_counter()
+            with self.assertRaises(asyncio.TimeoutError):
+                await db.fetch(SLOW_QUERY, timeout=0.1)
+            self.assertLess(time.perf_counter() - start, 5)
+            self.assertEqual(await db.fetch('select count(*) from people'), [(10,)])
+
+    async def test_statement_finished_after_timeout_rolled_back(self):
+        # The stand-in waits before running the statement, so it runs after the cancel and must not be committed.
+        self.latency = 0.2
+        async with AsyncDatabase('TEST', workers=1) as db:
+            with self.assertRaises(asyncio.TimeoutError):
+                await db.execute("update people set name = 'x' where id = 1", timeout=0.05)
+            self.assertEqual(self.names()[0], 'name 1')
+            self.assertEqual(await db.execute("update people set name = 'y' where id = 1"), 1)
+        self.assertEqual(self.names()[0], 'y')
+
+    async def test_cancel(self):
+        async with AsyncDatabase('TEST', workers=1) as db:
+            task = asyncio.ensure_future(db.fetch(SLOW_QUERY))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertEqual(await asyncio.wait_for(db.fetch('select count(*) from people'), 5), [(10,)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+'''
+    Tests for BulkLoader, loading CSV files into a SQLite database through the pyodbc stand-in of standin.py.
+'''
+
+import gc
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import warnings
+
+from ..bulk_load import BulkLoader, _missing_table, infer_type, read_csv
+from ..database import Database
+from .standin import StandInConnection, StandInCursor, patch_pyodbc
+
+# The Python types reported for the columns of the existing table, like pyodbc does for SQL Server.
+REPORTED_TYPES = {'Code': int, 'Amount': float}
+
+class TypedCursor(StandInCursor):
+    @property
+    def description(self):
+        if self.cursor.description is None:
+            return None
+        return [(column[0], REPORTED_TYPES.get(column[0])) + column[2:] for column in self.cursor.description]
+
+class TypedConnection(StandInConnection):
+    def cursor(self):
+        return TypedCursor(self.connection, self.latency, self.tsql)
+
+class InferTypeTest(unittest.TestCase):
+    def test_types(self):
+        self.assertIs(infer_type(['1', '-20', '']), int)
+        self.assertIs(infer_type(['0', '10']), int)
+        self.assertIs(infer_type(['0.5', '1e3']), float)
+        self.assertIs(infer_type(['abc', '1']), str)
+        self.assertIs(infer_type(['', '']), str)
+
+    def test_leading_zeros(self):
+        self.assertIs(infer_type(['01234', '98765']), str)
+        self.assertIs(infer_type(['007.5', '1.5']), str)
+        self.assertIs(infer_type(['-01', '2']), str)
+
+class DeniedCursor(StandInCursor):
+    def execute(self, statement, *params):
+        if statement.startswith('select * from Staging'):
+            raise sqlite3.OperationalError('The SELECT permission was denied on the object Staging')
+        return super().execute(statement, *params)
+
+class DeniedConnection(StandInConnection):
+    def cursor(self):
+        return DeniedCursor(self.connection, self.latency, self.tsql)
+
+class MissingTableTest(unittest.TestCase):
+    def test_errors(self):
+        self.assertTrue(_missing_table(Exception('42S02', "[42S02] [Microsoft][ODBC SQL Server Driver][SQL Server]"
+                                                           "Invalid object name 'dbo.Staging'. (208) (SQLExecDirectW)")))
+        self.assertTrue(_missing_table(sqlite3.OperationalError('no such table: Staging')))
+        self.assertFalse(_missing_table(Exception('42000', "[42000] The SELECT permission was denied on the object 'Staging'")))
+        self.assertFalse(_missing_table(Exception('08S01', '[08S01] Communication link failure')))
+
+class BulkLoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'test.db')
+        self.connection_class = StandInConnection
+        patcher = patch_pyodbc(lambda connection_string, **kwargs: self.connection_class(self.path))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write_csv(self, name, lines):
+        csv_path = os.path.join(self.folder, name)
+        with open(csv_path, 'wt', encoding='utf-8', newline='') as csv_file:
+            csv_file.write('\n'.join(lines) + '\n')
+        return csv_path
+
+    def query(self, statement):
+        connection = sqlite3.connect(self.path)
+        try:
+            return connection.execute(statement).fetchall()
+        finally:
+            connection.close()
+
+    def load(self, csv_path, **kwargs):
+        with Database('test') as d:
+            loader = BulkLoader(d, 'Staging', **kwargs)
+            loader.load(csv_path)
+        return loader
+
+    def test_create_table(self):
+        csv_path = self.write_csv('new.csv', ['Id,Name,Amount,Zip', '1,Ann,12.5,01234', '2,,0.25,98765', '3,Bob,,'])
+        loader = self.load(csv_path)
+        self.assertEqual(loader.rows, 3)
+        self.assertEqual([(row[1], row[2]) for row in self.query('pragma table_info(Staging)')],
+                         [('Id', 'bigint'), ('Name', 'nvarchar(4000)'), ('Amount', 'float'), ('Zip', 'nvarchar(4000)')])
+        self.assertEqual(self.query('select Id, Name, Amount, Zip, typeof(Zip) from Staging order by Id'),
+                         [(1, 'Ann', 12.5, '01234', 'text'), (2, None, 0.25, '98765', 'text'), (3, 'Bob', None, None, 'null')])
+        self.assertFalse(os.path.exists(csv_path + '.load'))
+
+    def test_types_option(self):
+        csv_path = self.write_csv('typed.csv', ['Id,Zip', '1,01234', '2,98765'])
+        self.load(csv_path, types={'Id': 'varchar(10)'})
+        self.assertEqual([(row[1], row[2]) for row in self.query('pragma table_info(Staging)')], [('Id', 'varchar(10)'), ('Zip', 'nvarchar(4000)')])
+        self.assertEqual(self.query('select Id, Zip from Staging order by Id'), [('1', '01234'), ('2', '98765')])
+
+    def test_existing_table(self):
+        self.query('create table Staging (Code, Amount, Note)')
+        self.connection_class = TypedConnection
+        # The header names the columns in another order and case than the table.
+        csv_path = self.write_csv('existing.csv', ['note,amount,code', 'first,3,0042', 'second,2.5,7'])
+        loader = self.load(csv_path)
+        self.assertEqual(loader.rows, 2)
+        self.assertEqual(self.query('select Code, typeof(Code), Amount, typeof(Amount), Note from Staging order by Note'),
+                         [(42, 'integer', 3.0, 'real', 'first'), (7, 'integer', 2.5, 'real', 'second')])
+
+    def test_no_header(self):
+        self.query('create table Staging (Code, Amount, Note)')
+        self.connection_class = TypedConnection
+        csv_path = self.write_csv('no_header.csv', ['0042,3,first', '7,2.5,second'])
+        loader = self.load(csv_path, header=False)
+        self.assertEqual(loader.rows, 2)
+        self.assertEqual(self.query('select Code, Amount, Note from Staging order by Note'), [(42, 3.0, 'first'), (7, 2.5, 'second')])
+
+    def test_no_header_new_table(self):
+        csv_path = self.write_csv('no_header.csv', ['1,Ann', '2,Bob'])
+        self.load(csv_path, header=False)
+        self.assertEqual([row[1] for row in self.query('pragma table_info(Staging)')], ['Column1', 'Column2'])
+        self.assertEqual(self.query('select Column1, Column2 from Staging order by Column1'), [(1, 'Ann'), (2, 'Bob')])
+
+    def test_resume(self):
+        lines = ['Id,Code'] + [str(i) + ',' + str(100 + i) for i in range(1, 11)]
+        lines[7] = '7,A07'
+        csv_path = self.write_csv('resume.csv', lines)
+        state_path = csv_path + '.load'
+        # Rows 5 and 6 are inserted but not committed when row 7 fails.
+        with self.assertRaises(ValueError) as failure:
+            self.load(csv_path, batch_size=2, commit_interval=4)
+        message = str(failure.exception)
+        self.assertIn("Row 7: cannot convert 'A07' to int for column Code of Staging", message)
+        self.assertIn('--types="Code=nvarchar(4000)"', message)
+        self.assertIn(state_path, message)
+        self.assertTrue(os.path.exists(state_path))
+        self.assertEqual(self.query('select count(*) from Staging'), [(4,)])
+
+        lines[7] = '7,107'
+        self.write_csv('resume.csv', lines)
+        loader = self.load(csv_path, batch_size=2, commit_interval=4)
+        self.assertEqual(loader.skipped, 4)
+        self.assertEqual(loader.rows, 6)
+        self.assertEqual(self.query('select Id, Code from Staging order by Id'), [(i, 100 + i) for i in range(1, 11)])
+        self.assertFalse(os.path.exists(state_path))
+
+    def test_other_error_not_create(self):
+        self.connection_class = DeniedConnection
+        csv_path = self.write_csv('denied.csv', ['Id,Name', '1,Ann'])
+        with self.assertRaises(sqlite3.OperationalError):
+            self.load(csv_path)
+        self.assertEqual(self.query("select name from sqlite_master where type = 'table'"), [])
+
+    def test_read_csv_closes_file(self):
+        csv_path = self.write_csv('names.csv', ['Id,Name', '1,Ann', '2,Bob'])
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            names, batches = read_csv(csv_path, batch_size=1)
+            self.assertEqual(names, ['Id', 'Name'])
+            # A generator that is never read holds no open file.
+            del batches
+            names, batches = read_csv(csv_path, batch_size=1)
+            self.assertEqual(list(batches), [[['1', 'Ann']], [['2', 'Bob']]])
+            gc.collect()
+        self.assertEqual([warning for warning in caught if issubclass(warning.category, ResourceWarning)], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+'''
+    Tests for the incremental run checkpoint: the state file, the overlap window, and backfilling an older range.
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from ..checkpoint import Checkpoint
+from ..mail_sources import MailMessage
+
+def message(message_id, received_time):
+    return MailMessage(received_time, 'jobs@example.com', 'Application received', '', message_id)
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.path = os.path.join(self.folder, 'job_contacts.state')
+
+    def test_new_checkpoint(self):
+        checkpoint = Checkpoint(self.path)
+        self.assertIsNone(checkpoint.resume_time())
+        self.assertFalse(checkpoint.seen(message('a', datetime(2024, 3, 1, 9, 0))))
+
+    def test_save_and_resume(self):
+        checkpoint = Checkpoint(self.path)
+        for message_id, minute in (('a', 0), ('b', 30), ('c', 10)):
+            checkpoint.mark(message(message_id, datetime(2024, 3, 1, 9, minute)))
+        checkpoint.save()
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+        resumed = Checkpoint(self.path)
+        self.assertEqual(resumed.last_received_time, datetime(2024, 3, 1, 9, 30))
+        self.assertEqual(resumed.resume_time(), datetime(2024, 3, 1, 8, 30))
+        self.assertTrue(resumed.seen(message('c', datetime(2024, 3, 1, 9, 10))))
+        self.assertFalse(resumed.seen(message('d', datetime(2024, 3, 1, 9, 10))))
+
+    def test_overlap_window(self):
+        checkpoint = Checkpoint(self.path, overlap=timedelta(minutes=30))
+        checkpoint.mark(message('old', datetime(2024, 3, 1, 8, 0)))
+        checkpoint.mark(message('new', datetime(2024, 3, 1, 9, 0)))
+        checkpoint.save()
+        # Only the IDs within the overlap window before the last received time are kept.
+        self.assertEqual(set(Checkpoint(self.path).message_ids), {'new'})
+
+    def test_backfill_older_range(self):
+        checkpoint = Checkpoint(self.path)
+        checkpoint.mark(message('recent', datetime(2024, 3, 1, 9, 0)))
+        checkpoint.save()
+        # A run given an explicit older date range processes the messages of that range.
+        backfill = Checkpoint(self.path)
+        older = [message('old' + str(day), datetime(2024, 2, day, 12, 0)) for day in range(1, 4)]
+        self.assertEqual([msg for msg in older if not backfill.seen(msg)], older)
+        for msg in older:
+            backfill.mark(msg)
+        backfill.save()
+        # The backfill does not move the checkpoint back, so the next run still resumes after the recent mail.
+        resumed = Checkpoint(self.path)
+        self.assertEqual(resumed.resume_time(), datetime(2024, 3, 1, 8, 0))
+        self.assertTrue(resumed.seen(message('recent', datetime(2024, 3, 1, 9, 0))))
+
+if __name__ == '__main__':
+    unittest.main()
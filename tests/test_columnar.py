@@ -0,0 +1,152 @@
+'''
+    Round trip tests for the parquet, arrow and npy writers, fed from a sqlite3 cursor and read back
+    with pyarrow and numpy.  Each test is skipped when the package it reads with is not installed.
+    The row group buffering and type inference shared by the writers are tested without either package.
+'''
+
+import datetime
+import decimal
+import importlib.util
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from ..columnar import ColumnarWriter, get_writer
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+HAS_NUMPY = importlib.util.find_spec('numpy') is not None
+
+ROW_COUNT = 250
+ROW_GROUP_SIZE = 100
+
+def make_rows():
+    """ Return ROW_COUNT rows of id, name, amount and created, with a null in every column now and then. """
+    rows = []
+    start = datetime.datetime(2024, 1, 1, 8, 30)
+    for i in range(ROW_COUNT):
+        rows.append((i,
+                     None if i % 7 == 0 else 'name ' + str(i),
+                     None if i % 11 == 0 else decimal.Decimal(i) / 4,
+                     None if i % 13 == 0 else start + datetime.timedelta(hours=i)))
+    return rows
+
+class RecordingWriter(ColumnarWriter):
+    """ A columnar writer that keeps the types it was opened with and the row groups in memory. """
+    def open_file(self):
+        self.opened = list(self.types)
+        self.groups = []
+        self.closed = False
+
+    def write_row_group(self, columns, count):
+        self.groups.append((columns, count))
+
+    def close_file(self):
+        self.closed = True
+
+class ColumnarWriterTest(unittest.TestCase):
+    def test_row_groups(self):
+        description = [('id', int, None, None, None, None, False), ('name', str, None, 20, 20, 0, True)]
+        writer = RecordingWriter('contacts', description, row_group_size=3)
+        writer.write_batch([(1, 'a'), (2, 'b')])
+        self.assertIsNone(writer.types)
+        writer.write_batch([(3, 'c'), (4, 'd'), (5, 'e'), (6, 'f'), (7, None)])
+        self.assertEqual(writer.groups, [([(1, 2, 3), ('a', 'b', 'c')], 3), ([(4, 5, 6), ('d', 'e', 'f')], 3)])
+        writer.close()
+        self.assertEqual(writer.groups[2], ([(7,), (None,)], 1))
+        self.assertEqual(writer.count, 7)
+        self.assertEqual(writer.opened, [int, str])
+        self.assertTrue(writer.closed)
+
+    def test_types_from_first_value(self):
+        # A driver without column types, like sqlite3, has the types inferred from the first non-null value.
+        description = [('id', None), ('amount', None), ('created', None), ('note', None)]
+        writer = RecordingWriter('contacts', description, row_group_size=10)
+        writer.write_batch([(1, None, None, None), (2, decimal.Decimal('1.5'), datetime.date(2024, 1, 1), None)])
+        writer.close()
+        self.assertEqual(writer.opened, [int, decimal.Decimal, datetime.date, str])
+
+    def test_empty(self):
+        writer = RecordingWriter('contacts', [('id', int), ('name', str)], row_group_size=10)
+        writer.close()
+        self.assertEqual(writer.groups, [([(), ()], 0)])
+        self.assertEqual(writer.count, 0)
+        self.assertTrue(writer.closed)
+
+class ColumnarRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        sqlite3.register_adapter(decimal.Decimal, str)
+        sqlite3.register_converter('decimal', lambda value: decimal.Decimal(value.decode()))
+        sqlite3.register_converter('timestamp', lambda value: datetime.datetime.fromisoformat(value.decode()))
+        self.folder = tempfile.TemporaryDirectory()
+        self.connection = sqlite3.connect(':memory:', detect_types=sqlite3.PARSE_DECLTYPES)
+        self.connection.execute('create table contacts (id integer, name text, amount decimal, created timestamp)')
+        self.rows = make_rows()
+        self.connection.executemany('insert into contacts values (?, ?, ?, ?)', self.rows)
+
+    def tearDown(self):
+        self.connection.close()
+        self.folder.cleanup()
+
+    def write(self, name, batch_size=64):
+        """ Write the contacts table through the named writer, fetching batch_size rows at a time. """
+        path = os.path.join(self.folder.name, 'contacts.' + name)
+        cursor = self.connection.execute('select id, name, amount, created from contacts order by id')
+        writer = get_writer(name, path, cursor.description, ROW_GROUP_SIZE)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            writer.write_batch(rows)
+        writer.close()
+        self.assertEqual(writer.count, ROW_COUNT)
+        return path
+
+    def check_columns(self, columns):
+        """ Compare columns read back as python lists with the rows that were inserted. """
+        self.assertEqual(columns['id'], [row[0] for row in self.rows])
+        self.assertEqual(columns['name'], [row[1] for row in self.rows])
+        self.assertEqual(columns['amount'], [None if row[2] is None else float(row[2]) for row in self.rows])
+        self.assertEqual(columns['created'], [row[3] for row in self.rows])
+
+    @unittest.skipUnless(HAS_PYARROW, 'pyarrow is not installed')
+    def test_parquet(self):
+        import pyarrow.parquet
+        path = self.write('parquet')
+        self.assertEqual(pyarrow.parquet.ParquetFile(path).num_row_groups, 3)
+        self.check_columns(pyarrow.parquet.read_table(path).to_pydict())
+
+    @unittest.skipUnless(HAS_PYARROW, 'pyarrow is not installed')
+    def test_arrow(self):
+        import pyarrow.ipc
+        path = self.write('arrow')
+        with pyarrow.ipc.open_file(path) as reader:
+            self.assertEqual(reader.num_record_batches, 3)
+            self.check_columns(reader.read_all().to_pydict())
+
+    @unittest.skipUnless(HAS_NUMPY, 'numpy is not installed')
+    def test_npy(self):
+        import numpy
+        path = self.write('npy')
+        array = numpy.load(path)
+        self.assertEqual(array.shape, (ROW_COUNT,))
+        self.assertEqual(array['id'].tolist(), [row[0] for row in self.rows])
+        self.assertEqual(array['name'].tolist(), [row[1] or '' for row in self.rows])
+        amounts = [None if numpy.isnan(x) else x for x in array['amount'].tolist()]
+        self.assertEqual(amounts, [None if row[2] is None else float(row[2]) for row in self.rows])
+        created = [None if numpy.isnat(x) else x.astype(datetime.datetime) for x in array['created']]
+        self.assertEqual(created, [row[3] for row in self.rows])
+
+    def test_empty_resultset(self):
+        self.connection.execute('delete from contacts')
+        for name, package in (('parquet', HAS_PYARROW), ('arrow', HAS_PYARROW), ('npy', HAS_NUMPY)):
+            if package:
+                path = os.path.join(self.folder.name, 'empty.' + name)
+                cursor = self.connection.execute('select id, name, amount, created from contacts')
+                writer = get_writer(name, path, cursor.description, ROW_GROUP_SIZE)
+                writer.close()
+                self.assertEqual(writer.count, 0)
+                self.assertTrue(os.path.getsize(path) > 0)
+
+if __name__ == '__main__':
+    unittest.main()
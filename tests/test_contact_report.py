@@ -0,0 +1,51 @@
+'''
+    Tests for the keyset pagination of ContactReport, on a SQLite database through the pyodbc stand-in of standin.py.
+'''
+
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from ..contact_report import ContactReport
+from .standin import StandInConnection
+
+# Contacts with ContactTime values shared by several rows, so pages end in the middle of a tie.
+CONTACTS = [('2024-03-0' + str(day) + ' 09:00', 'hash' + str(i), 'Employer ' + str(i))
+            for i, day in enumerate([1, 2, 2, 2, 3, 4, 4, 5, 5, 5, 5])]
+
+class ContactReportTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        path = os.path.join(folder.name, 'test.db')
+        with sqlite3.connect(path) as connection:
+            connection.execute('create table JobContacts (ContactTime text, ContentHash text, Employer text, Position text, '
+                               'ApplicationDate text, EmailAddressOfSender text, SubjectOfEmail text, BodyOfEmail text)')
+            connection.executemany('insert into JobContacts (ContactTime, ContentHash, Employer) values (?, ?, ?)', CONTACTS)
+        connection.close()
+        self.connection = StandInConnection(path, tsql=True)
+        self.addCleanup(self.connection.close)
+        self.report = ContactReport(self.connection, limit_style='limit')
+        self.expected = [contact[2] for contact in sorted(CONTACTS, key=lambda contact: (contact[0], contact[1]), reverse=True)]
+
+    def test_ties_across_pages(self):
+        for page_size in (1, 2, 3, 4, 11, 20):
+            pages = list(self.report.pages('2024-03-01', '2024-03-06', page_size))
+            employers = [row[1] for page in pages for row in page]
+            self.assertEqual(employers, self.expected, page_size)
+            self.assertEqual([len(page) for page in pages[:-1]], [page_size] * (len(pages) - 1))
+
+    def test_range(self):
+        employers = [row[1] for row in self.report.rows('2024-03-02', '2024-03-04 23:59', page_size=2)]
+        self.assertEqual(employers, [name for name in self.expected if name not in ('Employer 0', 'Employer 7', 'Employer 8',
+                                                                                    'Employer 9', 'Employer 10')])
+
+    def test_write_csv(self):
+        out = io.StringIO()
+        self.assertEqual(self.report.write_csv(out, '2024-03-01', '2024-03-06', page_size=3), len(CONTACTS))
+        self.assertEqual(out.getvalue().splitlines()[0], ','.join(self.report.columns))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+'''
+    Tests for Database, on a SQLite database through the pyodbc stand-in of standin.py.
+'''
+
+import array
+import os
+import tempfile
+import unittest
+
+from ..database import Database
+from ..instrumentation import Profile
+from .standin import StandInConnection, StandInCursor, patch_pyodbc
+
+class CountingCursor(StandInCursor):
+    """ A stand-in cursor that records when it is closed and committed on. """
+    def __init__(self, owner):
+        super().__init__(owner.connection, owner.latency, owner.tsql)
+        self.owner = owner
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        self.cursor.close()
+
+    def commit(self):
+        self.owner.commits += 1
+        super().commit()
+
+class CountingConnection(StandInConnection):
+    """ A stand-in connection that keeps the cursors it opened. """
+    def __init__(self, path):
+        super().__init__(path)
+        self.cursors = []
+        self.commits = 0
+
+    def cursor(self):
+        cursor = CountingCursor(self)
+        self.cursors.append(cursor)
+        return cursor
+
+class DatabaseTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.path = os.path.join(folder.name, 'test.db')
+        self.connections = []
+        patcher = patch_pyodbc(self.connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with Database('TEST') as d:
+            d.execute('create table people (id integer, name text, amount real)', True)
+            d.executemany('insert into people values (?, ?, ?)', [(i, 'name ' + str(i), i / 4) for i in range(1, 11)], True)
+
+    def connect(self, connection_string):
+        self.assertEqual(connection_string, 'DSN=TEST')
+        connection = CountingConnection(self.path)
+        self.connections.append(connection)
+        return connection
+
+    def database(self, **kwargs):
+        d = Database('TEST', **kwargs)
+        self.addCleanup(d.close)
+        return d
+
+class StatementCursorTest(DatabaseTest):
+    def test_cursor_reused(self):
+        d = self.database()
+        first = d.execute('select name from people where id = ?', (1,))
+        self.assertEqual(first.fetchall(), [('name 1',)])
+        self.assertIs(d.execute('select name from people where id = ?', (2,)), first)
+        self.assertIsNot(d.execute('select id from people where name = ?', ('name 3',)), first)
+        # Statements without parameters run on the main cursor.
+        self.assertIs(d.execute('select count(*) from people'), d.cursor)
+        self.assertEqual(len(d.statements), 2)
+
+    def test_least_recently_used_closed(self):
+        d = self.database(statement_cache_size=2)
+        a = d.execute('select name from people where id = ?', (1,))
+        b = d.execute('select id from people where name = ?', ('name 1',))
+        d.execute('select name from people where id = ?', (2,))
+        c = d.execute('select amount from people where id = ?', (3,))
+        self.assertTrue(b.closed)
+        self.assertFalse(a.closed or c.closed)
+        self.assertEqual(list(d.statements.values()), [a, c])
+        # An evicted statement gets a new cursor when it runs again.
+        self.assertIsNot(d.execute('select id from people where name = ?', ('name 1',)), b)
+        self.assertTrue(a.closed)
+        d.close()
+        self.assertTrue(c.closed and d.cursor.closed)
+
+    def test_executemany_cursor(self):
+        d = self.database()
+        cursor = d.executemany('insert into people values (?, ?, ?)', [(11, 'x', 0.0)])
+        self.assertTrue(cursor.fast_executemany)
+        self.assertIs(d.executemany('insert into people values (?, ?, ?)', [(12, 'y', 0.0)]), cursor)
+
+class ExecuteCommitTest(DatabaseTest):
+    def test_commit_without_rows(self):
+        d = self.database()
+        connection = self.connections[-1]
+        d.execute("update people set name = 'changed' where id = 1", True)
+        self.assertEqual(connection.commits, 1)
+        self.assertEqual(d.execute('select name from people where id = 1', True).fetchall(), [('changed',)])
+        self.assertEqual(connection.commits, 1)
+        d.execute("update people set name = 'again' where id = 2")
+        self.assertEqual(connection.commits, 1)
+        d.rollback()
+        self.assertEqual(d.execute('select name from people where id = 2').fetchall(), [('name 2',)])
+
+    def test_commit_keyword(self):
+        d = self.database()
+        d.execute('delete from people where id = ?', (1,), commit=True)
+        self.assertEqual(self.connections[-1].commits, 1)
+        with Database('TEST') as other:
+            self.assertEqual(other.execute('select count(*) from people').fetchall(), [(9,)])
+
+class AccessorTest(DatabaseTest):
+    def test_iter_columns(self):
+        d = self.database()
+        blocks = list(d.iter_columns('select id, name, amount from people order by id', batch_size=4))
+        self.assertEqual([len(block['id']) for block in blocks], [4, 4, 2])
+        # The stand-in reports no column types, so the columns are typed by their first value.
+        self.assertEqual(blocks[0]['id'], array.array('q', [1, 2, 3, 4]))
+        self.assertEqual(blocks[0]['amount'], array.array('d', [0.25, 0.5, 0.75, 1.0]))
+        self.assertEqual(blocks[2]['name'], ['name 9', 'name 10'])
+        self.assertEqual(list(d.iter_columns("update people set name = 'x' where id = 1")), [])
+
+    def test_iter_columns_fallback(self):
+        d = self.database()
+        d.execute("insert into people values (11, null, null), (12.5, 'x', 1)", True)
+        blocks = list(d.iter_columns('select id, amount from people where id > 10 order by id'))
+        self.assertEqual(blocks, [{'id': [11, 12.5], 'amount': [None, 1.0]}])
+        self.assertEqual(list(d.iter_columns('select amount from people where id = 12.5')), [{'amount': array.array('d', [1.0])}])
+
+    def test_iter_columns_overflow(self):
+        class BigCursor(CountingCursor):
+            def fetchmany(self, size=None):
+                return [(int(row[0]),) for row in super().fetchmany(size)]
+        d = self.database()
+        d.cursor = BigCursor(self.connections[-1])
+        blocks = list(d.iter_columns("select '1' union all select '" + str(2 ** 64) + "'"))
+        self.assertEqual(blocks, [{"'1'": [1, 2 ** 64]}])
+
+    def test_iter_dicts(self):
+        d = self.database()
+        rows = list(d.iter_dicts('select id, name from people where id <= ? order by id', batch_size=2, params=(3,)))
+        self.assertEqual(rows, [{'id': 1, 'name': 'name 1'}, {'id': 2, 'name': 'name 2'}, {'id': 3, 'name': 'name 3'}])
+        self.assertEqual(list(d.iter_dicts("update people set name = 'x' where id = 1")), [])
+
+    def test_iter_tuples(self):
+        d = self.database()
+        rows = list(d.iter_tuples('select id, amount from people where id > 8 order by id', batch_size=1))
+        self.assertEqual(rows, [(9, 2.25), (10, 2.5)])
+        self.assertTrue(all(type(row) is tuple for row in rows))
+
+    def test_result_set(self):
+        d = self.database()
+        connection = self.connections[-1]
+        self.assertEqual(d.result_set('select name from people where id in (1, 2) order by id'), [('name 1',), ('name 2',)])
+        self.assertEqual(connection.commits, 0)
+        self.assertIsNone(d.result_set('delete from people where id = 1'))
+        self.assertEqual(connection.commits, 1)
+        self.assertEqual(d.result_set('select count(*) from people'), [(9,)])
+
+class InstrumentationTest(DatabaseTest):
+    def test_hooks(self):
+        d = self.database()
+        calls = []
+        d.add_hook(lambda statement, params: calls.append(('before', statement, params)),
+                   lambda statement, params, cursor, seconds: calls.append(('after', statement, params, cursor.description is None)))
+        d.add_hook(after=lambda statement, params, cursor, seconds: calls.append(('seconds', seconds >= 0)))
+        d.execute('select id from people where id = ?', (1,))
+        d.executemany('insert into people values (?, ?, ?)', [(11, 'x', 0.0)])
+        self.assertEqual(calls, [('before', 'select id from people where id = ?', (1,)),
+                                 ('after', 'select id from people where id = ?', (1,), False), ('seconds', True),
+                                 ('before', 'insert into people values (?, ?, ?)', [(11, 'x', 0.0)]),
+                                 ('after', 'insert into people values (?, ?, ?)', [(11, 'x', 0.0)], True), ('seconds', True)])
+        # The hooks are kept when the database is reopened.
+        d.set('TEST')
+        d.execute('select 1')
+        self.assertEqual(calls[-1], ('seconds', True))
+
+    def test_profile(self):
+        profile = Profile()
+        d = self.database(profile=profile)
+        self.assertEqual(profile.phases['connect'][1], 1)
+        self.assertEqual(len(list(d.iter_rows('select id, name from people where id <= 3', batch_size=2))), 3)
+        self.assertEqual(d.query('select name from people where id = ?', (4,)), [('name 4',)])
+        self.assertEqual(profile.phases['execute'][1], 2)
+        # Two batches of the iter_rows query, the empty fetch that ends it, and the fetchall of the query.
+        self.assertEqual(profile.phases['fetch'][1:], [4, 4, 3 * 8 + 18 + 6])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+'''
+    Tests for the default extraction templates.
+'''
+
+import datetime
+import unittest
+
+from ..extraction import Extractor
+from ..mail_sources import MailMessage
+
+RECEIVED = datetime.datetime(2024, 3, 4, 9, 30)
+
+def message(sender, subject, body):
+    return MailMessage(RECEIVED, sender, subject, body, '<1@example.com>')
+
+class ExtractorTest(unittest.TestCase):
+    def setUp(self):
+        self.extractor = Extractor()
+
+    def position(self, sender, subject, body):
+        return self.extractor.extract(message(sender, subject, body))['position']
+
+    def test_position_of_after_article(self):
+        body = 'We have received your application for the position of Data Analyst.  We will be in touch.\n'
+        self.assertEqual(self.position('jobs@acme.example.com', 'Application received', body), 'Data Analyst')
+
+    def test_role_of_after_article(self):
+        body = 'Thank you for applying for a role of Senior Engineer, Platform at Acme.\n'
+        self.assertEqual(self.position('jobs@acme.example.com', 'Thanks', body), 'Senior Engineer')
+
+    def test_position_of_in_subject_and_body(self):
+        subject = 'Your application for the position of Data Analyst'
+        body = 'Thank you for your application for the position of Data Analyst at Acme.\n'
+        self.assertEqual(self.position('jobs@acme.example.com', subject, body), 'Data Analyst')
+
+    def test_position_of_from_workday(self):
+        body = 'Thank you for your application for the position of Data Analyst at Acme.\n'
+        self.assertEqual(self.position('acme@myworkday.com', 'Application Received: Acme - Data Analyst', body), 'Data Analyst')
+
+    def test_position_before_position_word(self):
+        body = 'Thank you for your application for the Data Analyst position.\n'
+        self.assertEqual(self.position('jobs@acme.example.com', 'Application received', body), 'Data Analyst')
+
+    def test_employer_and_application_date(self):
+        fields = self.extractor.extract(message('jobs@acme.example.com', 'Thank you for applying to Acme Corp!',
+                                                'You submitted your application on March 1, 2024.\n'))
+        self.assertEqual(fields['employer'], 'Acme Corp')
+        self.assertEqual(fields['application_date'], datetime.datetime(2024, 3, 1))
+
+    def test_received_date_when_no_application_date(self):
+        fields = self.extractor.extract(message('jobs@acme.example.com', 'Hello', 'Hello\n'))
+        self.assertEqual(fields, {'employer': None, 'position': None, 'application_date': datetime.datetime(2024, 3, 4)})
+
+if __name__ == '__main__':
+    unittest.main()
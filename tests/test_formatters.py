@@ -0,0 +1,76 @@
+'''
+    Tests for the batch row formatters and the formatter lookup used by sql.py.
+'''
+
+import csv
+import datetime
+import decimal
+import io
+import unittest
+from unittest import mock
+
+from .. import formatters
+from ..formatters import CsvFormatter, DelimitedFormatter, get_formatter, register_formatter
+
+ROWS = [(1, '  Ann  ', decimal.Decimal('12.50'), None),
+        (2, 'say "hi"', decimal.Decimal('0.10'), datetime.datetime(2024, 3, 4, 9, 30)),
+        (3, 'a,b', None, 'line\nbreak')]
+
+class DelimitedFormatterTest(unittest.TestCase):
+    def test_quoted(self):
+        self.assertEqual(DelimitedFormatter().format_batch(ROWS),
+                         '"1","Ann","12.50","None"\n'
+                         '"2","say ""hi""","0.10","2024-03-04 09:30:00"\n'
+                         '"3","a,b","None","line\nbreak"\n')
+
+    def test_separator_and_quote(self):
+        self.assertEqual(DelimitedFormatter('|', "'").format_batch([(1, "it's"), (2, ' x ')]), "'1'|'it''s'\n'2'|'x'\n")
+
+    def test_unquoted(self):
+        self.assertEqual(DelimitedFormatter('\t', '').format_batch([(1, ' Ann '), (2, 'say "hi"')]), '1\tAnn\n2\tsay "hi"\n')
+
+    def test_empty_batch(self):
+        self.assertEqual(DelimitedFormatter().format_batch([]), '')
+
+class CsvFormatterTest(unittest.TestCase):
+    def test_quoted(self):
+        formatter = CsvFormatter()
+        text = formatter.format_batch(ROWS)
+        self.assertEqual(list(csv.reader(io.StringIO(text))),
+                         [['1', 'Ann', '12.50', 'None'], ['2', 'say "hi"', '0.10', '2024-03-04 09:30:00'], ['3', 'a,b', 'None', 'line\nbreak']])
+        # The same buffer is reused, so each batch holds only its own rows.
+        self.assertEqual(formatter.format_batch([(4, 'Bo')]), '"4","Bo"\n')
+        self.assertEqual(formatter.format_batch([]), '')
+
+    def test_separator_and_quote(self):
+        self.assertEqual(CsvFormatter(';', "'").format_batch([(1, "it's"), (2, 'a;b')]), "'1';'it''s'\n'2';'a;b'\n")
+
+    def test_single_characters(self):
+        with self.assertRaises(ValueError):
+            CsvFormatter('||')
+        with self.assertRaises(ValueError):
+            CsvFormatter(',', '')
+
+class GetFormatterTest(unittest.TestCase):
+    def test_lookup(self):
+        formatter = get_formatter('|', "'")
+        self.assertIsInstance(formatter, DelimitedFormatter)
+        self.assertEqual((formatter.colsep, formatter.quote), ('|', "'"))
+        self.assertIsInstance(get_formatter(name='csv'), CsvFormatter)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError) as context:
+            get_formatter(name='xml')
+        self.assertIn("'xml'", str(context.exception))
+
+    def test_register(self):
+        class UpperFormatter(DelimitedFormatter):
+            def format_batch(self, rows):
+                return super().format_batch(rows).upper()
+        with mock.patch.dict(formatters.FORMATTERS):
+            register_formatter('upper', UpperFormatter)
+            self.assertEqual(get_formatter(name='upper').format_batch([('a', 'b')]), '"A","B"\n')
+        self.assertNotIn('upper', formatters.FORMATTERS)
+
+if __name__ == '__main__':
+    unittest.main()
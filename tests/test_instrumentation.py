@@ -0,0 +1,73 @@
+'''
+    Tests for Profile: the phase timers, iterate, the report and the JSON trace.
+'''
+
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from ..instrumentation import Profile, row_bytes
+
+class ProfileTest(unittest.TestCase):
+    def test_phase(self):
+        profile = Profile()
+        with profile.phase('write') as timer:
+            timer.rows = 2
+            timer.bytes = 30
+        with profile.phase('write'):
+            pass
+        seconds, calls, rows, size = profile.phases['write']
+        self.assertEqual((calls, rows, size), (2, 2, 30))
+        self.assertGreaterEqual(seconds, 0.0)
+
+    def test_iterate(self):
+        profile = Profile()
+        self.assertEqual(list(profile.iterate('read', ['a', 'b', 'c'])), ['a', 'b', 'c'])
+        self.assertEqual(profile.phases['read'][1:3], [3, 3])
+        self.assertEqual(list(profile.iterate('empty', [])), [])
+        self.assertNotIn('empty', profile.phases)
+
+    def test_disabled(self):
+        profile = Profile(enabled=False)
+        items = ['a']
+        self.assertIs(profile.iterate('read', items), items)
+        with profile.phase('write') as timer:
+            self.assertIsNone(timer)
+        self.assertEqual(profile.phases, {})
+
+    def test_report(self):
+        profile = Profile()
+        profile.add('fetch', 0.5, 10, 80)
+        profile.add('fetch', 0.25, 5, 40)
+        profile.add('write', 0.125)
+        out = io.StringIO()
+        profile.report(out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], '-- Profile --')
+        self.assertEqual(lines[1].split(), ['Phase', 'Seconds', '%', 'Calls', 'Rows', 'Bytes'])
+        fetch = lines[2].split()
+        self.assertEqual([fetch[0], fetch[1], fetch[3], fetch[4], fetch[5]], ['fetch', '0.750', '2', '15', '120'])
+        self.assertEqual(lines[3].split()[:2], ['write', '0.125'])
+        self.assertEqual(lines[4].split()[0], 'Elapsed')
+
+    def test_write_json(self):
+        profile = Profile(trace=True)
+        profile.add('execute', 0.5, detail='select 1')
+        with profile.phase('write') as timer:
+            timer.rows = 1
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'trace.json')
+            profile.write_json(path)
+            with open(path, 'rt', encoding='utf-8') as trace_file:
+                data = json.load(trace_file)
+        self.assertEqual(data['phases']['execute'], {'seconds': 0.5, 'calls': 1, 'rows': 0, 'bytes': 0})
+        self.assertEqual([(event['phase'], event['rows'], event['detail']) for event in data['events']],
+                         [('execute', 0, 'select 1'), ('write', 1, None)])
+
+    def test_row_bytes(self):
+        self.assertEqual(row_bytes([('abc', b'\x00\x01', 1, None), (2.5, bytearray(b'x'), '', True)]), 3 + 2 + 8 + 8 + 1 + 8)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+'''
+    Tests for the JobContacts migration: the ContentHash backfill, the duplicate rows, and the extraction of
+    the existing rows, with a fake connection that records the statements in place of SQL Server.
+'''
+
+import unittest
+from datetime import datetime
+
+from ..job_contact_loader import content_hash, migrate
+
+ROWS = [('03/01/2024 09:00', 'Jobs@Acme.com', 'Thank you for applying to Acme', 'We received your application for the Analyst position.'),
+        ('03/01/2024 09:00', 'jobs@acme.com', 'Thank you for  applying to Acme', 'We received your application for the Analyst position.'),
+        ('03/02/2024 10:30', 'talent@globex.com', 'Your application to Globex', 'Hello')]
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+        self.rowcount = -1
+        self.fast_executemany = False
+
+    def execute(self, statement, *params):
+        self.connection.statements.append(statement)
+        self.rowcount = -1
+        if statement.startswith('select DateOfContact') and 'ContentHash is null' in statement:
+            self.rows = list(self.connection.unhashed)
+        elif statement.startswith('select DateOfContact') and 'ExtractedTime is null' in statement:
+            self.rows = list(self.connection.unextracted)
+        elif 'select count(*) from d' in statement:
+            self.rows = [(self.connection.duplicates,)]
+        elif 'delete from d' in statement:
+            self.rowcount = self.connection.duplicates
+        elif statement.startswith('update j set Employer'):
+            self.rowcount = len(self.connection.unextracted)
+        return self
+
+    def executemany(self, statement, rows):
+        self.connection.staged.append((statement, list(rows)))
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def fetchone(self):
+        return self.rows.pop(0)
+
+class FakeConnection:
+    def __init__(self, unhashed=(), unextracted=(), duplicates=0):
+        self.unhashed = unhashed
+        self.unextracted = unextracted
+        self.duplicates = duplicates
+        self.statements = []
+        self.staged = []
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def ran(self, text):
+        return [statement for statement in self.statements if text in statement]
+
+class MigrateTest(unittest.TestCase):
+    def test_hash_backfill(self):
+        connection = FakeConnection(unhashed=ROWS)
+        counts = migrate(connection, batch_size=2)
+        self.assertEqual(counts['hashed'], 3)
+        staged = [row for statement, rows in connection.staged if '#JobContactsHash' in statement for row in rows]
+        self.assertEqual(staged, [row + (content_hash(*row),) for row in ROWS])
+        # The first two rows only differ by sender case and whitespace.
+        self.assertEqual(staged[0][4], staged[1][4])
+        self.assertNotEqual(staged[0][4], staged[2][4])
+        self.assertEqual(len(connection.ran('update j set ContentHash')), 1)
+
+    def test_no_duplicates(self):
+        connection = FakeConnection()
+        counts = migrate(connection)
+        self.assertEqual((counts['duplicates'], counts['deleted'], counts['backup']), (0, 0, None))
+        self.assertEqual(connection.ran('delete from d'), [])
+        self.assertEqual(len(connection.ran('create unique index UX_JobContacts_ContentHash')), 1)
+
+    def test_duplicates_kept_by_default(self):
+        connection = FakeConnection(duplicates=2)
+        counts = migrate(connection)
+        self.assertEqual((counts['duplicates'], counts['deleted'], counts['backup']), (2, 0, None))
+        self.assertEqual(connection.ran('delete from d'), [])
+        self.assertEqual(connection.ran(' into dbo.JobContactsDuplicates'), [])
+        self.assertEqual(connection.ran('create unique index'), [])
+
+    def test_delete_duplicates(self):
+        connection = FakeConnection(duplicates=2)
+        counts = migrate(connection, delete_duplicates=True)
+        self.assertEqual((counts['duplicates'], counts['deleted']), (2, 2))
+        self.assertTrue(counts['backup'].startswith('dbo.JobContactsDuplicates' + datetime.now().strftime('%Y')))
+        copy = connection.ran('select * into ' + counts['backup'])
+        delete = connection.ran('delete from d where DuplicateNumber > 1')
+        self.assertEqual((len(copy), len(delete)), (1, 1))
+        # The rows are copied before they are deleted, with the same numbering.
+        self.assertLess(connection.statements.index(copy[0]), connection.statements.index(delete[0]))
+        self.assertEqual(copy[0].partition(') ')[0], delete[0].partition(') ')[0])
+        self.assertEqual(len(connection.ran('create unique index UX_JobContacts_ContentHash')), 1)
+
+    def test_extraction(self):
+        unextracted = [row + (content_hash(*row),) for row in ROWS]
+        connection = FakeConnection(unextracted=unextracted)
+        counts = migrate(connection)
+        self.assertEqual(counts['extracted'], 3)
+        staged = [row for statement, rows in connection.staged if '#JobContactsExtract' in statement for row in rows]
+        # The two rows sharing a hash are extracted once, and the update fills in both.
+        self.assertEqual([row[0] for row in staged], [unextracted[0][4], unextracted[2][4]])
+        self.assertEqual(staged[0][1:3], ('Acme', 'Analyst'))
+        self.assertEqual(staged[0][4], datetime(2024, 3, 1, 9, 0))
+        # Extracted rows are marked, so a rerun leaves them alone even when nothing was found.
+        update = connection.ran('update j set Employer')[0]
+        self.assertIn('ExtractedTime = getdate()', update)
+        self.assertIn('ExtractedTime is null', connection.ran('select DateOfContact')[-1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+'''
+    Tests for job_contacts.py: the usage errors of main, importing it without pyodbc, and the console viewer.
+'''
+
+import contextlib
+import importlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+# job_contacts.py is a script, and imports the modules next to it by their plain names.
+PACKAGE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PACKAGE not in sys.path:
+    sys.path.insert(0, PACKAGE)
+
+from .. import job_contacts
+from ..contact_report import ContactReport
+from .standin import StandInConnection
+
+class MainTest(unittest.TestCase):
+    def main(self, argv):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            code = job_contacts.main(argv)
+        return code, out.getvalue()
+
+    def test_usage_errors(self):
+        for argv, message in ((['--bogus'], 'option --bogus not recognized'),
+                              (['--batch-size=many'], '--batch-size must be a whole number of at least 1'),
+                              (['--page-size=0'], '--page-size must be a whole number of at least 1'),
+                              (['--workers=-1'], '--workers must be a whole number of at least 0'),
+                              (['--report=xml'], '--report must be csv or json'),
+                              (['--profile-python'], 'option --profile-python requires argument')):
+            code, out = self.main(argv)
+            self.assertEqual(code, 2, argv)
+            self.assertEqual(out.splitlines()[0], message)
+            self.assertIn('Syntax: py job_contacts.py', out)
+
+    def test_import_without_pyodbc(self):
+        with mock.patch.dict(sys.modules, pyodbc=None):
+            del sys.modules[job_contacts.__name__]
+            module = importlib.import_module(job_contacts.__name__)
+            with self.assertRaises(ImportError):
+                module._connect()
+
+class ViewerTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        path = os.path.join(folder.name, 'test.db')
+        with sqlite3.connect(path) as connection:
+            connection.execute('create table JobContacts (ContactTime text, ContentHash text, Employer text, Position text, '
+                               'ApplicationDate text, EmailAddressOfSender text, SubjectOfEmail text, BodyOfEmail text)')
+            connection.executemany('insert into JobContacts (ContactTime, ContentHash, EmailAddressOfSender, SubjectOfEmail, '
+                                   'BodyOfEmail) values (?, ?, ?, ?, ?)',
+                                   [('2024-03-01 09:00', 'a', 'jobs@example.com', 'Thank you', 'Body a'),
+                                    ('2024-03-02 09:00', 'b', None, None, None),
+                                    ('2024-03-03 09:00', 'c', 'hr@example.com', 'Received', None)])
+        connection.close()
+        self.connection = StandInConnection(path, tsql=True)
+        self.addCleanup(self.connection.close)
+        # SQLite has no "select top", so the report is read with "limit".
+        report = lambda connection, include_body: ContactReport(connection, include_body, limit_style='limit')
+        patcher = mock.patch.object(job_contacts, 'ContactReport', report)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def view(self, page_size, answers):
+        with mock.patch('builtins.input', side_effect=answers) as prompt, contextlib.redirect_stdout(io.StringIO()) as out:
+            job_contacts._print_job_contacts(self.connection, '2024-03-01', '2024-03-04', page_size)
+        return prompt.call_count, out.getvalue()
+
+    def test_null_columns_and_short_page(self):
+        calls, out = self.view(2, [''])
+        # The last page is short, so the viewer stops without another prompt.
+        self.assertEqual(calls, 1)
+        self.assertIn('2024-03-03 09:00 - hr@example.com\n', out)
+        self.assertIn('2024-03-02 09:00 - \n', out)
+        self.assertIn('Body a\n', out)
+
+    def test_quit(self):
+        calls, out = self.view(1, ['q'])
+        self.assertEqual(calls, 1)
+        self.assertNotIn('jobs@example.com', out)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+'''
+    Tests for the classification pipeline fed with raw messages from a mailbox file.
+'''
+
+import datetime
+import email.message
+import email.utils
+import mailbox
+import os
+import tempfile
+import unittest
+
+from ..classifier import Classifier
+from ..mail_sources import MailMessage, RawMessage, open_source, read_message
+from ..pipeline import classify_messages, process_chunk
+
+SUBJECTS = ['Thank you for applying to %s', 'Weekly newsletter from %s']
+
+class PipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, 'inbox.mbox')
+        box = mailbox.mbox(self.path)
+        for i in range(30):
+            msg = email.message.EmailMessage()
+            msg['From'] = 'careers@company%d.example.com' % i
+            msg['Subject'] = SUBJECTS[i % 2] % ('Company %d' % i)
+            msg['Date'] = email.utils.formatdate(1704067200 + i * 60)
+            msg['Message-ID'] = '<%d@example.com>' % i
+            msg.set_content('Thank you for applying to Company %d for the position of Analyst.\n' % i)
+            box.add(msg)
+        box.close()
+        self.source = open_source(self.path)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_raw_messages_match_messages(self):
+        raw = list(self.source.raw_messages())
+        self.assertEqual(len(raw), 30)
+        self.assertTrue(all(isinstance(item, RawMessage) for item in raw))
+        self.assertEqual([read_message(item) for item in raw], list(self.source.messages()))
+
+    def test_raw_messages_date_range(self):
+        messages = list(self.source.messages())
+        start = messages[10].received_time
+        end = messages[19].received_time
+        raw = list(self.source.raw_messages(start, end))
+        self.assertEqual([item.message_id for item in raw], [msg.message_id for msg in messages[10:20]])
+
+    def test_process_chunk_returns_indexes(self):
+        results = process_chunk(list(self.source.raw_messages()))
+        self.assertEqual([result[0] for result in results], list(range(30)))
+        self.assertEqual([result[1] for result in results], ['load', 'skip'] * 15)
+        self.assertFalse(any(isinstance(value, (MailMessage, RawMessage)) for result in results for value in result))
+
+    def test_classify_raw_messages(self):
+        messages = list(self.source.messages())
+        classifier = Classifier()
+        results = list(classify_messages(self.source.raw_messages(), workers=2, chunk_size=4))
+        self.assertEqual([result[1] for result in results], [classifier.classify(msg) for msg in messages])
+        for (msg, action, key, fields), expected in zip(results, messages):
+            if action == 'load':
+                self.assertEqual(msg, expected)
+                self.assertEqual(len(key), 32)
+                self.assertEqual(fields['employer'], 'Company ' + expected.message_id.strip('<>').split('@')[0])
+            else:
+                self.assertIsInstance(msg, RawMessage)
+                self.assertEqual(msg.message_id, expected.message_id)
+                self.assertIsNone(key)
+
+    def test_classify_mail_messages(self):
+        messages = [MailMessage(datetime.datetime(2024, 1, 1, 0, i), 'careers@example.com', SUBJECTS[i % 2] % 'Acme',
+                                'Thank you for applying.', str(i)) for i in range(10)]
+        results = list(classify_messages(messages, workers=2, chunk_size=3))
+        self.assertEqual([result[0] for result in results], messages)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,264 @@
+'''
+    Tests for ConnectionPool and for Database handles that borrow their connection from a pool,
+    using a fake connection factory in place of pyodbc.
+'''
+
+import sys
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+
+from ..database import Database
+from ..pool import ConnectionPool, PoolTimeout
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.closed = False
+
+    def execute(self, statement, *params):
+        if self.connection.broken:
+            raise RuntimeError('Communication link failure')
+        self.connection.statements.append(statement)
+        return self
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        self.closed = True
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.broken = False
+        self.closed = False
+        self.rollbacks = 0
+        self.statements = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+class FakeFactory:
+    """ Create numbered FakeConnections and keep each one, so the tests can look at them afterwards. """
+    def __init__(self):
+        self.connections = []
+
+    def __call__(self):
+        connection = FakeConnection(len(self.connections) + 1)
+        self.connections.append(connection)
+        return connection
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.factory = FakeFactory()
+
+    def test_min_size_prefill(self):
+        pool = ConnectionPool(self.factory, min_size=2, max_size=4)
+        self.assertEqual(len(self.factory.connections), 2)
+        stats = pool.statistics()
+        self.assertEqual((stats['size'], stats['idle'], stats['creations']), (2, 2, 2))
+        first = pool.acquire()
+        second = pool.acquire()
+        self.assertEqual(len(self.factory.connections), 2)
+        self.assertIn(first, self.factory.connections)
+        self.assertIn(second, self.factory.connections)
+
+    def test_invalid_sizes(self):
+        with self.assertRaises(ValueError):
+            ConnectionPool(self.factory, min_size=3, max_size=2)
+        with self.assertRaises(ValueError):
+            ConnectionPool(self.factory, max_size=0)
+
+    def test_max_size_and_timeout(self):
+        pool = ConnectionPool(self.factory, max_size=2)
+        first = pool.acquire()
+        pool.acquire()
+        start = time.monotonic()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(timeout=0.05)
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(len(self.factory.connections), 2)
+        self.assertEqual(pool.statistics()['waits'], 1)
+        pool.release(first)
+        self.assertIs(pool.acquire(timeout=0.05), first)
+
+    def test_waiting_acquire_gets_released_connection(self):
+        pool = ConnectionPool(self.factory, max_size=1)
+        connection = pool.acquire()
+        timer = threading.Timer(0.05, pool.release, (connection,))
+        timer.start()
+        try:
+            self.assertIs(pool.acquire(timeout=5), connection)
+        finally:
+            timer.join()
+
+    def test_idle_eviction(self):
+        pool = ConnectionPool(self.factory, min_size=1, max_size=3, idle_timeout=0.05)
+        connections = [pool.acquire() for i in range(3)]
+        for connection in connections:
+            pool.release(connection)
+        self.assertEqual(pool.statistics()['idle'], 3)
+        time.sleep(0.1)
+        connection = pool.acquire()
+        stats = pool.statistics()
+        self.assertEqual(stats['evictions'], 2)
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(sum(c.closed for c in connections), 2)
+        self.assertFalse(connection.closed)
+
+    def test_eviction_closes_outside_lock(self):
+        # The evicted connection's close waits until another thread has used the pool.
+        pool = ConnectionPool(self.factory, max_size=3, idle_timeout=0.05)
+        first, second = pool.acquire(), pool.acquire()
+        pool.release(first)
+        time.sleep(0.1)
+        released = threading.Event()
+        closing = threading.Event()
+        def slow_close():
+            closing.set()
+            released.wait(5)
+            first.closed = True
+        first.close = slow_close
+        def release_second():
+            closing.wait(5)
+            pool.release(second)
+            released.set()
+        thread = threading.Thread(target=release_second)
+        thread.start()
+        try:
+            connection = pool.acquire()
+        finally:
+            thread.join()
+        self.assertTrue(released.is_set() and first.closed)
+        self.assertIs(connection, second)
+        self.assertEqual(pool.statistics()['evictions'], 1)
+
+    def test_no_eviction_without_idle_timeout(self):
+        pool = ConnectionPool(self.factory, max_size=2, idle_timeout=None)
+        pool.release(pool.acquire())
+        time.sleep(0.01)
+        pool.acquire()
+        self.assertEqual(pool.statistics()['evictions'], 0)
+
+    def test_failed_validation_replaces_connection(self):
+        pool = ConnectionPool(self.factory, max_size=2)
+        connection = pool.acquire()
+        pool.release(connection)
+        connection.broken = True
+        replacement = pool.acquire()
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(replacement.statements, [])
+        stats = pool.statistics()
+        self.assertEqual((stats['validation_failures'], stats['creations'], stats['size']), (1, 2, 1))
+
+    def test_validation_query(self):
+        pool = ConnectionPool(self.factory, validation_query='select 42')
+        connection = pool.acquire()
+        pool.release(connection)
+        pool.acquire()
+        self.assertEqual(connection.statements, ['select 42'])
+
+    def test_release_rolls_back(self):
+        pool = ConnectionPool(self.factory)
+        connection = pool.acquire()
+        pool.release(connection)
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertFalse(connection.closed)
+        self.assertEqual(pool.statistics()['idle'], 1)
+
+    def test_release_discard(self):
+        pool = ConnectionPool(self.factory)
+        connection = pool.acquire()
+        pool.release(connection, discard=True)
+        self.assertTrue(connection.closed)
+        self.assertEqual(connection.rollbacks, 0)
+        stats = pool.statistics()
+        self.assertEqual((stats['size'], stats['idle']), (0, 0))
+        self.assertIsNot(pool.acquire(), connection)
+
+    def test_connection_block_discards_on_error(self):
+        pool = ConnectionPool(self.factory)
+        with self.assertRaises(ZeroDivisionError):
+            with pool.connection() as connection:
+                1 / 0
+        self.assertTrue(connection.closed)
+        with pool.connection() as second:
+            pass
+        self.assertFalse(second.closed)
+        self.assertEqual(pool.statistics()['idle'], 1)
+
+    def test_statistics(self):
+        pool = ConnectionPool(self.factory, min_size=1, max_size=2)
+        first = pool.acquire()
+        second = pool.acquire()
+        pool.release(first)
+        pool.release(second)
+        pool.acquire()
+        self.assertEqual(pool.statistics(), {'checkouts': 3, 'creations': 2, 'evictions': 0,
+                                             'validation_failures': 0, 'waits': 0, 'size': 2, 'idle': 1})
+
+    def test_close(self):
+        pool = ConnectionPool(self.factory, min_size=2, max_size=2)
+        pool.close()
+        self.assertTrue(all(c.closed for c in self.factory.connections))
+        with self.assertRaises(RuntimeError):
+            pool.acquire()
+
+class PooledDatabaseTest(unittest.TestCase):
+    def setUp(self):
+        self.factory = FakeFactory()
+        self.pool = ConnectionPool(self.factory, max_size=2)
+
+    def test_close_returns_connection(self):
+        database = Database('DB_NAME', pool=self.pool)
+        connection = database.connection
+        database.close()
+        self.assertIsNone(database.connection)
+        self.assertFalse(connection.closed)
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertEqual(self.pool.statistics()['idle'], 1)
+        second = Database('DB_NAME', pool=self.pool)
+        self.assertIs(second.connection, connection)
+        second.close()
+
+    def test_context_manager_returns_connection(self):
+        with Database('DB_NAME', pool=self.pool) as database:
+            connection = database.connection
+        self.assertFalse(connection.closed)
+        self.assertEqual(self.pool.statistics()['idle'], 1)
+
+    def test_set_releases_old_connection(self):
+        other_factory = FakeFactory()
+        other = ConnectionPool(other_factory)
+        database = Database('DB_NAME', pool=self.pool)
+        old = database.connection
+        database.set('OTHER_DB', pool=other)
+        self.assertEqual(self.pool.statistics()['idle'], 1)
+        self.assertEqual(old.rollbacks, 1)
+        self.assertIs(database.connection, other_factory.connections[0])
+        self.assertIs(database.pool, other)
+        database.close()
+
+    def test_set_closes_unpooled_connection(self):
+        unpooled = FakeFactory()
+        pyodbc = types.SimpleNamespace(connect=lambda connection_string: unpooled())
+        with mock.patch.dict(sys.modules, pyodbc=pyodbc):
+            database = Database('DB_NAME')
+        old = database.connection
+        database.set('DB_NAME', pool=self.pool)
+        self.assertTrue(old.closed)
+        self.assertIs(database.connection, self.factory.connections[0])
+        database.close()
+
+if __name__ == '__main__':
+    unittest.main()
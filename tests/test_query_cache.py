@@ -0,0 +1,136 @@
+'''
+    Tests for the query cache: which statements are cached, and the cache file format and permissions.
+'''
+
+import datetime
+import decimal
+import os
+import sqlite3
+import stat
+import sys
+import tempfile
+import unittest
+import uuid
+from unittest import mock
+
+from ..query_cache import QueryCache, cacheable, default_path, table_names
+
+DESCRIPTION = [('id', int, None, 10, 10, 0, False), ('name', str, None, 50, 50, 0, True), ('amount', decimal.Decimal, None, 12, 12, 2, True),
+               ('created', datetime.datetime, None, 23, 23, 3, True), ('born', datetime.date, None, 10, 10, 0, True),
+               ('starts', datetime.time, None, 16, 16, 7, True), ('photo', bytearray, None, 100, 100, 0, True),
+               ('guid', uuid.UUID, None, 36, 36, 0, True), ('active', bool, None, 1, 1, 0, True), ('score', float, None, 53, 53, 0, True)]
+ROWS = [(1, 'Ann', decimal.Decimal('12.50'), datetime.datetime(2024, 3, 4, 9, 30, 15, 123000), datetime.date(1990, 1, 2),
+         datetime.time(8, 0), bytearray(b'\x00\xff'), uuid.UUID('12345678-1234-5678-1234-567812345678'), True, 0.25),
+        (2, None, None, None, None, None, None, None, None, None)]
+
+class CacheableTest(unittest.TestCase):
+    def test_queries(self):
+        for statement in ('select 1', 'SELECT * FROM dbo.States;', 'select 1; -- done', "select 'a;b' from t",
+                          'select [x;y] from t', 'select 1 /* ; delete from t */', 'with c as (select 1 x) select * from c',
+                          'select updated_at, [update] from dbo.update_log', "select 'delete' from t"):
+            self.assertTrue(cacheable(statement), statement)
+
+    def test_batches_and_writes(self):
+        for statement in ('select * from people; delete from people', 'select 1;select 2', 'select 1; ; select 2',
+                          'select 1 delete from t', 'select (1)delete from t', 'select * into #t from people',
+                          'with c as (select 1 x) delete from t', 'insert into t values (1)', 'exec dbo.Refresh',
+                          'update t set x = 1', '', '-- nothing'):
+            self.assertFalse(cacheable(statement), statement)
+
+class TableNamesTest(unittest.TestCase):
+    def test_from_lists(self):
+        for statement, names in (('select * from dbo.States', {'states'}),
+                                 ('select * from a, b', {'a', 'b'}),
+                                 ('select * from [dbo].[a] x, dbo.b as y, "c" where x.id = y.id', {'a', 'b', 'c'}),
+                                 ('select * from a with (nolock), b join c on c.x = b.x, d', {'a', 'b', 'c', 'd'}),
+                                 ('select * from a where x in (select y from b, c) order by 1', {'a', 'b', 'c'}),
+                                 ('select * from (select x from a) s, b', {'a', 'b'}),
+                                 ('with q as (select * from a, b) select * from q, c', {'a', 'b', 'c', 'q'}),
+                                 ('select * from a union select * from b, c', {'a', 'b', 'c'})):
+            self.assertEqual(table_names(statement), names, statement)
+
+class QueryCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, 'cache', 'sql_cache.db')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_round_trip_through_file(self):
+        with QueryCache(self.path) as cache:
+            cache.put('DB', 'select * from people', (), DESCRIPTION, ROWS)
+        with QueryCache(self.path) as cache:
+            result = cache.get('DB', 'select  *  from people')
+            self.assertEqual(cache.statistics()['disk_hits'], 1)
+        self.assertEqual(result.rows, ROWS)
+        self.assertEqual([type(value) for value in result.rows[0]], [type(value) for value in ROWS[0]])
+        self.assertEqual(result.description, DESCRIPTION)
+
+    def test_file_is_json(self):
+        with QueryCache(self.path) as cache:
+            cache.put('DB', 'select * from people', (), DESCRIPTION, ROWS)
+        connection = sqlite3.connect(self.path)
+        text = connection.execute('select Result from QueryCache').fetchone()[0]
+        connection.close()
+        self.assertIsInstance(text, str)
+        self.assertIn('"decimal", "12.50"', text)
+
+    def test_other_format_is_a_miss(self):
+        with QueryCache(self.path) as cache:
+            cache.put('DB', 'select 1', (), [('x', int, None, 10, 10, 0, False)], [(1,)])
+        connection = sqlite3.connect(self.path)
+        connection.execute("update QueryCache set Result = X'80049505'")
+        connection.commit()
+        connection.close()
+        with QueryCache(self.path) as cache:
+            self.assertIsNone(cache.get('DB', 'select 1'))
+            self.assertEqual(cache.statistics()['misses'], 1)
+
+    def test_unsupported_type_kept_in_memory(self):
+        with QueryCache(self.path) as cache:
+            cache.put('DB', 'select x from t', (), [('x', None, None, None, None, None, True)], [(complex(1, 2),)])
+            self.assertEqual(cache.get('DB', 'select x from t').rows, [(complex(1, 2),)])
+        with QueryCache(self.path) as cache:
+            self.assertIsNone(cache.get('DB', 'select x from t'))
+
+    def test_invalidate_second_table(self):
+        with QueryCache(self.path) as cache:
+            cache.put('DB', 'select * from people p, accounts a where a.id = p.id', (), DESCRIPTION, ROWS)
+        with QueryCache(self.path) as cache:
+            self.assertEqual(cache.invalidate('dbo.Accounts'), 1)
+            self.assertIsNone(cache.get('DB', 'select * from people p, accounts a where a.id = p.id'))
+
+    def test_multiple_statements_not_cached(self):
+        statement = 'select * from people; delete from people'
+        with QueryCache(self.path) as cache:
+            cache.put('DB', statement, (), DESCRIPTION, ROWS)
+            self.assertIsNone(cache.get('DB', statement))
+            stats = cache.statistics()
+        self.assertEqual((stats['stores'], stats['misses'], stats['entries']), (0, 0, 0))
+
+    @unittest.skipIf(sys.platform == 'win32', 'file modes are not used on Windows')
+    def test_new_file_is_private(self):
+        QueryCache(self.path).close()
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(self.path)).st_mode), 0o700)
+
+    def test_existing_file_mode_kept(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'wb'):
+            pass
+        os.chmod(self.path, 0o640)
+        QueryCache(self.path).close()
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o640)
+
+    def test_default_path(self):
+        with mock.patch.object(sys, 'platform', 'win32'), mock.patch.dict(os.environ, {'LOCALAPPDATA': r'C:\Users\ann\AppData\Local'}):
+            self.assertEqual(default_path(), os.path.join(r'C:\Users\ann\AppData\Local', 'Nelnet', 'sql_cache.db'))
+        with mock.patch.object(sys, 'platform', 'linux'), mock.patch.dict(os.environ, {'XDG_CACHE_HOME': '/home/ann/.xdg'}):
+            self.assertEqual(default_path(), os.path.join('/home/ann/.xdg', 'nelnet', 'sql_cache.db'))
+        environ = {name: value for name, value in os.environ.items() if name != 'XDG_CACHE_HOME'}
+        with mock.patch.object(sys, 'platform', 'linux'), mock.patch.dict(os.environ, environ, clear=True):
+            self.assertEqual(default_path(), os.path.join(os.path.expanduser('~'), '.cache', 'nelnet', 'sql_cache.db'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,246 @@
+'''
+    Tests for sql.py: the numbered output files, writing every resultset of a batch, the output files of failed
+    --parallel batches, the exit codes of main, and the --serve loop.  The database is the SQLite stand-in of
+    standin.py, or a fake.
+'''
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+
+# sql.py is a script, and imports the modules next to it by their plain names.
+PACKAGE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PACKAGE not in sys.path:
+    sys.path.insert(0, PACKAGE)
+
+import columnar
+from .. import sql
+from ..query_cache import QueryCache
+from .standin import StandInConnection, patch_pyodbc
+
+DESCRIPTION_A = [('a', int, None, 10, 10, 0, True)]
+DESCRIPTION_B = [('b', str, None, 10, 10, 0, True)]
+
+class FakeDatabase:
+    """ Return the given (description, rows, rowcount) results from iter_resultsets. """
+    def __init__(self, results):
+        self.results = results
+        self.cursor = types.SimpleNamespace(rowcount=-1)
+
+    def iter_resultsets(self, statement, batch_size=1000, params=None):
+        for description, rows, rowcount in self.results:
+            self.cursor.rowcount = rowcount
+            yield description, iter([rows] if rows else [])
+
+class RecordingWriter(columnar.ColumnarWriter):
+    """ A columnar writer that keeps the row groups in memory. """
+    def open_file(self):
+        self.groups = []
+
+    def write_row_group(self, columns, count):
+        self.groups.append(columns)
+
+    def close_file(self):
+        WRITTEN[self.path] = self.groups
+
+WRITTEN = {}
+
+class NumberedFileTest(unittest.TestCase):
+    def test_numbered_file(self):
+        self.assertEqual(sql._numbered_file('output.csv', 1, 1), 'output.csv')
+        self.assertEqual(sql._numbered_file('output.csv', 2, 3), 'output_2.csv')
+        self.assertEqual(sql._numbered_file('C:/data.v1/output.parquet', 10, 12), 'C:/data.v1/output_10.parquet')
+        self.assertEqual(sql._numbered_file('output', 1, 2), 'output_1')
+
+class ExportTest(unittest.TestCase):
+    def job(self, format='csv', cache=None):
+        options = sql.Options()
+        options.db_name = 'test'
+        options.format = format
+        options.quote = ''
+        job = sql._Job(options)
+        job.cache = cache
+        return job
+
+    def test_every_resultset_to_csv(self):
+        d = FakeDatabase([(DESCRIPTION_A, [(1,), (2,)], -1), (None, [], 5), (DESCRIPTION_B, [('x',)], -1)])
+        out = io.StringIO()
+        self.assertEqual(self.job().export(d, 'select 1; update t set b = 1; select 2', out, ''), (3, True))
+        self.assertEqual(out.getvalue(), '1\n2\nx\n')
+
+    def test_rows_affected(self):
+        d = FakeDatabase([(None, [], 2), (None, [], 3)])
+        self.assertEqual(self.job().export(d, 'update t set a = 1; update u set a = 1', io.StringIO(), ''), (5, False))
+
+    def test_columnar_takes_one_resultset(self):
+        WRITTEN.clear()
+        with mock.patch.dict(columnar.WRITERS, npy=RecordingWriter):
+            d = FakeDatabase([(DESCRIPTION_A, [(1,), (2,)], -1)])
+            self.assertEqual(self.job('npy').export(d, 'select 1', None, 'one.npy'), (2, True))
+            self.assertEqual(WRITTEN['one.npy'], [[(1, 2)]])
+            d = FakeDatabase([(DESCRIPTION_A, [(1,)], -1), (DESCRIPTION_B, [('x',)], -1)])
+            with self.assertRaises(sql.OutputError):
+                self.job('npy').export(d, 'select 1 select 2', None, 'two.npy')
+
+    def test_cache_single_resultset(self):
+        cache = QueryCache()
+        d = FakeDatabase([(DESCRIPTION_A, [(1,)], -1)])
+        self.job(cache=cache).export(d, 'select a from t', io.StringIO(), '')
+        self.assertEqual(cache.get('test', 'select a from t').rows, [(1,)])
+        # T-SQL needs no semicolon between queries, so the second resultset is only seen when it is read.
+        d = FakeDatabase([(DESCRIPTION_A, [(1,)], -1), (DESCRIPTION_B, [('x',)], -1)])
+        self.job(cache=cache).export(d, 'select a from t select b from u', io.StringIO(), '')
+        self.assertIsNone(cache.get('test', 'select a from t select b from u'))
+
+class StandInTest(unittest.TestCase):
+    """ Run sql.py against a SQLite database file in a temporary folder. """
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        path = os.path.join(self.folder, 'test.db')
+        patcher = patch_pyodbc(lambda connection_string, **kwargs: StandInConnection(path))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, name, text):
+        path = os.path.join(self.folder, name)
+        with open(path, 'wt', encoding='utf-8') as out:
+            out.write(text)
+        return path
+
+    def read(self, name):
+        with open(os.path.join(self.folder, name), 'rt', encoding='utf-8') as source:
+            return source.read()
+
+    def main(self, argv):
+        # Return the exit code, and what main wrote to stdout and stderr.
+        with contextlib.redirect_stdout(io.StringIO()) as out, contextlib.redirect_stderr(io.StringIO()) as err:
+            code = sql.main(argv)
+        return code, out.getvalue(), err.getvalue()
+
+class ParallelTest(StandInTest):
+    def test_failed_batch_leaves_no_file(self):
+        script = self.write('script.sql', 'select 1 as a\nGO\nselect * from missing\nGO\ncreate table t (a int)\nGO\n')
+        out_file = os.path.join(self.folder, 'p.csv')
+        code, out, err = self.main(['--database=test', '--infile=' + script, '--outfile=' + out_file, '--parallel=2', '--quote='])
+        self.assertEqual(code, 1)
+        self.assertIn('no such table: missing', out)
+        self.assertEqual(sorted(os.listdir(self.folder)), ['p_1.csv', 'script.sql', 'test.db'])
+        self.assertEqual(self.read('p_1.csv'), '1\n')
+
+class MainTest(StandInTest):
+    def test_success(self):
+        script = self.write('ok.sql', 'select 1 as a\n')
+        out_file = os.path.join(self.folder, 'ok.csv')
+        code, out, err = self.main(['--database=test', '--infile=' + script, '--outfile=' + out_file, '--quote='])
+        self.assertEqual((code, err), (0, ''))
+        self.assertIn('code 0', out)
+        self.assertEqual(self.read('ok.csv'), '1\n')
+
+    def test_usage_errors(self):
+        code, out, err = self.main([])
+        self.assertEqual(code, 1)
+        self.assertIn('Default syntax', out)
+        code, out, err = self.main(['--no-such-option'])
+        self.assertEqual(code, 1)
+        self.assertIn('option --no-such-option not recognized', out)
+        code, out, err = self.main(['--infile=x.sql'])
+        self.assertEqual(code, 1)
+        self.assertIn('--database parameter is a required value', out)
+
+    def test_database_error(self):
+        script = self.write('bad.sql', 'select * from missing\n')
+        code, out, err = self.main(['--database=test', '--infile=' + script])
+        self.assertEqual(code, 1)
+        self.assertEqual(err, 'no such table: missing\n')
+
+    def test_missing_package(self):
+        script = self.write('ok.sql', 'select 1 as a\n')
+        out_file = os.path.join(self.folder, 'ok.parquet')
+        # A None entry in sys.modules makes the import fail as if pyarrow were not installed.
+        with mock.patch.dict(sys.modules, pyarrow=None):
+            code, out, err = self.main(['--database=test', '--infile=' + script, '--outfile=' + out_file, '--format=parquet'])
+        self.assertEqual(code, 1)
+        self.assertIn('require the pyarrow package', err)
+        self.assertEqual(len(err.splitlines()), 1)
+
+    def test_missing_infile(self):
+        code, out, err = self.main(['--database=test', '--infile=' + os.path.join(self.folder, 'none.sql')])
+        self.assertEqual(code, 1)
+
+class ProfileTest(StandInTest):
+    def test_profile_report(self):
+        script = self.write('ok.sql', 'select 1 as a union all select 2\n')
+        out_file = os.path.join(self.folder, 'ok.csv')
+        json_file = os.path.join(self.folder, 'trace.json')
+        code, out, err = self.main(['--database=test', '--infile=' + script, '--outfile=' + out_file, '--quote=',
+                                    '--no-cache', '--profile-json=' + json_file])
+        self.assertEqual(code, 0)
+        lines = err.splitlines()
+        self.assertEqual(lines[0], '-- Profile --')
+        phases = {line.split()[0]: line.split() for line in lines[2:]}
+        self.assertEqual(sorted(phases), ['Elapsed', 'connect', 'execute', 'fetch', 'write'])
+        self.assertEqual(phases['fetch'][4], '2')
+        with open(json_file, 'rt', encoding='utf-8') as trace_file:
+            data = json.load(trace_file)
+        self.assertEqual(data['phases']['fetch']['rows'], 2)
+        self.assertEqual([event['phase'] for event in data['events']][:2], ['connect', 'execute'])
+        self.assertEqual(data['events'][1]['detail'].strip(), 'select 1 as a union all select 2')
+
+    def test_no_profile(self):
+        script = self.write('ok.sql', 'select 1 as a\n')
+        code, out, err = self.main(['--database=test', '--infile=' + script, '--outfile=' + os.path.join(self.folder, 'ok.csv')])
+        self.assertEqual((code, err), (0, ''))
+
+class ServeTest(StandInTest):
+    def test_jobs_and_stop_file(self):
+        self.write('ok.sql', 'create table t (a int)\nGO\ninsert into t values (1)\nGO\nselect a from t\n')
+        self.write('bad.sql', 'select * from missing\n')
+        self.write('a_ok.job', '--infile="' + os.path.join(self.folder, 'ok.sql') + '" --outfile="' +
+                   os.path.join(self.folder, 'ok.csv') + '" --quote=""')
+        self.write('b_bad.job', '--infile="' + os.path.join(self.folder, 'bad.sql') + '"')
+        self.write('c_usage.job', '--outfile=x.csv')
+        self.write('d_waiting.job.tmp', '--infile=later.sql')
+        defaults = sql.parse_options(['--serve=' + self.folder, '--database=test', '--poll=0.01'])
+        result = []
+        server = threading.Thread(target=lambda: result.append(self.main_serve(defaults)))
+        server.start()
+        try:
+            deadline = time.monotonic() + 10
+            while not os.path.exists(os.path.join(self.folder, 'c_usage.failed')) and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            self.write('stop', '')
+            server.join(10)
+        self.assertFalse(server.is_alive())
+        self.assertEqual(result, [0])
+        names = set(os.listdir(self.folder))
+        self.assertTrue({'a_ok.done', 'a_ok.log', 'b_bad.failed', 'b_bad.log', 'c_usage.failed', 'c_usage.log'} <= names)
+        self.assertFalse(names & {'a_ok.job', 'b_bad.job', 'c_usage.job', 'a_ok.running', 'stop'})
+        # Files that do not end in .job are left alone.
+        self.assertIn('d_waiting.job.tmp', names)
+        self.assertEqual(self.read('ok.csv'), '1\n')
+        self.assertIn('no such table: missing', self.read('b_bad.log'))
+        self.assertNotIn('Traceback', self.read('b_bad.log'))
+        self.assertIn('--infile parameter is a required value', self.read('c_usage.log'))
+
+    def main_serve(self, defaults):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return sql.serve(defaults)
+
+    def test_missing_folder(self):
+        code, out, err = self.main(['--serve=' + os.path.join(self.folder, 'none')])
+        self.assertEqual(code, 1)
+        self.assertIn('does not exist', out)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+'''
+    Tests for splitting SQL scripts into batches on GO lines.
+'''
+
+import unittest
+
+from ..sql_script import split_batches
+
+class SplitBatchesTest(unittest.TestCase):
+    def test_go_lines(self):
+        self.assertEqual(split_batches('select 1\nGO\nselect 2\n'), ['select 1\n', 'select 2\n'])
+        self.assertEqual(split_batches('select 1\n  go  \nselect 2'), ['select 1\n', 'select 2'])
+        self.assertEqual(split_batches('select 1\nGo -- first batch\nselect 2'), ['select 1\n', 'select 2'])
+        self.assertEqual(split_batches('select 1\r\nGO\r\nselect 2\r\n'), ['select 1\r\n', 'select 2\r\n'])
+
+    def test_no_go(self):
+        self.assertEqual(split_batches('select 1;\nselect 2;\n'), ['select 1;\nselect 2;\n'])
+        # GO is only a separator on a line of its own.
+        self.assertEqual(split_batches('select 1 go\nselect 2 as go\n'), ['select 1 go\nselect 2 as go\n'])
+
+    def test_go_count(self):
+        self.assertEqual(split_batches('insert into t values (1)\nGO 3\nselect 2\n'),
+                         ['insert into t values (1)\n'] * 3 + ['select 2\n'])
+
+    def test_go_in_strings_and_comments(self):
+        for script in ("select 'a\nGO\nb'\n", 'select [a\nGO\nb] from t\n', 'select "a\nGO\nb" from t\n',
+                       '/* a\nGO\n*/ select 1\n', "select 'it''s\nGO\nhere'\n"):
+            self.assertEqual(split_batches(script), [script])
+        self.assertEqual(split_batches("select 'a'\nGO\nselect 'b'"), ["select 'a'\n", "select 'b'"])
+
+    def test_empty_batches(self):
+        self.assertEqual(split_batches('GO\n\nGO\nselect 1\nGO\n-- done\nGO\n/* end */\n'), ['select 1\n'])
+        self.assertEqual(split_batches(''), [])
+        self.assertEqual(split_batches('  \n-- nothing\n'), [])
+
+if __name__ == '__main__':
+    unittest.main()